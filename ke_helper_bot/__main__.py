@@ -1,5 +1,11 @@
+import argparse
 import asyncio
 import logging
+import os
+import socket
+import time
+from contextlib import suppress
+from dataclasses import replace
 
 from aiogram import Bot, Dispatcher, F
 from aiogram.client.default import DefaultBotProperties
@@ -8,16 +14,43 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from config_reader import config
 from google_sheets.wrapper import GoogleSheetsWrapper
 from handlers.admin import router
+from jobs.manager import ALL_REPORTS, COM_SHOP_TASKS, DAILY_REPORT, JobManager
+from ke_parser.executor import PriorityExecutor
 from ke_parser.ke_parser import KEParser
+from ke_parser.offload import ParseOffloader
+from ke_parser.queries import SEARCH_PROFILES
+from ke_parser.resilience import RetryPolicy
+from metrics.exporter import start_exporter
+from metrics.loop_lag import LoopLagMonitor
+from metrics.metrics import metrics
+from monitoring.shards import (
+    QueueNotifier,
+    ShardLease,
+    ShardStore,
+    quota_share,
+    relay_events,
+)
+from tracing.tracer import tracer
 
+logger = logging.getLogger(__name__)
 
-async def main() -> None:
-    logging.basicConfig(level=logging.INFO)
-    bot = Bot(
-        token=config.BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+
+def create_wrapper(
+    bot: Bot, notifier: QueueNotifier | None = None
+) -> GoogleSheetsWrapper:
+    """Create the spreadsheet wrapper with its marketplace parser"""
+    ke_parser = KEParser(
+        RetryPolicy(attempts=config.REQUEST_ATTEMPTS, timeout=config.REQUEST_TIMEOUT),
+        PriorityExecutor(config.MARKETPLACE_CONCURRENCY),
+        config.SEARCH_BATCH_SIZE,
+        replace(
+            SEARCH_PROFILES[config.SEARCH_PROFILE], page_size=config.SEARCH_PAGE_SIZE
+        ),
+        ParseOffloader(
+            config.OFFLOAD_WORKERS, config.OFFLOAD_MIN_BYTES, config.OFFLOAD_MIN_PAIRS
+        ),
     )
-    ke_parser = KEParser()
-    gs = GoogleSheetsWrapper(
+    return GoogleSheetsWrapper(
         bot,
         ke_parser,
         config.SPREADSHEET_KEY,
@@ -31,20 +64,121 @@ async def main() -> None:
         config.MY_STOCK_NOTIF_TABLE_ID,
         config.COM_NOTIF_TABLE_ID,
         config.COM_STOCK_NOTIF_TABLE_ID,
+        notifier=notifier,
     )
-    dp = Dispatcher(gs=gs, ke_parser=ke_parser)
+
+
+async def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    bot = Bot(
+        token=config.BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+    )
+    gs = create_wrapper(bot)
+    jobs = JobManager()
+    dp = Dispatcher(gs=gs, ke_parser=gs.ke_parser, jobs=jobs)
     scheduler = AsyncIOScheduler(timezone="Europe/Moscow")
     scheduler.start()
     dp.startup.register(gs.init)
+
+    async def resume_interrupted() -> None:
+        # registered after init, so the resumed run finds the tables
+        jobs.start("Ежедневный отчёт", DAILY_REPORT, gs.resume_daily_task)
+
+    async def update_all_tables() -> None:
+        jobs.start("Все таблицы", ALL_REPORTS, gs.update_all_tables)
+
+    async def recrawl_shops() -> None:
+        jobs.start("Каталоги магазинов", COM_SHOP_TASKS, gs.recrawl_shops)
+
+    dp.startup.register(resume_interrupted)
+    dp.shutdown.register(jobs.shutdown)
+    dp.shutdown.register(gs.notifier.stop)
+    dp.shutdown.register(gs.ke_parser.offloader.shutdown)
     dp.message.filter(F.from_user.id.in_(config.ADMINS))
     dp.include_router(router)
 
-    scheduler.add_job(gs.update_all_tables, "cron", hour=9)
-    scheduler.add_job(gs.check_all_stock, "interval", minutes=2)
-    scheduler.add_job(gs.check_all_changes, "interval", minutes=2)
+    if config.METRICS_ENABLED:
+        metrics.enabled = True
+        exporter = await start_exporter(config.METRICS_HOST, config.METRICS_PORT)
+        dp.shutdown.register(exporter.cleanup)
+        lag_monitor = asyncio.create_task(
+            LoopLagMonitor(metrics.observe_lag, 0.5).run()
+        )
+
+        async def stop_lag_monitor() -> None:
+            lag_monitor.cancel()
+
+        dp.shutdown.register(stop_lag_monitor)
+    if config.TRACE_FILE:
+        tracer.configure(config.TRACE_FILE)
+        dp.shutdown.register(tracer.close)
+
+    # the new products of the shops get into the reports
+    scheduler.add_job(recrawl_shops, "cron", hour=8)
+    scheduler.add_job(update_all_tables, "cron", hour=9)
+    scheduler.add_job(gs.track_ranks, "interval", seconds=config.RANK_TRACK_INTERVAL)
+    if config.SHARDED_MONITORING:
+        # the workers poll the products, the bot sends their messages
+        store = ShardStore(config.SHARD_STORE, config.SHARD_COUNT)
+        scheduler.add_job(
+            relay_events, "interval", seconds=1, args=[store, gs.notifier]
+        )
+
+        async def share_sheets_quota() -> None:
+            workers = await asyncio.to_thread(store.workers)
+            gs.agcm.quota.per_minute = quota_share(
+                config.SHEETS_QUOTA_PER_MINUTE, workers
+            )
+
+        scheduler.add_job(
+            share_sheets_quota, "interval", seconds=config.SHARD_LEASE_TTL / 3
+        )
+    else:
+        # the products are checked as often as they change
+        scheduler.add_job(gs.poll_due, "interval", seconds=config.POLL_TICK)
 
     await dp.start_polling(bot)
 
 
+async def worker() -> None:
+    """Poll the products of the leased shards until stopped"""
+    logging.basicConfig(level=logging.INFO)
+    store = ShardStore(config.SHARD_STORE, config.SHARD_COUNT)
+    lease = ShardLease(
+        store, f"{socket.gethostname()}:{os.getpid()}", config.SHARD_LEASE_TTL
+    )
+    # the bot is never called, the messages go to the queue
+    bot = Bot(token=config.BOT_TOKEN)
+    gs = create_wrapper(bot, QueueNotifier(store))
+    await gs.init()
+    await lease.renew()
+    leasing = asyncio.create_task(lease.run())
+    try:
+        while True:
+            started = time.monotonic()
+            # the Sheets quota is per project, not per process
+            gs.agcm.quota.per_minute = quota_share(
+                config.SHEETS_QUOTA_PER_MINUTE, lease.workers
+            )
+            try:
+                await gs.poll_due(lease.owns)
+            except Exception:
+                logger.exception("Failed to poll the products")
+            await asyncio.sleep(max(config.POLL_TICK - time.monotonic() + started, 0))
+    finally:
+        leasing.cancel()
+        with suppress(asyncio.CancelledError):
+            await leasing
+        await gs.notifier.stop()
+        await bot.session.close()
+        gs.ke_parser.offloader.shutdown()
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--worker",
+        action="store_true",
+        help="run a monitoring worker instead of the bot",
+    )
+    asyncio.run(worker() if parser.parse_args().worker else main())
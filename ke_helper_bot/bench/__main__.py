@@ -0,0 +1,322 @@
+"""
+Offline benchmark of the report and monitoring jobs
+against the fake marketplace and the fake spreadsheet
+
+Run from the ke_helper_bot directory:
+    python -m bench --rows 10 100 1000
+"""
+
+import argparse
+import asyncio
+import functools
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+
+TEMP_DIR = Path(tempfile.gettempdir())
+
+# the settings are required by config_reader on import,
+# the state files are kept out of the working tree
+for name, value in {
+    "BOT_TOKEN": "0:bench",
+    "ADMINS": "[1]",
+    "GOOGLE_SHEETS_API_CREDS": "bench.json",
+    "SPREADSHEET_KEY": "bench",
+    "CHECKPOINT_DIR": str(TEMP_DIR / "ke_bench_checkpoints"),
+    "CATALOG_DB": str(TEMP_DIR / "ke_bench_catalog.sqlite3"),
+    "RANK_DB": str(TEMP_DIR / "ke_bench_ranks.sqlite3"),
+    "SHARD_STORE": str(TEMP_DIR / "ke_bench_shards.sqlite3"),
+    **{
+        f"{table}_TABLE_ID": str(sheet_id)
+        for sheet_id, table in enumerate(
+            (
+                "DAILY_TASK",
+                "DAILY_REPORT",
+                "MY_SHOP_TASK",
+                "MY_SHOP_REPORT",
+                "COM_SHOP_TASK",
+                "COM_SHOP_REPORT",
+                "MY_NOTIF",
+                "MY_STOCK_NOTIF",
+                "COM_NOTIF",
+                "COM_STOCK_NOTIF",
+            ),
+            1,
+        )
+    },
+}.items():
+    os.environ.setdefault(name, value)
+
+from google_sheets.gateway import SheetsGateway  # noqa: E402
+from google_sheets.task_cache import TaskSheetCache  # noqa: E402
+from google_sheets.wrapper import GoogleSheetsWrapper  # noqa: E402
+from ke_parser.ke_parser import KEParser  # noqa: E402
+from ke_parser.offload import ParseOffloader  # noqa: E402
+from ke_parser.queries import POSITION, SEARCH_PROFILES, SearchProfile  # noqa: E402
+from metrics.loop_lag import LoopLagMonitor  # noqa: E402
+
+from .fake_server import FakeMarketplace  # noqa: E402
+from .fake_sheets import FakeBot, FakeSpreadsheet, FakeWorksheet  # noqa: E402
+from .fixtures import FixtureStore  # noqa: E402
+
+TABLES = (
+    "daily_task",
+    "daily_report",
+    "my_shop_task",
+    "my_shop_report",
+    "com_shop_task",
+    "com_shop_report",
+    "my_notif",
+    "my_stock_notif",
+    "com_notif",
+    "com_stock_notif",
+)
+
+
+@dataclass
+class Result:
+    """Measurements of one scenario run"""
+
+    scenario: str
+    rows: int
+    seconds: float = 0.0
+    samples: list[float] = field(default_factory=list)
+    requests: dict[str, int] = field(default_factory=dict)
+    bytes_received: int = 0
+    errors: int = 0
+    sheets_calls: int = 0
+    bot_calls: int = 0
+    peak_memory: int = 0
+    # the event loop lag samples
+    lag: list[float] = field(default_factory=list)
+    failure: str = ""
+
+
+def percentile(samples: list[float], q: float) -> float:
+    """Return the q-th percentile of the samples"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+def timed(samples: list[float], func: Callable[..., Awaitable]) -> Callable:
+    """Record the duration of each call of the coroutine function"""
+
+    @functools.wraps(func)
+    async def wrapper(*args: object, **kwargs: object) -> object:
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            samples.append(time.perf_counter() - start)
+
+    return wrapper
+
+
+def make_link(product_id: int, index: int, sku_count: int) -> str:
+    """Return the link of the product sku"""
+    return (
+        f"https://kazanexpress.ru/product/tovar-{product_id}"
+        f"?skuId={product_id * 100 + index % sku_count}"
+    )
+
+
+def make_tasks(fixtures: FixtureStore, rows: int) -> dict[str, list[list[str]]]:
+    """Return the task sheet rows and register their search queries"""
+    daily, my_shop, com_shop = [], [], []
+    for index in range(rows):
+        query = f"запрос {index % max(1, rows // 5)}"
+        my_id, com_id = 100_000 + index, 200_000 + index
+        my_link = make_link(my_id, index, fixtures.sku_count)
+        com_link = make_link(com_id, index, fixtures.sku_count)
+        fixtures.add_query(query, [my_id, com_id])
+        daily.append([f"Товар {index}", query, "", my_link, "", com_link])
+        my_shop.append([f"Товар {index}", "", query, my_link, "5"])
+        com_shop.append([f"Товар {index}", "", query, com_link, "5"])
+    return {"daily_task": daily, "my_shop_task": my_shop, "com_shop_task": com_shop}
+
+
+async def build_wrapper(
+    server: FakeMarketplace,
+    tasks: dict[str, list[list[str]]],
+    search_profile: SearchProfile = POSITION,
+    offloader: ParseOffloader | None = None,
+) -> tuple[GoogleSheetsWrapper, FakeSpreadsheet, FakeBot]:
+    """Return the wrapper wired to the fake backends"""
+    ke_parser = KEParser(search_profile=search_profile, offloader=offloader)
+    ke_parser.product_base_url = f"{server.url}/api/v2/product"
+    ke_parser.reviews_base_url = f"{server.url}/api/product"
+    ke_parser.actions_base_url = f"{server.url}/api/product/actions"
+    ke_parser.graphql_base_url = f"{server.url}/graphql"
+    bot = FakeBot()
+    gs = GoogleSheetsWrapper(
+        bot,  # type: ignore[arg-type]  # the fake has the methods the wrapper calls
+        ke_parser,
+        "bench",
+        *range(1, len(TABLES) + 1),
+    )
+    worksheets = [
+        FakeWorksheet(table, sheet_id, tasks.get(table, []))
+        for sheet_id, table in enumerate(TABLES, 1)
+    ]
+    spreadsheet = FakeSpreadsheet(worksheets)
+    gs.ss = spreadsheet
+    gs.sheets = SheetsGateway(spreadsheet, 0.05)
+    gs.tasks = TaskSheetCache(gs.sheets)
+    for worksheet in worksheets:
+        setattr(gs, f"{worksheet.title}_table", worksheet)
+    # the bot is fake, so the telegram rate limits are not applied
+    gs.notifier.chat_interval = 0.0
+    gs.notifier.global_limiter.interval = 0.0
+    await gs.notifier.start()
+    return gs, spreadsheet, bot
+
+
+async def run_scenario(
+    scenario: str,
+    rows: int,
+    server: FakeMarketplace,
+    cycles: int,
+    *,
+    search_profile: SearchProfile = POSITION,
+    offloader: ParseOffloader | None = None,
+) -> Result:
+    """Run the scenario and return its measurements"""
+    result = Result(scenario, rows)
+    tasks = make_tasks(server.fixtures, rows)
+    gs, spreadsheet, bot = await build_wrapper(server, tasks, search_profile, offloader)
+    jobs: dict[str, Callable[[], Awaitable]] = {
+        "daily_task": gs.daily_task,
+        "shop_task": lambda: gs.shop_task(
+            gs.my_shop_task_table, gs.my_shop_report_table
+        ),
+        "update_all_tables": gs.update_all_tables,
+        "check_all_stock": gs.check_all_stock,
+        "check_all_changes": gs.check_all_changes,
+        "poll_due": gs.poll_due,
+    }
+    # the rows are timed by wrapping the bound methods of the instance
+    gs.parse_daily_data = timed(result.samples, gs.parse_daily_data)  # type: ignore[method-assign]
+    gs.parse_shop_data = timed(result.samples, gs.parse_shop_data)  # type: ignore[method-assign]
+    repeats = cycles if scenario.startswith(("check", "poll")) else 1
+    cycle = timed(result.samples, jobs[scenario]) if repeats > 1 else jobs[scenario]
+    server.reset()
+    tracemalloc.start()
+    lag_monitor = asyncio.create_task(LoopLagMonitor(result.lag.append, 0.01).run())
+    start = time.perf_counter()
+    try:
+        for _ in range(repeats):
+            await cycle()
+        await gs.sheets.flush()
+    except Exception as e:  # noqa: BLE001
+        result.failure = f"{type(e).__name__}: {e}"
+    result.seconds = time.perf_counter() - start
+    lag_monitor.cancel()
+    result.peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    await gs.notifier.stop()
+    result.requests = dict(server.requests)
+    result.bytes_received = sum(server.bytes_sent.values())
+    result.errors = sum(server.errors.values())
+    result.sheets_calls = sum(
+        count for call, count in spreadsheet.calls.items() if call != "requests"
+    )
+    result.bot_calls = sum(bot.calls.values())
+    return result
+
+
+def report(results: list[Result]) -> str:
+    """Return the results as a text table"""
+    lines = [
+        (
+            f"{'scenario':<18}{'rows':>6}{'sec':>9}{'rows/s':>9}{'p50 ms':>9}"
+            f"{'p99 ms':>9}{'reqs':>8}{'MiB in':>8}{'errs':>6}{'sheets':>8}"
+            f"{'bot':>6}{'peak MiB':>10}{'lag p99':>9}  requests by endpoint"
+        )
+    ]
+    lines.extend(
+        f"{r.scenario:<18}{r.rows:>6}{r.seconds:>9.2f}"
+        f"{r.rows / r.seconds if r.seconds else 0:>9.1f}"
+        f"{percentile(r.samples, 50) * 1000:>9.0f}"
+        f"{percentile(r.samples, 99) * 1000:>9.0f}"
+        f"{sum(r.requests.values()):>8}{r.bytes_received / 2**20:>8.1f}"
+        f"{r.errors:>6}{r.sheets_calls:>8}{r.bot_calls:>6}"
+        f"{r.peak_memory / 2**20:>10.1f}"
+        f"{percentile(r.lag, 99) * 1000:>9.0f}  "
+        + (
+            r.failure
+            or ", ".join(
+                f"{name}={count}" for name, count in sorted(r.requests.items())
+            )
+        )
+        for r in results
+    )
+    return "\n".join(lines) + "\n"
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument(
+        "--scenarios",
+        nargs="+",
+        default=["daily_task", "shop_task", "check_all_stock", "check_all_changes"],
+    )
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--change-rate", type=float, default=0.0)
+    parser.add_argument("--cycles", type=int, default=3)
+    parser.add_argument("--sku-count", type=int, default=4)
+    parser.add_argument("--reviews", type=int, default=50)
+    parser.add_argument("--search-total", type=int, default=250)
+    parser.add_argument("--fixtures", type=Path, default=None)
+    parser.add_argument(
+        "--search-profile", choices=SEARCH_PROFILES, default=POSITION.name
+    )
+    parser.add_argument("--page-size", type=int, default=POSITION.page_size)
+    parser.add_argument("--offload-workers", type=int, default=0)
+    parser.add_argument("--offload-min-bytes", type=int, default=256 * 1024)
+    args = parser.parse_args()
+    offloader = ParseOffloader(args.offload_workers, args.offload_min_bytes)
+    search_profile = replace(
+        SEARCH_PROFILES[args.search_profile], page_size=args.page_size
+    )
+
+    results = []
+    for rows in args.rows:
+        for scenario in args.scenarios:
+            server = FakeMarketplace(
+                FixtureStore(
+                    args.fixtures, args.sku_count, args.reviews, args.search_total
+                ),
+                args.latency,
+                error_rate=args.error_rate,
+                change_rate=args.change_rate,
+            )
+            await server.start()
+            try:
+                results.append(
+                    await run_scenario(
+                        scenario,
+                        rows,
+                        server,
+                        args.cycles,
+                        search_profile=search_profile,
+                        offloader=offloader,
+                    )
+                )
+            finally:
+                await server.stop()
+            sys.stdout.write(report(results[-1:]).split("\n", 1)[1])
+    sys.stdout.write("\n" + report(results))
+    offloader.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
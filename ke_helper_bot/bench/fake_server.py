@@ -0,0 +1,127 @@
+import asyncio
+import json
+import random
+import re
+from collections import Counter
+from typing import Any
+
+from aiohttp import web
+
+from .fixtures import FixtureStore
+
+
+def select(value: Any, fields: set[str]) -> Any:  # noqa: ANN401
+    """Return the value without the fields missing from the selection set"""
+    if isinstance(value, dict):
+        return {
+            key: select(item, fields) for key, item in value.items() if key in fields
+        }
+    if isinstance(value, list):
+        return [select(item, fields) for item in value]
+    return value
+
+
+class FakeMarketplace:
+    """
+    Local stand-in for api.kazanexpress.ru
+    and graphql.kazanexpress.ru serving
+    the fixtures with latency and errors
+    """
+
+    def __init__(
+        self,
+        fixtures: FixtureStore,
+        latency: float = 0.05,
+        jitter: float = 0.02,
+        error_rate: float = 0.0,
+        change_rate: float = 0.0,
+    ) -> None:
+        self.fixtures = fixtures
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.change_rate = change_rate
+        self.requests: Counter[str] = Counter()
+        self.bytes_sent: Counter[str] = Counter()
+        self.errors: Counter[str] = Counter()
+        self.app = web.Application()
+        self.app.router.add_get("/api/v2/product/{id}", self.product)
+        self.app.router.add_get("/api/product/{id}/reviews", self.reviews)
+        self.app.router.add_get("/api/product/actions/{id}", self.actions)
+        self.app.router.add_post("/graphql", self.graphql)
+        self.runner: web.AppRunner | None = None
+        self.url = ""
+
+    async def start(self) -> str:
+        """Start the server and return its base url"""
+        self.runner = web.AppRunner(self.app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]  # noqa: SLF001
+        self.url = f"http://127.0.0.1:{port}"
+        return self.url
+
+    async def stop(self) -> None:
+        """Stop the server"""
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+    def reset(self) -> None:
+        """Reset the counters"""
+        self.requests.clear()
+        self.bytes_sent.clear()
+        self.errors.clear()
+
+    async def _respond(self, endpoint: str, payload: object) -> web.Response:
+        self.requests[endpoint] += 1
+        await asyncio.sleep(
+            max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))  # noqa: S311
+        )
+        if random.random() < self.error_rate:  # noqa: S311
+            self.errors[endpoint] += 1
+            return web.Response(status=502, text="Bad Gateway")
+        body = json.dumps(payload).encode()
+        self.bytes_sent[endpoint] += len(body)
+        return web.Response(body=body, content_type="application/json")
+
+    async def product(self, request: web.Request) -> web.Response:
+        """Serve the product"""
+        product = self.fixtures.product(int(request.match_info["id"]))
+        if random.random() < self.change_rate:  # noqa: S311
+            for sku in product["skuList"]:
+                sku["purchasePrice"] += random.choice([-10, 10])  # noqa: S311
+                sku["availableAmount"] = random.randrange(20)  # noqa: S311
+        return await self._respond("product", {"payload": {"data": product}})
+
+    async def reviews(self, request: web.Request) -> web.Response:
+        """Serve the product reviews"""
+        reviews = self.fixtures.reviews(int(request.match_info["id"]))
+        return await self._respond("reviews", {"payload": reviews})
+
+    async def actions(self, request: web.Request) -> web.Response:
+        """Serve the product actions"""
+        actions = self.fixtures.actions(int(request.match_info["id"]))
+        return await self._respond("actions", actions)
+
+    async def graphql(self, request: web.Request) -> web.Response:
+        """Serve the aliased makeSearch operations"""
+        body = await request.json()
+        # the cards are trimmed to the fields named in the document
+        selected = set(re.findall(r"\w+", body["query"]))
+        data = {}
+        for alias, query_input in body["variables"].items():
+            pagination = query_input["pagination"]
+            if "shopId" in query_input:
+                cards = self.fixtures.shop(query_input["shopId"])
+            else:
+                cards = self.fixtures.search(query_input["text"])
+            offset = pagination["offset"]
+            data[alias] = {
+                "items": [
+                    {"catalogCard": select(card, selected)}
+                    for card in cards[offset : offset + pagination["limit"]]
+                ],
+                "total": len(cards),
+            }
+        return await self._respond("search", {"data": data})
@@ -0,0 +1,97 @@
+import hashlib
+import itertools
+import json
+from collections import Counter
+from collections.abc import Callable
+from types import SimpleNamespace
+
+
+class FakeWorksheet:
+    """In-memory worksheet holding the task rows"""
+
+    def __init__(self, title: str, sheet_id: int, rows: list[list[str]]) -> None:
+        self.title = title
+        self.id = sheet_id
+        self.rows = rows
+
+
+class FakeSpreadsheet:
+    """
+    In-memory spreadsheet answering the calls
+    the SheetsGateway makes and counting them
+    """
+
+    def __init__(self, worksheets: list[FakeWorksheet]) -> None:
+        self.worksheets = {worksheet.title: worksheet for worksheet in worksheets}
+        self.calls: Counter[str] = Counter()
+        self.cells_written = 0
+
+    @property
+    def ss(self) -> "FakeSpreadsheet":
+        """Mimic the wrapped gspread spreadsheet"""
+        return self
+
+    @property
+    def cm(self) -> "FakeSpreadsheet":
+        """Mimic the client manager of the spreadsheet"""
+        return self
+
+    async def _call(
+        self, method: Callable[..., object], *args: object, **kwargs: object
+    ) -> object:
+        """Call the gspread method like the client manager does"""
+        return method(*args, **kwargs)
+
+    def get_lastUpdateTime(self) -> str:  # noqa: N802
+        """Return the same revision until the task rows change"""
+        self.calls["drive"] += 1
+        return hashlib.sha1(  # noqa: S324
+            json.dumps(
+                [worksheet.rows for worksheet in self.worksheets.values()],
+                ensure_ascii=False,
+            ).encode()
+        ).hexdigest()
+
+    async def values_batch_get(self, ranges: list[str]) -> dict:
+        """Return the rows of the worksheets"""
+        self.calls["values_batch_get"] += 1
+        return {
+            "valueRanges": [
+                {
+                    "range": range_name,
+                    "values": self.worksheets[range_name.split("!")[0].strip("'")].rows,
+                }
+                for range_name in ranges
+            ]
+        }
+
+    async def values_batch_update(self, body: dict) -> dict:
+        """Count the written cells"""
+        self.calls["values_batch_update"] += 1
+        self.cells_written += sum(
+            len(row) for data in body["data"] for row in data["values"]
+        )
+        return {}
+
+    async def batch_update(self, body: dict) -> dict:
+        """Count the structural requests"""
+        self.calls["batch_update"] += 1
+        self.calls["requests"] += len(body["requests"])
+        return {}
+
+
+class FakeBot:
+    """Bot counting the sent and edited messages"""
+
+    def __init__(self) -> None:
+        self.calls: Counter[str] = Counter()
+        self.message_ids = itertools.count(1)
+
+    async def send_message(self, *_: object, **__: object) -> SimpleNamespace:
+        """Count the sent message"""
+        self.calls["send_message"] += 1
+        return SimpleNamespace(message_id=next(self.message_ids))
+
+    async def edit_message_text(self, *_: object, **__: object) -> None:
+        """Count the edited message"""
+        self.calls["edit_message_text"] += 1
@@ -0,0 +1,289 @@
+import json
+import random
+from pathlib import Path
+from typing import Any
+
+COLORS = ["Белый", "Чёрный", "Красный", "Синий", "Зелёный", "Серый", "Бежевый"]
+SIZES = ["XS", "S", "M", "L", "XL", "XXL", "3XL", "4XL"]
+
+
+def make_seller(seller_id: int) -> dict[str, Any]:
+    """Return the seller payload"""
+    return {
+        "id": seller_id,
+        "title": f"Магазин {seller_id}",
+        "link": f"shop-{seller_id}",
+        "hasCharityProducts": False,
+        "registrationDate": "2021-01-01T00:00:00",
+        "rating": 4.8,
+        "reviews": 1000,
+        "orders": 10000,
+        "official": False,
+        "contacts": [],
+        "categories": [],
+        "filters": [],
+        "appliedFilters": [],
+        "totalProducts": 100,
+        "parents": [],
+        "products": [],
+        "sellerAccountId": seller_id,
+    }
+
+
+def make_characteristics(product_id: int, sku_count: int) -> list[dict[str, Any]]:
+    """
+    Return the product characteristics
+    with enough values for sku_count skus
+    """
+    sizes = SIZES[: max(1, min(len(SIZES), sku_count // len(COLORS) + 1))]
+    colors = [
+        f"{COLORS[index % len(COLORS)]} {index // len(COLORS) or ''}".strip()
+        for index in range(max(1, -(-sku_count // len(sizes))))
+    ]
+    return [
+        {
+            "id": product_id * 10 + char_index,
+            "title": title,
+            "values": [
+                {
+                    "id": product_id * 1000 + char_index * 100 + value_index,
+                    "title": value,
+                    "value": value,
+                }
+                for value_index, value in enumerate(values)
+            ],
+        }
+        for char_index, (title, values) in enumerate(
+            [("Цвет", colors), ("Размер", sizes)]
+        )
+    ]
+
+
+def sku_value_indexes(
+    characteristics: list[dict[str, Any]], sku_count: int
+) -> list[tuple[int, int]]:
+    """Return the characteristic value indexes of each sku"""
+    sizes = len(characteristics[1]["values"])
+    return [(index // sizes, index % sizes) for index in range(sku_count)]
+
+
+def make_product(
+    product_id: int, sku_count: int = 4, price: int = 1000
+) -> dict[str, Any]:
+    """Return the product payload"""
+    characteristics = make_characteristics(product_id, sku_count)
+    return {
+        "id": product_id,
+        "title": f"Товар {product_id}",
+        "category": {"id": 1, "title": "Категория"},
+        "rating": 4.7,
+        "reviewsAmount": 10,
+        "ordersAmount": 100,
+        "rOrdersAmount": 100,
+        "totalAvailableAmount": 10 * sku_count,
+        "description": "Описание товара " * 20,
+        "comments": [],
+        "attributes": ["Атрибут"] * 5,
+        "tags": [],
+        "synonyms": [],
+        "photos": [{"photoKey": f"photo-{i}"} for i in range(5)],
+        "hasCircularPhotos": False,
+        "circularPhotosList": [],
+        "characteristics": characteristics,
+        "skuList": [
+            {
+                "id": product_id * 100 + index,
+                "characteristics": [
+                    {"charIndex": 0, "valueIndex": color},
+                    {"charIndex": 1, "valueIndex": size},
+                ],
+                "availableAmount": 10,
+                "fullPrice": price * 2,
+                "purchasePrice": price,
+                "barcode": 4600000000000 + index,
+                "dimension": {},
+                "installment": None,
+                "productOptionDtos": [],
+                "vat": {},
+                "circularPhotosList": [],
+                "sellPrice": price,
+            }
+            for index, (color, size) in enumerate(
+                sku_value_indexes(characteristics, sku_count)
+            )
+        ],
+        "seller": make_seller(product_id % 10 + 1),
+        "topFeedback": None,
+        "isEco": False,
+        "isPerishable": False,
+        "hasVerticalPhoto": False,
+        "showKitty": False,
+        "bonusProduct": False,
+        "badges": [],
+        "colorPhotoPreview": False,
+        "favourite": False,
+        "adultCategory": False,
+    }
+
+
+def make_reviews(product: dict[str, Any], count: int) -> list[dict[str, Any]]:
+    """Return the reviews payload spread over the product skus"""
+    characteristics = product["characteristics"]
+    skus = product["skuList"]
+    return [
+        {
+            "reviewId": product["id"] * 1000 + index,
+            "productId": product["id"],
+            "date": "2023-01-01T00:00:00",
+            "edited": False,
+            "customer": "Покупатель",
+            "rating": index % 5 + 1,
+            "characteristics": [
+                {
+                    "characteristic": characteristics[char["charIndex"]]["title"],
+                    "characteristicValue": characteristics[char["charIndex"]]["values"][
+                        char["valueIndex"]
+                    ]["title"],
+                }
+                for char in skus[index % len(skus)]["characteristics"]
+            ],
+            "content": "Отзыв",
+            "photos": [],
+            "status": "PUBLISHED",
+            "like": False,
+            "dislike": False,
+            "amountLike": 0,
+            "amountDislike": 0,
+            "id": product["id"] * 1000 + index,
+            "isAnonymous": False,
+        }
+        for index in range(count)
+    ]
+
+
+def make_card(product: dict[str, Any], sku: dict[str, Any]) -> dict[str, Any]:
+    """Return the catalog card of the product sku"""
+    characteristics = product["characteristics"]
+    return {
+        "characteristicValues": [
+            {
+                "characteristic": {"id": characteristics[char["charIndex"]]["id"]},
+                "id": characteristics[char["charIndex"]]["values"][char["valueIndex"]][
+                    "id"
+                ],
+                "title": characteristics[char["charIndex"]]["values"][
+                    char["valueIndex"]
+                ]["title"],
+            }
+            for char in sku["characteristics"]
+        ],
+        "feedbackQuantity": 10,
+        "id": sku["id"],
+        "minFullPrice": sku["fullPrice"],
+        "minSellPrice": sku["sellPrice"],
+        "ordersQuantity": 100,
+        "productId": product["id"],
+        "rating": product["rating"],
+        "title": product["title"],
+    }
+
+
+def make_search_result(
+    products: list[dict[str, Any]], total: int, seed: str
+) -> list[dict[str, Any]]:
+    """
+    Return total catalog cards of the search
+    with the cards of the products spread among them
+    """
+    rnd = random.Random(seed)  # noqa: S311
+    cards = [
+        make_card(filler, filler["skuList"][0])
+        for filler in (
+            make_product(9_000_000 + rnd.randrange(1_000_000), 1)
+            for _ in range(max(0, total - sum(len(p["skuList"]) for p in products)))
+        )
+    ]
+    for product in products:
+        for sku in product["skuList"]:
+            cards.insert(rnd.randrange(len(cards) + 1), make_card(product, sku))
+    return cards[:total]
+
+
+class FixtureStore:
+    """
+    Marketplace responses served by the fake server,
+    recorded responses are read from the directory
+    and the missing ones are generated
+    """
+
+    def __init__(
+        self,
+        directory: Path | None = None,
+        sku_count: int = 4,
+        review_count: int = 50,
+        search_total: int = 250,
+    ) -> None:
+        self.directory = directory
+        self.sku_count = sku_count
+        self.review_count = review_count
+        self.search_total = search_total
+        self.products: dict[int, dict[str, Any]] = {}
+        self.queries: dict[str, list[int]] = {}
+        self.searches: dict[str, list[dict[str, Any]]] = {}
+
+    def _recorded(self, *parts: str) -> Any | None:  # noqa: ANN401
+        if self.directory is None:
+            return None
+        path = self.directory.joinpath(*parts)
+        if not path.exists():
+            return None
+        return json.loads(path.read_text(encoding="utf-8"))
+
+    def add_query(self, text: str, product_ids: list[int]) -> None:
+        """Make the products appear in the search results of the query"""
+        self.queries.setdefault(text, []).extend(product_ids)
+        self.searches.pop(text, None)
+
+    def product(self, product_id: int) -> dict[str, Any]:
+        """Return the product payload"""
+        if product_id not in self.products:
+            self.products[product_id] = self._recorded(
+                "product", f"{product_id}.json"
+            ) or make_product(product_id, self.sku_count)
+        return self.products[product_id]
+
+    def reviews(self, product_id: int) -> list[dict[str, Any]]:
+        """Return the reviews payload"""
+        return self._recorded("reviews", f"{product_id}.json") or make_reviews(
+            self.product(product_id), self.review_count
+        )
+
+    def actions(self, product_id: int) -> list[dict[str, Any]]:
+        """Return the actions payload"""
+        return self._recorded("actions", f"{product_id}.json") or [
+            {"text": f"{product_id % 50 + 1} человек купили на этой неделе"}
+        ]
+
+    def search(self, text: str) -> list[dict[str, Any]]:
+        """Return all the catalog cards of the search"""
+        if text not in self.searches:
+            self.searches[text] = self._recorded(
+                "search", f"{text}.json"
+            ) or make_search_result(
+                [self.product(pid) for pid in self.queries.get(text, [])],
+                self.search_total,
+                text,
+            )
+        return self.searches[text]
+
+    def shop(self, seller_id: int) -> list[dict[str, Any]]:
+        """Return the catalog cards of the seller products"""
+        # the seller of the product is product_id % 10 + 1
+        return [
+            make_card(product, sku)
+            for product in (
+                self.product(100_000 + k * 10 + seller_id - 1)
+                for k in range(make_seller(seller_id)["totalProducts"])
+            )
+            for sku in product["skuList"]
+        ]
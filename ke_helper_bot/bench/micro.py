@@ -0,0 +1,167 @@
+"""
+Micro-benchmarks of the CPU-bound parser hot paths
+
+Run from the ke_helper_bot directory:
+    python -m bench.micro --save baseline.json
+    python -m bench.micro --baseline baseline.json
+"""
+
+import argparse
+import json
+import sys
+import timeit
+from collections.abc import Callable
+from dataclasses import dataclass
+from pathlib import Path
+
+from ke_parser.columnar import SearchResults
+from ke_parser.ke_parser import KEParser
+from ke_parser.models import CatalogCard, CharacteristicView, Product, Review
+
+from .fixtures import make_card, make_product, make_reviews, make_search_result
+
+
+@dataclass(frozen=True)
+class Case:
+    """A benchmarked function and the sizes to run it with"""
+
+    name: str
+    setup: Callable[[int], Callable[[], object]]
+    sizes: tuple[int, ...]
+
+
+def product_validation(sku_count: int) -> Callable[[], object]:
+    payload = make_product(100_000, sku_count)
+    return lambda: Product.model_validate(payload)
+
+
+def search_page_validation(page_size: int) -> Callable[[], object]:
+    page = make_search_result([], page_size, "micro")
+    for position, card in enumerate(page, 1):
+        card["position"] = position
+        card["cards_count"] = page_size
+    return lambda: [CatalogCard.model_validate(card) for card in page]
+
+
+def search_page_columns(page_size: int) -> Callable[[], object]:
+    page = {
+        "items": [
+            {"catalogCard": card} for card in make_search_result([], page_size, "micro")
+        ],
+        "total": page_size,
+    }
+    return lambda: SearchResults.from_page(page, 0)
+
+
+def review_matching(review_count: int) -> Callable[[], object]:
+    payload = make_product(100_000, 20)
+    product = Product.model_validate(payload)
+    reviews = [
+        Review.model_validate(review) for review in make_reviews(payload, review_count)
+    ]
+    char_view = CharacteristicView(product.characteristics, product.sku_list[0])
+    return lambda: [char_view == review.characteristics for review in reviews]
+
+
+def card_matching(card_count: int) -> Callable[[], object]:
+    payload = make_product(100_000, 20)
+    product = Product.model_validate(payload)
+    cards = [
+        CatalogCard.model_validate(
+            {
+                **make_card(payload, payload["skuList"][index % 20]),
+                "position": index,
+                "cards_count": card_count,
+            }
+        )
+        for index in range(card_count)
+    ]
+    char_view = CharacteristicView(product.characteristics, product.sku_list[0])
+    return lambda: [char_view == card.characteristic_values for card in cards]
+
+
+def columnar_matching(card_count: int) -> Callable[[], object]:
+    payload = make_product(100_000, 20)
+    product = Product.model_validate(payload)
+    results = SearchResults.from_page(
+        {
+            "items": [
+                {"catalogCard": make_card(payload, payload["skuList"][index % 20])}
+                for index in range(card_count)
+            ],
+            "total": card_count,
+        },
+        0,
+    )
+    # the last sku is matched after all the others
+    char_view = CharacteristicView(product.characteristics, product.sku_list[-1])
+    return lambda: results.find(product.id, char_view)
+
+
+def rating_aggregation(review_count: int) -> Callable[[], object]:
+    payload = make_product(100_000, 20)
+    product = Product.model_validate(payload)
+    reviews = [
+        Review.model_validate(review) for review in make_reviews(payload, review_count)
+    ]
+    return lambda: KEParser.aggregate_ratings(product, reviews)
+
+
+CASES = (
+    Case("Product.model_validate", product_validation, (10, 100, 500)),
+    Case("CatalogCard page", search_page_validation, (100,)),
+    Case("SearchResults page", search_page_columns, (100,)),
+    Case("CharacteristicView == reviews", review_matching, (100, 1000, 5000)),
+    Case("CharacteristicView == cards", card_matching, (100, 1000, 5000)),
+    Case("SearchResults.find", columnar_matching, (100, 1000, 5000)),
+    Case("aggregate_ratings", rating_aggregation, (100, 1000, 5000)),
+)
+
+
+def measure(func: Callable[[], object], repeat: int) -> float:
+    """Return the best time of one call in seconds"""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--baseline", type=Path, help="fail on slowdowns against it")
+    parser.add_argument("--save", type=Path, help="save the results as a baseline")
+    parser.add_argument("--tolerance", type=float, default=1.25)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--filter", default="", help="run the matching cases only")
+    args = parser.parse_args()
+
+    baseline = (
+        json.loads(args.baseline.read_text(encoding="utf-8")) if args.baseline else {}
+    )
+    results: dict[str, float] = {}
+    regressions = []
+    for case in CASES:
+        if args.filter not in case.name:
+            continue
+        for size in case.sizes:
+            key = f"{case.name}[{size}]"
+            results[key] = measure(case.setup(size), args.repeat)
+            line = f"{key:<40}{results[key] * 1e6:>12.1f} us"
+            if key in baseline:
+                ratio = results[key] / baseline[key]
+                line += f"{ratio:>8.2f}x"
+                if ratio > args.tolerance:
+                    regressions.append(key)
+                    line += "  REGRESSION"
+            sys.stdout.write(line + "\n")
+    if args.save:
+        args.save.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    if regressions:
+        sys.stdout.write(
+            f"{len(regressions)} regression(s): {', '.join(regressions)}\n"
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -18,6 +18,45 @@ class Settings(BaseSettings):
     MY_STOCK_NOTIF_TABLE_ID: int
     COM_NOTIF_TABLE_ID: int
     COM_STOCK_NOTIF_TABLE_ID: int
+    SHEETS_QUOTA_PER_MINUTE: int = 60
+    SHEETS_BATCH_WINDOW: float = 0.5
+    DIGEST_THRESHOLD: int = 5
+    METRICS_ENABLED: bool = False
+    METRICS_HOST: str = "127.0.0.1"
+    METRICS_PORT: int = 9100
+    TRACE_FILE: str | None = None
+    REQUEST_ATTEMPTS: int = 4
+    REQUEST_TIMEOUT: float = 20.0
+    MARKETPLACE_CONCURRENCY: int = 32
+    INTERACTIVE_DEADLINE: float = 60.0
+    SEARCH_BATCH_SIZE: int = 10
+    SEARCH_PROFILE: str = "position"
+    SEARCH_PAGE_SIZE: int = 100
+    CHECKPOINT_DIR: str = "checkpoints"
+    CATALOG_DB: str = "catalog.sqlite3"
+    CHECKPOINT_MAX_AGE: float = 6 * 60 * 60
+    REPORT_CHUNK_SIZE: int = 20
+    REPORT_WRITES_PER_MINUTE: int = 20
+    # the relative gap of the lost price or position to alert about
+    COMPARISON_ALERT_MARGIN: float = 0.1
+    POLL_MIN_INTERVAL: float = 2 * 60
+    POLL_MAX_INTERVAL: float = 60 * 60
+    POLL_REQUESTS_PER_MINUTE: int = 120
+    POLL_TICK: float = 15
+    # the parsing runs inline without the workers
+    OFFLOAD_WORKERS: int = 0
+    OFFLOAD_MIN_BYTES: int = 256 * 1024
+    OFFLOAD_MIN_PAIRS: int = 20000
+    # the monitoring is left to the worker processes
+    SHARDED_MONITORING: bool = False
+    SHARD_STORE: str = "shards.sqlite3"
+    SHARD_COUNT: int = 16
+    SHARD_LEASE_TTL: float = 60.0
+    RANK_DB: str = "ranks.sqlite3"
+    RANK_TRACK_INTERVAL: float = 6 * 60 * 60
+    RANK_SNAPSHOTS: int = 30
+    # the tracked products moved by fewer positions are not reported
+    RANK_ALERT_SHIFT: int = 10
 
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
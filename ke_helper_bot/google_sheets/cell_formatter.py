@@ -1,10 +1,8 @@
-from gspread_asyncio import AsyncioGspreadSpreadsheet
+from .gateway import SheetsGateway
 
 
-async def update(spreadsheet: AsyncioGspreadSpreadsheet, *requests: list[dict]) -> None:
-    await spreadsheet.batch_update(
-        {"requests": [r for r_list in requests for r in r_list]}, nowait=True
-    )
+async def update(sheets: SheetsGateway, *requests: list[dict]) -> None:
+    await sheets.batch_update([r for r_list in requests for r in r_list])
 
 
 def update_size(sheet_id: int, col_sizes: list[int]) -> list[dict]:
@@ -102,13 +100,13 @@ cond_rule_colors = {
 }
 
 
-def boolean_rule(
+def text_equal_rule(
     sheet_id: int,
     start_row: int,
     end_row: int,
     start_col: int,
     end_col: int,
-    formula: str,
+    text: str,
     color: str,
 ) -> list[dict]:
     return [
@@ -126,8 +124,8 @@ def boolean_rule(
                     ],
                     "booleanRule": {
                         "condition": {
-                            "type": "CUSTOM_FORMULA",
-                            "values": [{"userEnteredValue": formula}],
+                            "type": "TEXT_EQ",
+                            "values": [{"userEnteredValue": text}],
                         },
                         "format": {"backgroundColor": cond_rule_colors[color]},
                     },
@@ -137,36 +135,37 @@ def boolean_rule(
     ]
 
 
-def text_equal_rule(
-    sheet_id: int,
-    start_row: int,
-    end_row: int,
-    start_col: int,
-    end_col: int,
-    text: str,
-    color: str,
+def backgrounds(
+    sheet_id: int, start_row: int, start_col: int, colors: list[list[str | None]]
 ) -> list[dict]:
+    if not colors:
+        return []
     return [
         {
-            "addConditionalFormatRule": {
-                "rule": {
-                    "ranges": [
-                        {
-                            "sheetId": sheet_id,
-                            "startRowIndex": start_row,
-                            "endRowIndex": end_row,
-                            "startColumnIndex": start_col,
-                            "endColumnIndex": end_col,
-                        }
-                    ],
-                    "booleanRule": {
-                        "condition": {
-                            "type": "TEXT_EQ",
-                            "values": [{"userEnteredValue": text}],
-                        },
-                        "format": {"backgroundColor": cond_rule_colors[color]},
-                    },
-                }
+            "updateCells": {
+                "range": {
+                    "sheetId": sheet_id,
+                    "startRowIndex": start_row,
+                    "endRowIndex": start_row + len(colors),
+                    "startColumnIndex": start_col,
+                    "endColumnIndex": start_col + max(map(len, colors)),
+                },
+                "rows": [
+                    {
+                        "values": [
+                            {
+                                "userEnteredFormat": {
+                                    "backgroundColor": cond_rule_colors[color]
+                                }
+                                if color is not None
+                                else {}
+                            }
+                            for color in row
+                        ]
+                    }
+                    for row in colors
+                ],
+                "fields": "userEnteredFormat.backgroundColor",
             }
         }
     ]
@@ -0,0 +1,74 @@
+import hashlib
+import json
+import logging
+import time
+from pathlib import Path
+from typing import IO
+
+logger = logging.getLogger(__name__)
+
+
+class Checkpoint:
+    """
+    Completed rows of a report run stored as JSON lines,
+    the first line holds the key of the task records
+    the run was started with
+    """
+
+    def __init__(self, directory: Path, name: str, records: list) -> None:
+        self.path = directory / f"{name}.jsonl"
+        self.key = hashlib.sha1(
+            json.dumps(records, ensure_ascii=False).encode(), usedforsecurity=False
+        ).hexdigest()
+        self.file: IO[str] | None = None
+
+    def load(self, max_age: float) -> dict[int, list]:
+        """
+        Return the completed rows of the interrupted run
+        started with the same records no longer than max_age seconds ago
+        """
+        if not self.path.exists():
+            return {}
+        rows: dict[int, list] = {}
+        with self.path.open(encoding="utf-8") as file:
+            try:
+                header = json.loads(file.readline())
+            except json.JSONDecodeError:
+                return {}
+            if header["key"] != self.key or time.time() - header["started"] > max_age:
+                return {}
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # the line was cut by the crash
+                    break
+                rows[entry["index"]] = entry["row"]
+        logger.info("Resuming %s with %s completed rows", self.path, len(rows))
+        return rows
+
+    def start(self, *, resume: bool) -> None:
+        """Open the checkpoint, a new run drops the previous one"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if resume:
+            self.file = self.path.open("a", encoding="utf-8")
+            return
+        self.file = self.path.open("w", encoding="utf-8")
+        self.file.write(json.dumps({"key": self.key, "started": time.time()}) + "\n")
+        self.file.flush()
+
+    def add(self, index: int, row: list) -> None:
+        """Store the completed row"""
+        if self.file is None:
+            return
+        self.file.write(
+            json.dumps({"index": index, "row": row}, ensure_ascii=False) + "\n"
+        )
+        self.file.flush()
+
+    def remove(self) -> None:
+        """Drop the checkpoint of the finished run"""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.path.unlink(missing_ok=True)
@@ -0,0 +1,131 @@
+import math
+import operator
+from array import array
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Metric:
+    """A compared column of the report"""
+
+    name: str
+    # 1 if the higher value is better, -1 if the lower one, 0 if not compared
+    direction: int
+    # the lost comparisons are reported to the admins
+    alert: bool = False
+
+
+# the report columns from H to N
+DAILY_METRICS = (
+    Metric("Отзывы", 1),
+    Metric("Рейтинг", 1),
+    Metric("Заказы", 1),
+    Metric("Заказы за 7 дн.", 1),
+    Metric("Остаток", 1),
+    Metric("Цена", -1, alert=True),
+    Metric("№ в поиске", -1, alert=True),
+)
+SHOP_METRICS = (
+    *DAILY_METRICS[:4],
+    Metric("Остаток", 0),
+    *DAILY_METRICS[5:],
+)
+# the positions of the compared values in the report rows
+DAILY_MINE = slice(6, 13)
+DAILY_THEIRS = slice(17, 24)
+SHOP_CURRENT = slice(6, 13)
+# the compared parts of the report rows kept until the report is written
+DAILY_COMPARED = (DAILY_MINE, DAILY_THEIRS)
+SHOP_COMPARED = (SHOP_CURRENT,)
+
+
+def number(value: object) -> float:
+    """Return the cell value as a number, NaN for the text"""
+    if isinstance(value, bool):
+        return math.nan
+    if isinstance(value, int | float):
+        return float(value)
+    if isinstance(value, str):
+        # the values read back are formatted with the locale
+        value = value.replace("\xa0", "").replace(" ", "").replace(",", ".")
+        try:
+            return float(value)
+        except ValueError:
+            return math.nan
+    return math.nan
+
+
+def compared_values(row: list, parts: tuple[slice, ...]) -> list[array]:
+    """Return the compared parts of the report row as numbers"""
+    return [array("d", map(number, row[part])) for part in parts]
+
+
+def number_text(value: float) -> str:
+    """Return the number as the report shows it"""
+    return str(int(value)) if value.is_integer() else str(value)
+
+
+def ratio(a: float, b: float) -> float:
+    return a / b if b else math.nan
+
+
+class Comparison:
+    """
+    The deltas, the ratios and the win or lose flags
+    of the each metric for all the pairs of rows,
+    computed column by column
+    """
+
+    def __init__(
+        self,
+        first: Sequence[Sequence],
+        second: Sequence[Sequence],
+        metrics: tuple[Metric, ...],
+    ) -> None:
+        self.metrics = metrics
+        self.first = [self.column(first, k) for k in range(len(metrics))]
+        self.second = [self.column(second, k) for k in range(len(metrics))]
+        self.deltas = [
+            array("d", map(operator.sub, a, b))
+            for a, b in zip(self.first, self.second, strict=True)
+        ]
+        self.ratios = [
+            array("d", map(ratio, a, b))
+            for a, b in zip(self.first, self.second, strict=True)
+        ]
+        # NaN is neither greater nor less, so the text values tie
+        self.flags = [
+            array("b", (metric.direction * ((d > 0) - (d < 0)) for d in deltas))
+            for metric, deltas in zip(metrics, self.deltas, strict=True)
+        ]
+
+    @staticmethod
+    def column(rows: Sequence[Sequence], k: int) -> array:
+        """Return the k-th values of the rows as numbers"""
+        return array(
+            "d", (number(row[k]) if k < len(row) else math.nan for row in rows)
+        )
+
+    def colors(self, win: str, lose: str) -> list[list[str | None]]:
+        """Return the background color of the each compared cell"""
+        palette = {1: win, -1: lose, 0: None}
+        return [
+            [palette[flag] for flag in row] for row in zip(*self.flags, strict=True)
+        ]
+
+    def losses(self, margin: float) -> dict[int, list[int]]:
+        """
+        Return the rows with the lost alert metrics
+        differing by the margin at least
+        """
+        losses: dict[int, list[int]] = {}
+        for k, metric in enumerate(self.metrics):
+            if not metric.alert:
+                continue
+            for index, (flag, rel) in enumerate(
+                zip(self.flags[k], self.ratios[k], strict=True)
+            ):
+                if flag < 0 and abs(rel - 1) >= margin:
+                    losses.setdefault(index, []).append(k)
+        return losses
@@ -0,0 +1,380 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from collections.abc import Callable, Coroutine
+from dataclasses import dataclass
+from typing import Any
+
+from gspread.exceptions import APIError
+from gspread.utils import ValueInputOption, absolute_range_name, rowcol_to_a1
+from gspread_asyncio import (
+    AsyncioGspreadClientManager,
+    AsyncioGspreadSpreadsheet,
+    AsyncioGspreadWorksheet,
+)
+from metrics.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class QuotaTracker:
+    """
+    Sliding-window counter of Sheets API
+    requests made during the last minute
+    """
+
+    window = 60.0
+
+    def __init__(self, per_minute: int) -> None:
+        self.per_minute = per_minute
+        self.calls: deque[float] = deque()
+
+    def _expire(self, now: float) -> None:
+        while self.calls and now - self.calls[0] >= self.window:
+            self.calls.popleft()
+
+    def used(self) -> int:
+        """Return the number of requests made during the window"""
+        self._expire(time.monotonic())
+        return len(self.calls)
+
+    async def acquire(self) -> None:
+        """Wait until the quota allows one more request"""
+        while True:
+            now = time.monotonic()
+            self._expire(now)
+            if len(self.calls) < self.per_minute:
+                self.calls.append(now)
+                return
+            wait = self.window - (now - self.calls[0])
+            logger.warning("Sheets quota exhausted, waiting %.1f s", wait)
+            await asyncio.sleep(wait)
+
+
+class QuotaAwareClientManager(AsyncioGspreadClientManager):
+    """
+    Client manager that keeps the requests within
+    the per-minute quota and backs off on errors
+    with exponential delay and full jitter
+    """
+
+    def __init__(
+        self,
+        credentials_fn: Callable,
+        per_minute: int = 60,
+        backoff_base: float = 2.0,
+        backoff_cap: float = 64.0,
+    ) -> None:
+        super().__init__(credentials_fn)
+        self.quota = QuotaTracker(per_minute)
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.errors = 0
+        self.last_error = 0.0
+
+    async def delay(self) -> None:
+        """Wait for the quota before each gspread call"""
+        if self.errors and time.monotonic() - self.last_error > self.backoff_cap:
+            self.errors = 0
+        await super().delay()
+        await self.quota.acquire()
+
+    async def handle_gspread_error(
+        self,
+        e: APIError,
+        method: Callable,
+        args: tuple,  # noqa: ARG002
+        kwargs: dict,  # noqa: ARG002
+    ) -> None:
+        """Sleep for a jittered exponential delay and retry"""
+        self.errors += 1
+        self.last_error = time.monotonic()
+        metrics.retry(f"sheets.{method.__name__}")
+        delay = random.uniform(  # noqa: S311
+            0, min(self.backoff_cap, self.backoff_base * 2**self.errors)
+        )
+        logger.warning(
+            "Sheets API error %s in %s, retrying in %.1f s",
+            e.response.status_code,
+            method.__name__,
+            delay,
+        )
+        await asyncio.sleep(delay)
+
+
+@dataclass
+class _Operation:
+    kind: str
+    payload: Any
+    future: asyncio.Future
+
+
+class SheetsGateway:
+    """
+    Single entry point for Sheets calls
+    merging the operations issued within
+    a short window into batch requests
+    """
+
+    def __init__(self, spreadsheet: AsyncioGspreadSpreadsheet, window: float) -> None:
+        self.ss = spreadsheet
+        self.window = window
+        self.pending: list[_Operation] = []
+        self.flusher: asyncio.Task | None = None
+        self.lock = asyncio.Lock()
+        self.sending: set[asyncio.Task] = set()
+
+    def _submit(self, kind: str, payload: Any) -> asyncio.Future:  # noqa: ANN401
+        operation = _Operation(
+            kind, payload, asyncio.get_running_loop().create_future()
+        )
+        self.pending.append(operation)
+        if self.flusher is None:
+            self.flusher = asyncio.create_task(self._flush_later())
+        return operation.future
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.window)
+        self.flusher = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        """
+        Send the pending operations keeping their order,
+        adjacent operations of the same kind are merged
+        """
+        await self._shielded(self._flush())
+
+    async def _flush(self) -> None:
+        async with self.lock:
+            pending, self.pending = self.pending, []
+            await self._send(pending)
+
+    async def _shielded(self, coro: Coroutine[Any, Any, None]) -> None:
+        # the operations of the other callers are sent along,
+        # so the cancelled caller stops waiting but not sending
+        task = asyncio.create_task(coro)
+        self.sending.add(task)
+        task.add_done_callback(self.sending.discard)
+        await asyncio.shield(task)
+
+    async def _send(self, pending: list[_Operation]) -> None:
+        senders: dict[str, Callable[[list], Coroutine]] = {
+            "get": self._send_reads,
+            "values": self._send_values,
+            "requests": self._send_requests,
+        }
+        group: list[_Operation] = []
+        try:
+            for operation in [*pending, None]:
+                if group and (
+                    operation is None
+                    or operation.kind != group[0].kind
+                    or (
+                        operation.kind == "values"
+                        and operation.payload[0] != group[0].payload[0]
+                    )
+                ):
+                    await self._send_group(senders[group[0].kind], group)
+                    group = []
+                if operation is not None:
+                    group.append(operation)
+        finally:
+            # no caller is left waiting if the sending itself is cancelled
+            for operation in pending:
+                if not operation.future.done():
+                    operation.future.cancel()
+
+    @staticmethod
+    async def _send_group(
+        sender: Callable[[list], Coroutine], group: list[_Operation]
+    ) -> None:
+        try:
+            results = await sender([op.payload for op in group])
+        except Exception as e:  # noqa: BLE001
+            for op in group:
+                # the future of the cancelled caller is done already
+                if not op.future.done():
+                    op.future.set_exception(e)
+        else:
+            for op, result in zip(group, results, strict=True):
+                if not op.future.done():
+                    op.future.set_result(result)
+
+    async def _send_reads(self, ranges: list[str]) -> list[list[list]]:
+        with metrics.track("sheets.values_batch_get"):
+            resp = await self.ss.values_batch_get(ranges)
+        return [value_range.get("values", []) for value_range in resp["valueRanges"]]
+
+    async def _send_values(self, payloads: list[tuple[str, dict]]) -> list[None]:
+        with metrics.track("sheets.values_batch_update"):
+            await self.ss.values_batch_update(
+                {
+                    "valueInputOption": payloads[0][0],
+                    "data": [data for _, data in payloads],
+                }
+            )
+        return [None] * len(payloads)
+
+    async def _send_requests(self, payloads: list[list[dict]]) -> list[None]:
+        requests = [request for payload in payloads for request in payload]
+        if requests:
+            with metrics.track("sheets.batch_update"):
+                await self.ss.batch_update({"requests": requests})
+        return [None] * len(payloads)
+
+    async def last_update_time(self) -> str:
+        """
+        Return the spreadsheet modification time,
+        the Drive API call goes through the client manager
+        for its lock, quota and retries
+        """
+        return await self.ss.cm._call(self.ss.ss.get_lastUpdateTime)  # noqa: SLF001
+
+    async def get(self, worksheet: AsyncioGspreadWorksheet, range_name: str) -> list:
+        """Return the values of the worksheet range"""
+        return await self._submit(
+            "get", absolute_range_name(worksheet.title, range_name)
+        )
+
+    async def update(
+        self,
+        worksheet: AsyncioGspreadWorksheet,
+        range_name: str,
+        values: list[list],
+        value_input_option: ValueInputOption = ValueInputOption.raw,
+    ) -> None:
+        """Set the values of the worksheet range"""
+        await self._submit(
+            "values", _value_range(worksheet, range_name, values, value_input_option)
+        )
+
+    async def batch_update(self, requests: list[dict]) -> None:
+        """Apply the spreadsheet batchUpdate requests"""
+        await self._submit("requests", requests)
+
+    async def insert_cols(
+        self,
+        worksheet: AsyncioGspreadWorksheet,
+        values: list[list],
+        col: int = 1,
+        value_input_option: ValueInputOption = ValueInputOption.raw,
+    ) -> None:
+        """Insert the columns before col and fill them with values"""
+        range_name = (
+            f"{rowcol_to_a1(1, col)}:"
+            f"{rowcol_to_a1(max(map(len, values)), col + len(values) - 1)}"
+        )
+        await asyncio.gather(
+            self._submit(
+                "requests",
+                _insert_dimension(worksheet.id, "COLUMNS", col - 1, len(values)),
+            ),
+            self._submit(
+                "values",
+                _value_range(
+                    worksheet, range_name, values, value_input_option, "COLUMNS"
+                ),
+            ),
+        )
+
+    async def insert_row(
+        self,
+        worksheet: AsyncioGspreadWorksheet,
+        values: list,
+        index: int = 1,
+        value_input_option: ValueInputOption = ValueInputOption.raw,
+    ) -> None:
+        """Insert the row before index and fill it with values"""
+        await self.insert_rows(worksheet, [values], index, value_input_option)
+
+    async def insert_rows(
+        self,
+        worksheet: AsyncioGspreadWorksheet,
+        values: list[list],
+        index: int = 1,
+        value_input_option: ValueInputOption = ValueInputOption.raw,
+    ) -> None:
+        """Insert the rows before index and fill them with values"""
+        if not values:
+            return
+        range_name = (
+            f"{rowcol_to_a1(index, 1)}:"
+            f"{rowcol_to_a1(index + len(values) - 1, max(map(len, values)))}"
+        )
+        await asyncio.gather(
+            self._submit(
+                "requests",
+                _insert_dimension(worksheet.id, "ROWS", index - 1, len(values)),
+            ),
+            self._submit(
+                "values",
+                _value_range(worksheet, range_name, values, value_input_option),
+            ),
+        )
+
+    async def append_rows(
+        self,
+        worksheet: AsyncioGspreadWorksheet,
+        values: list[list],
+        table_range: str,
+        value_input_option: ValueInputOption = ValueInputOption.raw,
+    ) -> None:
+        """Append the rows after the table, the worksheet grows as needed"""
+        await self._shielded(
+            self._append_rows(worksheet, values, table_range, value_input_option)
+        )
+
+    async def _append_rows(
+        self,
+        worksheet: AsyncioGspreadWorksheet,
+        values: list[list],
+        table_range: str,
+        value_input_option: ValueInputOption,
+    ) -> None:
+        async with self.lock:
+            # the pending operations are applied before the append
+            pending, self.pending = self.pending, []
+            await self._send(pending)
+            with metrics.track("sheets.values_append"):
+                await worksheet.append_rows(
+                    values,
+                    value_input_option=value_input_option,
+                    insert_data_option="INSERT_ROWS",
+                    table_range=table_range,
+                )
+
+
+def _value_range(
+    worksheet: AsyncioGspreadWorksheet,
+    range_name: str,
+    values: list[list],
+    value_input_option: ValueInputOption,
+    major_dimension: str = "ROWS",
+) -> tuple[ValueInputOption, dict]:
+    return (
+        value_input_option,
+        {
+            "range": absolute_range_name(worksheet.title, range_name),
+            "majorDimension": major_dimension,
+            "values": values,
+        },
+    )
+
+
+def _insert_dimension(sheet_id: int, dimension: str, start: int, count: int) -> list:
+    return [
+        {
+            "insertDimension": {
+                "range": {
+                    "sheetId": sheet_id,
+                    "dimension": dimension,
+                    "startIndex": start,
+                    "endIndex": start + count,
+                },
+                "inheritFromBefore": False,
+            }
+        }
+    ]
@@ -0,0 +1,87 @@
+import asyncio
+import time
+from collections.abc import Iterator
+
+from gspread.utils import ValueInputOption
+from gspread_asyncio import AsyncioGspreadWorksheet
+
+from .gateway import SheetsGateway
+
+
+def contiguous_blocks(indexes: list[int]) -> Iterator[tuple[int, int]]:
+    """Return the start and the end of the each run of the sorted indexes"""
+    start = end = indexes[0]
+    for index in indexes[1:]:
+        if index != end + 1:
+            yield start, end + 1
+            start = index
+        end = index
+    yield start, end + 1
+
+
+class StreamingReportWriter:
+    """
+    Writes the completed report rows to the sheet
+    in contiguous blocks as they become ready,
+    the rows are dropped once written
+    """
+
+    def __init__(
+        self,
+        sheets: SheetsGateway,
+        worksheet: AsyncioGspreadWorksheet,
+        last_col: str,
+        total: int,
+        *,
+        chunk_size: int,
+        writes_per_minute: int,
+        first_row: int = 3,
+    ) -> None:
+        self.sheets = sheets
+        self.worksheet = worksheet
+        self.last_col = last_col
+        self.total = total
+        self.chunk_size = chunk_size
+        self.min_interval = 60 / writes_per_minute
+        self.first_row = first_row
+        self.pending: dict[int, list] = {}
+        self.completed = 0
+        self.last_write = float("-inf")
+
+    def restore(self, rows: dict[int, list]) -> None:
+        """Add the rows completed by the interrupted run"""
+        self.pending.update(rows)
+        self.completed += len(rows)
+
+    async def add(self, index: int, row: list) -> None:
+        """
+        Add the completed row, the pending rows are written
+        once there is a chunk of them and the write budget allows
+        """
+        self.pending[index] = row
+        self.completed += 1
+        if (
+            len(self.pending) >= self.chunk_size
+            and time.monotonic() - self.last_write >= self.min_interval
+        ):
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Write all the pending rows"""
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, {}
+        self.last_write = time.monotonic()
+        # the blocks are sent as one batch by the gateway
+        await asyncio.gather(
+            *(
+                self.sheets.update(
+                    self.worksheet,
+                    f"B{start + self.first_row}:"
+                    f"{self.last_col}{end + self.first_row - 1}",
+                    [pending[index] for index in range(start, end)],
+                    ValueInputOption.user_entered,
+                )
+                for start, end in contiguous_blocks(sorted(pending))
+            )
+        )
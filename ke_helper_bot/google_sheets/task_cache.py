@@ -0,0 +1,96 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+
+from gspread.utils import absolute_range_name
+from gspread_asyncio import AsyncioGspreadWorksheet
+from ke_parser.links import ParsedLink, parse_link
+
+from .gateway import SheetsGateway
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class TaskSheet:
+    """Parsed records of the task sheet range"""
+
+    digest: str
+    rows: list[list[str]]
+    links: dict[str, ParsedLink] = field(default_factory=dict)
+
+
+class TaskSheetCache:
+    """
+    Cache of task sheet ranges
+    re-reading them only after the spreadsheet
+    revision has changed and re-parsing them
+    only if the content hash has changed,
+    the revision is spreadsheet-wide, so the bot's own writes
+    to the reports and notifications cause a re-read too
+    """
+
+    def __init__(self, sheets: SheetsGateway, revision_ttl: float = 10.0) -> None:
+        self.sheets = sheets
+        self.revision_ttl = revision_ttl
+        self.revision: str | None = None
+        self.checked_at = 0.0
+        self.entries: dict[str, TaskSheet] = {}
+        self.stale: set[str] = set()
+        self.lock = asyncio.Lock()
+
+    async def _check_revision(self) -> None:
+        if time.monotonic() - self.checked_at < self.revision_ttl:
+            return
+        try:
+            revision = await self.sheets.last_update_time()
+        except Exception:
+            logger.exception("Failed to get the spreadsheet revision")
+            self.stale = set(self.entries)
+            return
+        self.checked_at = time.monotonic()
+        if revision != self.revision:
+            self.revision = revision
+            self.stale = set(self.entries)
+
+    def invalidate(self) -> None:
+        """Force re-reading of all the ranges"""
+        self.checked_at = 0.0
+        self.revision = None
+
+    async def get(
+        self, worksheet: AsyncioGspreadWorksheet, range_name: str
+    ) -> TaskSheet:
+        """Return the parsed task sheet range"""
+        key = absolute_range_name(worksheet.title, range_name)
+        async with self.lock:
+            await self._check_revision()
+            if key in self.entries and key not in self.stale:
+                return self.entries[key]
+            self.stale.discard(key)
+        rows = await self.sheets.get(worksheet, range_name)
+        digest = hashlib.sha1(  # noqa: S324
+            json.dumps(rows, ensure_ascii=False).encode()
+        ).hexdigest()
+        if key in self.entries and self.entries[key].digest == digest:
+            return self.entries[key]
+        logger.info("Task sheet range %s has changed", key)
+        self.entries[key] = parse_task_sheet(digest, rows)
+        return self.entries[key]
+
+
+def parse_task_sheet(digest: str, rows: list[list[str]]) -> TaskSheet:
+    """Parse the rows and precompute the ids of their links"""
+    task_sheet = TaskSheet(digest, rows)
+    for row in rows:
+        for cell in row:
+            if not cell.startswith("http") or cell in task_sheet.links:
+                continue
+            try:
+                task_sheet.links[cell] = parse_link(cell)
+            except ValueError:
+                continue
+    return task_sheet
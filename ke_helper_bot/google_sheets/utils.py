@@ -1,12 +1,11 @@
-from gspread_asyncio import AsyncioGspreadSpreadsheet
-
 from . import cell_formatter
+from .gateway import SheetsGateway
 
 
-async def format_daily_table(ss: AsyncioGspreadSpreadsheet, sheet_id: int) -> None:
+async def format_daily_table(sheets: SheetsGateway, sheet_id: int) -> None:
     """Apply all cell styles for the daily table"""
     await cell_formatter.update(
-        ss,
+        sheets,
         cell_formatter.update_size(
             sheet_id,
             [
@@ -43,12 +42,6 @@ async def format_daily_table(ss: AsyncioGspreadSpreadsheet, sheet_id: int) -> No
         cell_formatter.rotate(sheet_id, 2, 18, 26, 90),
         cell_formatter.update_borders(sheet_id, 0, 2, 0, 1000000, "SOLID"),
         cell_formatter.update_borders(sheet_id, 2, 1000000, 0, 1000000, "DASHED"),
-        cell_formatter.boolean_rule(sheet_id, 2, 1000000, 7, 12, "=GT(H3;S3)", "green"),
-        cell_formatter.boolean_rule(sheet_id, 2, 1000000, 7, 12, "=LT(H3;S3)", "red"),
-        cell_formatter.boolean_rule(sheet_id, 2, 1000000, 12, 14, "=GT(M3;X3)", "red"),
-        cell_formatter.boolean_rule(
-            sheet_id, 2, 1000000, 12, 14, "=LT(M3;X3)", "green"
-        ),
         cell_formatter.text_equal_rule(
             sheet_id, 1, 1000000, 1, 1000000, "no", "yellow"
         ),
@@ -61,91 +54,16 @@ async def format_daily_table(ss: AsyncioGspreadSpreadsheet, sheet_id: int) -> No
             "Не найдено",
             "yellow",
         ),
+        cell_formatter.text_equal_rule(
+            sheet_id, 1, 1000000, 1, 1000000, "Ошибка", "red"
+        ),
     )
 
 
-async def format_shop_table(
-    ss: AsyncioGspreadSpreadsheet,
-    my_shop_report_table_id: int,
-    com_shop_report_table_id: int,
-    sheet_id: int,
-) -> None:
+async def format_shop_table(sheets: SheetsGateway, sheet_id: int) -> None:
     """Apply all cell styles for the shop table"""
-    boolean_rules = {
-        my_shop_report_table_id: [
-            cell_formatter.boolean_rule(
-                my_shop_report_table_id,
-                2,
-                1000000,
-                7,
-                11,
-                "=GT(H3;V3)",
-                "green",
-            ),
-            cell_formatter.boolean_rule(
-                my_shop_report_table_id, 2, 1000000, 7, 11, "=LT(H3;V3)", "red"
-            ),
-            cell_formatter.boolean_rule(
-                my_shop_report_table_id,
-                2,
-                1000000,
-                12,
-                14,
-                "=GT(M3;AA3)",
-                "red",
-            ),
-            cell_formatter.boolean_rule(
-                my_shop_report_table_id,
-                2,
-                1000000,
-                12,
-                14,
-                "=LT(M3;AA3)",
-                "green",
-            ),
-        ],
-        com_shop_report_table_id: [
-            cell_formatter.boolean_rule(
-                com_shop_report_table_id,
-                2,
-                1000000,
-                7,
-                11,
-                "=GT(H3;V3)",
-                "red",
-            ),
-            cell_formatter.boolean_rule(
-                com_shop_report_table_id,
-                2,
-                1000000,
-                7,
-                11,
-                "=LT(H3;V3)",
-                "green",
-            ),
-            cell_formatter.boolean_rule(
-                com_shop_report_table_id,
-                2,
-                1000000,
-                12,
-                14,
-                "=GT(M3;AA3)",
-                "green",
-            ),
-            cell_formatter.boolean_rule(
-                com_shop_report_table_id,
-                2,
-                1000000,
-                12,
-                14,
-                "=LT(M3;AA3)",
-                "red",
-            ),
-        ],
-    }
-
     await cell_formatter.update(
-        ss,
+        sheets,
         cell_formatter.update_size(
             sheet_id,
             [150, 110, 110, 100, 60, 60, 30, 30, 30, 30, 30, 40, 30, 30],
@@ -160,5 +78,7 @@ async def format_shop_table(
         cell_formatter.text_equal_rule(
             sheet_id, 1, 1000000, 1, 1000000, "Не найдено", "yellow"
         ),
-        *boolean_rules[sheet_id],
+        cell_formatter.text_equal_rule(
+            sheet_id, 1, 1000000, 1, 1000000, "Ошибка", "red"
+        ),
     )
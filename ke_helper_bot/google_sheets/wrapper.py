@@ -1,23 +1,47 @@
 import asyncio
+import html
 import logging
+from array import array
+from collections.abc import Callable
+from contextlib import suppress
 from datetime import datetime as dt
 from datetime import timedelta, timezone
+from pathlib import Path
 from typing import ClassVar
 
 from aiogram import Bot
 from aiohttp import ClientSession
+from config_reader import config
 from google.oauth2.service_account import Credentials
-from gspread.utils import ValueInputOption
-from gspread_asyncio import (
-    AsyncioGspreadClientManager,
-    AsyncioGspreadSpreadsheet,
-)
+from gspread_asyncio import AsyncioGspreadSpreadsheet
+from ke_parser.crawler import CrawlResult, SellerCatalog, SellerCrawler
+from ke_parser.executor import background_job
 from ke_parser.ke_parser import KEParser
-from ke_parser.models import GoogleSheetProduct
-
-from config_reader import config
-
-from . import utils
+from ke_parser.links import ParsedLink, parse_link
+from ke_parser.models import GoogleSheetProduct, Product
+from ke_parser.ranks import RankStore, RankTracker
+from ke_parser.resilience import RequestFailedError
+from ke_parser.shared import sharing_results
+from monitoring.poller import AdaptivePoller
+from monitoring.shards import QueueNotifier
+from notifier.digest import Digest
+from notifier.notifier import Notifier
+from tracing.tracer import traced
+
+from . import cell_formatter, utils
+from .checkpoint import Checkpoint
+from .comparison import (
+    DAILY_COMPARED,
+    DAILY_METRICS,
+    SHOP_COMPARED,
+    SHOP_METRICS,
+    Comparison,
+    compared_values,
+    number_text,
+)
+from .gateway import QuotaAwareClientManager, SheetsGateway
+from .report_writer import StreamingReportWriter
+from .task_cache import TaskSheetCache
 
 logger = logging.getLogger(__name__)
 
@@ -31,10 +55,14 @@ class GoogleSheetsWrapper:
 
     tz = timezone(timedelta(hours=3))
     message_id: ClassVar[dict[int, int]] = {}
-    rows: ClassVar[dict[int, list]] = {}
     records: ClassVar[dict[int, list]] = {}
     stock: ClassVar[dict[int, dict[int, int]]] = {}
     products: ClassVar[dict[int, dict[int, GoogleSheetProduct]]] = {}
+    failed: ClassVar[dict[int, set[int]]] = {}
+    writers: ClassVar[dict[int, StreamingReportWriter]] = {}
+    checkpoints: ClassVar[dict[int, Checkpoint]] = {}
+    # the compared values of the completed rows as numbers
+    snapshots: ClassVar[dict[int, dict[int, list[array]]]] = {}
 
     def __init__(
         self,
@@ -51,6 +79,8 @@ class GoogleSheetsWrapper:
         my_stock_notif_table_id: int,
         com_notif_table_id: int,
         com_stock_notif_table_id: int,
+        *,
+        notifier: Notifier | QueueNotifier | None = None,
     ) -> None:
         self.bot = bot
         self.ke_parser = ke_parser
@@ -65,7 +95,20 @@ class GoogleSheetsWrapper:
         self.my_stock_notif_table_id = my_stock_notif_table_id
         self.com_notif_table_id = com_notif_table_id
         self.com_stock_notif_table_id = com_stock_notif_table_id
-        self.agcm = AsyncioGspreadClientManager(self.__get_creds)
+        # the monitoring workers pass the messages to the bot process
+        self.notifier = notifier or Notifier(bot, config.ADMINS)
+        self.agcm = QuotaAwareClientManager(
+            self.__get_creds, config.SHEETS_QUOTA_PER_MINUTE
+        )
+        self.crawler = SellerCrawler(ke_parser, SellerCatalog(config.CATALOG_DB))
+        self.ranks = RankTracker(
+            ke_parser, RankStore(config.RANK_DB, config.RANK_SNAPSHOTS)
+        )
+        self.poller = AdaptivePoller(
+            config.POLL_MIN_INTERVAL,
+            config.POLL_MAX_INTERVAL,
+            config.POLL_REQUESTS_PER_MINUTE,
+        )
 
     def __get_creds(self) -> Credentials:
         creds = Credentials.from_service_account_file(config.GOOGLE_SHEETS_API_CREDS)
@@ -75,6 +118,8 @@ class GoogleSheetsWrapper:
         """Initialize spreadsheet and its tables"""
         agc = await self.agcm.authorize()
         self.ss = await agc.open_by_key(self.spreadsheet_key)
+        self.sheets = SheetsGateway(self.ss, config.SHEETS_BATCH_WINDOW)
+        self.tasks = TaskSheetCache(self.sheets)
         self.daily_task_table = await self.ss.get_worksheet_by_id(
             self.daily_task_table_id
         )
@@ -104,63 +149,86 @@ class GoogleSheetsWrapper:
             self.com_stock_notif_table_id
         )
         logger.info("Spreadsheets were initialized")
+        await self.notifier.start()
 
-    async def notify(self, message: str) -> None:
-        """Notify the admins"""
-        logger.info("Notifying admins with message: %s", message)
-        for admin in config.ADMINS:
-            await self.bot.send_message(admin, message, disable_web_page_preview=True)
+    def notify(self, message: str) -> None:
+        """Notify the admins without waiting for delivery"""
+        self.notifier.notify(message)
 
-    async def daily_task(self, chat_id: int | None = None) -> None:
-        """Fill the daily report table"""
-        logger.info("Running daily task")
-        self.records[self.daily_report_table_id] = [
-            x for x in await self.daily_task_table.get("B3:G") if len(x) > 3
+    @traced("daily_task", "chat_id")
+    @background_job("daily_task")
+    async def daily_task(
+        self, chat_id: int | None = None, *, resume_only: bool = False
+    ) -> None:
+        """
+        Fill the daily report table,
+        the run interrupted by a restart is resumed
+        from its checkpoint skipping the completed rows
+        """
+        report_id = self.daily_report_table_id
+        self.records[report_id] = [
+            x
+            for x in (await self.tasks.get(self.daily_task_table, "B3:G")).rows
+            if len(x) > 3
         ]
+        checkpoint = Checkpoint(
+            Path(config.CHECKPOINT_DIR), "daily", self.records[report_id]
+        )
+        completed = checkpoint.load(config.CHECKPOINT_MAX_AGE)
+        if resume_only and not completed:
+            checkpoint.remove()
+            return
+        logger.info("Running daily task")
         if chat_id is not None:
             msg = await self.bot.send_message(
                 chat_id,
-                "Прогресс - <b>[0/"
-                f"{len(self.records[self.daily_report_table_id])}]</b>",
+                f"Прогресс - <b>[{len(completed)}/{len(self.records[report_id])}]</b>",
             )
-            self.message_id[self.daily_report_table_id] = msg.message_id
+            self.message_id[report_id] = msg.message_id
 
-        self.rows[self.daily_report_table_id] = [None] * len(
-            self.records[self.daily_report_table_id]
-        )
-
-        await self.prepare_daily_cols()
-
-        tasks = []
-
-        async with ClientSession(headers=self.ke_parser.headers) as session:
-            for i, record in enumerate(self.records[self.daily_report_table_id]):
-                tasks.append(
+        self.start_writer(self.daily_report_table, "Z").restore(completed)
+        self.snapshots[report_id] = {
+            index: compared_values(row, DAILY_COMPARED)
+            for index, row in completed.items()
+        }
+        self.failed[report_id] = set()
+        self.checkpoints[report_id] = checkpoint
+
+        # the columns of the interrupted run are already there
+        if not completed:
+            await self.prepare_daily_cols()
+        checkpoint.start(resume=bool(completed))
+
+        # the failed row cancels the rest before the session is closed
+        async with (
+            ClientSession(headers=self.ke_parser.headers) as session,
+            asyncio.TaskGroup() as group,
+        ):
+            for i, record in enumerate(self.records[report_id]):
+                if i in completed:
+                    continue
+                group.create_task(
                     self.parse_daily_data(
                         session, record[0], record[1], record[3], record[5], i, chat_id
                     )
                 )
-            await asyncio.gather(*tasks)
 
-        await self.daily_report_table.update(
-            f"B3:Z{len(self.rows[self.daily_report_table_id])+3}",
-            self.rows[self.daily_report_table_id],
-            value_input_option=ValueInputOption.user_entered,
-            nowait=True,
-        )
-        if chat_id is not None:
-            await self.bot.edit_message_text(
-                "✅ Сбор информации завершён!",
-                chat_id,
-                self.message_id[self.daily_report_table_id],
-            )
+        await self.writers[report_id].flush()
+        checkpoint.remove()
+        await self.compare_daily()
+        await self.report_failures(report_id, chat_id)
+
+    async def resume_daily_task(self) -> None:
+        """Resume the daily task interrupted by a restart if any"""
+        await self.daily_task(resume_only=True)
 
     async def prepare_daily_cols(self) -> None:
         """
         Prepare columns and headers
         for daily report table
         """
-        await self.daily_report_table.insert_cols(
+        await self.sheets.insert_cols(
+            self.daily_report_table,
             [
                 [
                     dt.now(tz=self.tz).strftime("%d.%m.%Y %H:%M"),
@@ -193,8 +261,9 @@ class GoogleSheetsWrapper:
             ],
             2,
         )
-        await utils.format_daily_table(self.ss, self.daily_report_table_id)
+        await utils.format_daily_table(self.sheets, self.daily_report_table_id)
 
+    @traced("row", "index", "search_query", "my_link", "com_link")
     async def parse_daily_data(
         self,
         session: ClientSession,
@@ -207,11 +276,15 @@ class GoogleSheetsWrapper:
     ) -> None:
         """
         Collect the daily product data
-        and saves it to self.rows
+        and pass it to the report writer
         """
-        my_prod = await self.ke_parser.get_all_info(session, search_query, my_link)
-        com_prod = await self.ke_parser.get_all_info(session, search_query, com_link)
-        self.rows[self.daily_report_table_id][index] = [
+        my_prod = await self.get_all_info(
+            session, search_query, my_link, self.daily_report_table_id, index
+        )
+        com_prod = await self.get_all_info(
+            session, search_query, com_link, self.daily_report_table_id, index
+        )
+        row = [
             f'=ГИПЕРССЫЛКА("https://kazanexpress.ru/search?query={search_query}"'
             f'; "{search_query}")',
             name,
@@ -239,7 +312,9 @@ class GoogleSheetsWrapper:
             com_prod.search_position,
             com_prod.total_count,
         ]
-        progress = len([x for x in self.rows[self.daily_report_table_id] if x])
+        progress = await self.complete_row(
+            self.daily_report_table_id, index, row, DAILY_COMPARED
+        )
         if chat_id is not None:
             await self.bot.edit_message_text(
                 f"Прогресс - <b>[{progress}/"
@@ -248,6 +323,8 @@ class GoogleSheetsWrapper:
                 self.message_id[self.daily_report_table_id],
             )
 
+    @traced("shop_task", "chat_id")
+    @background_job("shop_task")
     async def shop_task(
         self,
         tasksheet: AsyncioGspreadSpreadsheet,
@@ -265,7 +342,7 @@ class GoogleSheetsWrapper:
         self.records[reportsheet.id] = list(
             filter(
                 lambda x: len(x) > 3 and x[0] and x[2] and x[3],
-                await tasksheet.get("B4:E"),
+                (await self.tasks.get(tasksheet, "B4:F")).rows,
             )
         )
         if chat_id is not None:
@@ -274,15 +351,20 @@ class GoogleSheetsWrapper:
             )
             self.message_id[reportsheet.id] = msg.message_id
 
-        self.rows[reportsheet.id] = [None] * len(self.records[reportsheet.id])
+        self.start_writer(reportsheet, "O")
+        self.failed[reportsheet.id] = set()
+        self.snapshots[reportsheet.id] = {}
 
+        # the previous run is compared with before its columns are shifted
+        previous = await self.sheets.get(reportsheet, "H3:N")
         await self.prepare_shop_cols(reportsheet, shop_names[reportsheet.id])
 
-        tasks = []
-
-        async with ClientSession(headers=self.ke_parser.headers) as session:
+        async with (
+            ClientSession(headers=self.ke_parser.headers) as session,
+            asyncio.TaskGroup() as group,
+        ):
             for i, record in enumerate(self.records[reportsheet.id]):
-                tasks.append(
+                group.create_task(
                     self.parse_shop_data(
                         reportsheet,
                         session,
@@ -294,18 +376,9 @@ class GoogleSheetsWrapper:
                     )
                 )
 
-            await asyncio.gather(*tasks)
-
-        await reportsheet.update(
-            f"B3:O{len(self.rows[reportsheet.id])+3}",
-            self.rows[reportsheet.id],
-            value_input_option=ValueInputOption.user_entered,
-            nowait=True,
-        )
-        if chat_id is not None:
-            await self.bot.edit_message_text(
-                "✅ Сбор информации завершён!", chat_id, self.message_id[reportsheet.id]
-            )
+        await self.writers[reportsheet.id].flush()
+        await self.compare_shop(reportsheet.id, previous)
+        await self.report_failures(reportsheet.id, chat_id)
 
     async def prepare_shop_cols(
         self, reportsheet: AsyncioGspreadSpreadsheet, shop: str
@@ -314,7 +387,8 @@ class GoogleSheetsWrapper:
         Prepare columns and headers
         for shop report tables
         """
-        await reportsheet.insert_cols(
+        await self.sheets.insert_cols(
+            reportsheet,
             [
                 [
                     dt.now(tz=self.tz).strftime("%d.%m.%Y %H:%M"),
@@ -335,16 +409,11 @@ class GoogleSheetsWrapper:
                 ["", "кол. карточек"],
             ],
             2,
-            nowait=True,
         )
 
-        await utils.format_shop_table(
-            self.ss,
-            self.my_shop_report_table_id,
-            self.com_shop_report_table_id,
-            reportsheet.id,
-        )
+        await utils.format_shop_table(self.sheets, reportsheet.id)
 
+    @traced("row", "index", "search_query", "link")
     async def parse_shop_data(
         self,
         reportsheet: AsyncioGspreadSpreadsheet,
@@ -357,10 +426,12 @@ class GoogleSheetsWrapper:
     ) -> None:
         """
         Collect the shop product data
-        and save it to self.rows.
+        and pass it to the report writer
         """
-        product = await self.ke_parser.get_all_info(session, search_query, link)
-        self.rows[reportsheet.id][index] = [
+        product = await self.get_all_info(
+            session, search_query, link, reportsheet.id, index
+        )
+        row = [
             f'=ГИПЕРССЫЛКА("https://kazanexpress.ru/search?query={search_query}"'
             f'; "{search_query}")',
             name,
@@ -377,28 +448,356 @@ class GoogleSheetsWrapper:
             product.search_position,
             product.total_count,
         ]
-        progress = len([x for x in self.rows[reportsheet.id] if x])
+        progress = await self.complete_row(reportsheet.id, index, row, SHOP_COMPARED)
         if chat_id is not None:
             await self.bot.edit_message_text(
-                f"Прогресс - <b>[{progress}/"
-                f"{len(self.records[reportsheet.id])}]</b>",
+                f"Прогресс - <b>[{progress}/{len(self.records[reportsheet.id])}]</b>",
                 chat_id,
                 self.message_id[reportsheet.id],
             )
 
-    async def update_all_tables(self) -> None:
-        """Update all the tables"""
-        await self.daily_task()
-        await self.shop_task(self.my_shop_task_table, self.my_shop_report_table)
-        await self.shop_task(self.com_shop_task_table, self.com_shop_report_table)
+    def start_writer(
+        self, reportsheet: AsyncioGspreadSpreadsheet, last_col: str
+    ) -> StreamingReportWriter:
+        """Start streaming the rows of the report"""
+        self.writers[reportsheet.id] = StreamingReportWriter(
+            self.sheets,
+            reportsheet,
+            last_col,
+            len(self.records[reportsheet.id]),
+            chunk_size=config.REPORT_CHUNK_SIZE,
+            writes_per_minute=config.REPORT_WRITES_PER_MINUTE,
+        )
+        return self.writers[reportsheet.id]
+
+    async def complete_row(
+        self, report_id: int, index: int, row: list, compared: tuple[slice, ...]
+    ) -> int:
+        """
+        Checkpoint the completed row, pass it
+        to the report writer and return the progress,
+        only the compared parts of the row are kept
+        """
+        checkpoint = self.checkpoints.get(report_id)
+        # the failed rows are fetched again on resume
+        if checkpoint is not None and index not in self.failed[report_id]:
+            checkpoint.add(index, row)
+        self.snapshots[report_id][index] = compared_values(row, compared)
+        await self.writers[report_id].add(index, row)
+        return self.writers[report_id].completed
+
+    def completed_rows(
+        self, report_id: int, compared: tuple[slice, ...]
+    ) -> list[list[array]]:
+        """Return the compared values of the completed rows in order"""
+        rows = self.snapshots.pop(report_id)
+        missing = [array("d") for _ in compared]
+        return [
+            rows.get(index, missing) for index in range(len(self.records[report_id]))
+        ]
+
+    async def compare_daily(self) -> None:
+        """
+        Color my products against the competitor ones
+        and alert the admins about the lost prices and positions
+        """
+        report_id = self.daily_report_table_id
+        rows = self.completed_rows(report_id, DAILY_COMPARED)
+        mine = [row[0] for row in rows]
+        theirs = [row[1] for row in rows]
+        comparison = Comparison(mine, theirs, DAILY_METRICS)
+        await self.sheets.batch_update(
+            cell_formatter.backgrounds(
+                report_id, 2, 7, comparison.colors("green", "red")
+            )
+        )
+        header = (
+            '<a href="https://docs.google.com/spreadsheets/d/'
+            f'{self.spreadsheet_key}/edit#gid={report_id}">Конкурент впереди</a>'
+        )
+        digest = Digest(header, config.DIGEST_THRESHOLD)
+        losses = comparison.losses(config.COMPARISON_ALERT_MARGIN)
+        for index, lost in sorted(losses.items()):
+            record = self.records[report_id][index]
+            name, query = html.escape(record[0]), html.escape(record[1])
+            details = ", ".join(
+                f"{DAILY_METRICS[k].name.lower()} {number_text(mine[index][k])} "
+                f"против {number_text(theirs[index][k])}"
+                for k in lost
+            )
+            digest.add(
+                f"{header}\n\n<i><a href='{record[3]}'>{name}</a></i>\n"
+                f"Запрос: {query}\n{details}",
+                f"<a href='{record[3]}'>{name}</a>: {details}",
+            )
+        for message in digest.messages():
+            self.notify(message)
+
+    async def compare_shop(self, report_id: int, previous: list[list]) -> None:
+        """
+        Color the shop products against the previous run,
+        the growth of the competitor is colored as the loss
+        """
+        rows = self.completed_rows(report_id, SHOP_COMPARED)
+        comparison = Comparison(
+            [row[0] for row in rows],
+            previous[: len(rows)] + [[]] * (len(rows) - len(previous)),
+            SHOP_METRICS,
+        )
+        colors = ("green", "red")
+        if report_id == self.com_shop_report_table_id:
+            colors = ("red", "green")
+        await self.sheets.batch_update(
+            cell_formatter.backgrounds(report_id, 2, 7, comparison.colors(*colors))
+        )
+
+    async def get_all_info(
+        self,
+        session: ClientSession,
+        search_query: str,
+        link: str,
+        report_id: int,
+        index: int,
+    ) -> GoogleSheetProduct:
+        """
+        Return all the product info,
+        the row is marked as failed
+        instead of aborting the report
+        """
+        try:
+            return await self.ke_parser.get_all_info(session, search_query, link)
+        # the content errors of the product fail its row only
+        except (RequestFailedError, LookupError, ValueError):
+            logger.exception("Failed to collect the product info of %s", link)
+            self.failed[report_id].add(index)
+            return GoogleSheetProduct(shop="Ошибка")
+
+    async def report_failures(self, report_id: int, chat_id: int | None) -> None:
+        """Finish the report reporting the failed rows if any"""
+        text = "✅ Сбор информации завершён!"
+        if self.failed[report_id]:
+            # the report rows start from the third one
+            rows = ", ".join(str(index + 3) for index in sorted(self.failed[report_id]))
+            text += (
+                f"\n⚠️ Не удалось собрать {len(self.failed[report_id])} "
+                f"из {self.writers[report_id].total} строк: {rows}"
+            )
+            if chat_id is None:
+                self.notify(
+                    '<a href="https://docs.google.com/spreadsheets/d/'
+                    f'{self.spreadsheet_key}/edit#gid={report_id}">Отчёт</a> '
+                    f"собран частично\n{text}"
+                )
+        if chat_id is not None:
+            await self.bot.edit_message_text(text, chat_id, self.message_id[report_id])
+
+    @traced("update_all_tables")
+    @background_job("update_all_tables")
+    async def update_all_tables(self, chat_id: int | None = None) -> None:
+        """
+        Update all the tables at once,
+        the rows of the reports share the fetches
+        of the same products and queries
+        """
+        # the failed report cancels the others before the job is finished
+        with sharing_results():
+            async with asyncio.TaskGroup() as group:
+                group.create_task(self.daily_task(chat_id))
+                group.create_task(
+                    self.shop_task(
+                        self.my_shop_task_table, self.my_shop_report_table, chat_id
+                    )
+                )
+                group.create_task(
+                    self.shop_task(
+                        self.com_shop_task_table, self.com_shop_report_table, chat_id
+                    )
+                )
+
+    @traced("crawl_shop", "link")
+    @background_job("crawl_shop")
+    async def crawl_shop(self, link: str, chat_id: int | None = None) -> None:
+        """
+        Crawl the shop selling the product
+        and add its skus to the competitor task sheet
+        """
+        async with ClientSession(headers=self.ke_parser.headers) as session:
+            product = await self.ke_parser.get_product(
+                session, parse_link(link).product_id
+            )
+            result = await self.crawler.crawl(
+                session, product.seller.id, product.seller.title
+            )
+        await self.add_shop_tasks(result, chat_id)
+
+    @traced("recrawl_shops")
+    @background_job("crawl_shop")
+    async def recrawl_shops(self) -> None:
+        """Crawl the known shops again adding their new skus"""
+        sellers = await asyncio.to_thread(self.crawler.catalog.sellers)
+        async with ClientSession(headers=self.ke_parser.headers) as session:
+            for seller_id, title in sellers:
+                try:
+                    result = await self.crawler.crawl(session, seller_id, title)
+                except (RequestFailedError, LookupError):
+                    logger.exception("Failed to crawl the seller %s", seller_id)
+                    continue
+                await self.add_shop_tasks(result, None)
+
+    async def add_shop_tasks(self, result: CrawlResult, chat_id: int | None) -> None:
+        """Append the skus missing from the competitor task sheet"""
+        tasks = await self.tasks.get(self.com_shop_task_table, "B4:F")
+        # the equivalent links are equal once parsed
+        known = set(tasks.links.values())
+        rows = [
+            # the title is the search query of the product
+            [product.title, characteristic, product.title, link]
+            for product in (*result.new, *result.changed)
+            # the link without the sku covers all the skus of the product
+            if ParsedLink(product.product_id, None) not in known
+            for (sku_id, characteristic), link in zip(
+                product.skus, product.links(), strict=True
+            )
+            if ParsedLink(product.product_id, sku_id) not in known
+        ]
+        if rows:
+            await self.sheets.append_rows(self.com_shop_task_table, rows, "B4:E")
+            self.tasks.invalidate()
+        text = (
+            f"🛒 Магазин <b>{html.escape(result.title)}</b>: {result.total} товаров, "
+            f"новых {len(result.new)}, изменилось {len(result.changed)}, "
+            f"снято с продажи {len(result.removed)}\n"
+            f"Добавлено строк в задачи: {len(rows)}"
+        )
+        if result.failed:
+            text += f"\n⚠️ Не удалось загрузить {result.failed} товаров"
+        if chat_id is not None:
+            await self.bot.send_message(chat_id, text)
+        elif rows or result.removed:
+            self.notify(text)
+
+    async def tracked_keywords(self) -> dict[str, dict[int, str]]:
+        """Return the titles of the task products by their ids for the each query"""
+        daily, my_shop, com_shop = await asyncio.gather(
+            self.tasks.get(self.daily_task_table, "B3:G"),
+            self.tasks.get(self.my_shop_task_table, "B4:F"),
+            self.tasks.get(self.com_shop_task_table, "B4:F"),
+        )
+        tracked: dict[str, dict[int, str]] = {}
+        # the columns of the query, the title and the links
+        for sheet, query, title, links in (
+            (daily, 1, 0, (3, 5)),
+            (my_shop, 2, 0, (3,)),
+            (com_shop, 2, 0, (3,)),
+        ):
+            for row in sheet.rows:
+                for k in links:
+                    if len(row) > k and row[query] and row[k] in sheet.links:
+                        tracked.setdefault(row[query], {})[
+                            sheet.links[row[k]].product_id
+                        ] = row[title]
+        return tracked
+
+    @traced("track_ranks")
+    @background_job("track_ranks")
+    async def track_ranks(self) -> None:
+        """
+        Store the rankings of the task search queries
+        and report the moves of the task products
+        """
+        tracked = await self.tracked_keywords()
+        async with ClientSession(headers=self.ke_parser.headers) as session:
+            changes = await self.ranks.track(session, sorted(tracked))
+        header = "📈 Изменились позиции в поиске"
+        digest = Digest(header, config.DIGEST_THRESHOLD)
+        for query, query_changes in changes.items():
+            for change in query_changes:
+                title = tracked[query].get(change.product_id)
+                if title is None or (
+                    change.shift is not None
+                    and abs(change.shift) < config.RANK_ALERT_SHIFT
+                ):
+                    continue
+                # the sheet text would break the html of the message
+                title, text = html.escape(title), html.escape(query)
+                moved = f"{change.before or 'нет'} → {change.after or 'нет'}"
+                digest.add(
+                    f"{header}\n\n<i>{title}</i>\nЗапрос: {text}\nПозиция: {moved}",
+                    f"{title} ({text}): {moved}",
+                )
+        for message in digest.messages():
+            self.notify(message)
+
+    async def search_positions(self, link: str) -> dict[str, int | None]:
+        """Return the stored positions of the product in the tracked queries"""
+        return await asyncio.to_thread(
+            self.ranks.store.positions, parse_link(link).product_id
+        )
 
+    @traced("check_all_stock")
+    @background_job("check_all_stock")
     async def check_all_stock(self) -> None:
         """Check the stocks of all shops"""
-        records = [x for x in await self.my_shop_task_table.get("B4:F") if len(x) > 4]
+        my_tasks, com_tasks = await asyncio.gather(
+            self.tasks.get(self.my_shop_task_table, "B4:F"),
+            self.tasks.get(self.com_shop_task_table, "B4:F"),
+        )
+        records = [x for x in my_tasks.rows if len(x) > 4]
         await self.check_shop_stock(records, self.my_stock_notif_table)
-        records = [x for x in await self.com_shop_task_table.get("B4:F") if len(x) > 4]
+        records = [x for x in com_tasks.rows if len(x) > 4]
         await self.check_shop_stock(records, self.com_stock_notif_table)
 
+    @traced("poll_due")
+    @background_job("monitoring")
+    async def poll_due(self, owns: Callable[[int], bool] | None = None) -> None:
+        """
+        Check the stocks and the changes of the products due for polling,
+        the rows of the other products wait for the later ticks,
+        the sharded workers poll only the products they own
+        """
+        my_tasks, com_tasks = await asyncio.gather(
+            self.tasks.get(self.my_shop_task_table, "B4:F"),
+            self.tasks.get(self.com_shop_task_table, "B4:F"),
+        )
+        rows = {
+            self.my_shop_task_table_id: [x for x in my_tasks.rows if len(x) > 3],
+            self.com_shop_task_table_id: [x for x in com_tasks.rows if len(x) > 3],
+        }
+        product_ids = {}
+        for records in rows.values():
+            for record in records:
+                # the rows with the broken links are reported by the daily run
+                with suppress(ValueError):
+                    product_id = parse_link(record[3]).product_id
+                    if owns is None or owns(product_id):
+                        product_ids[record[3]] = product_id
+        self.poller.forget(set(product_ids.values()))
+        # the product, its reviews and orders and a search page
+        due = self.poller.due(list(dict.fromkeys(product_ids.values())), cost=4)
+        if not due:
+            return
+        logger.info(
+            "Polling %d of %d products", len(due), len(set(product_ids.values()))
+        )
+        with sharing_results():
+            for table_rows, stock_table, notif_table in (
+                (
+                    rows[self.my_shop_task_table_id],
+                    self.my_stock_notif_table,
+                    self.my_notif_table,
+                ),
+                (
+                    rows[self.com_shop_task_table_id],
+                    self.com_stock_notif_table,
+                    self.com_notif_table,
+                ),
+            ):
+                records = [x for x in table_rows if product_ids.get(x[3]) in due]
+                await self.check_shop_stock(
+                    [x for x in records if len(x) > 4], stock_table
+                )
+                await self.check_shop_changes(records, notif_table)
+
     async def check_shop_stock(
         self, records: list, notif_table: AsyncioGspreadSpreadsheet
     ) -> None:
@@ -407,8 +806,22 @@ class GoogleSheetsWrapper:
             self.my_stock_notif_table_id: "Остаток товара в вашем магазине",
             self.com_stock_notif_table_id: "Остаток товара в магазине конкурента",
         }
+        digest = Digest(
+            '<a href="https://docs.google.com/spreadsheets/d/'
+            f'{self.spreadsheet_key}/edit#gid={notif_table.id}">'
+            f"{msgs[notif_table.id]}</a> достиг минимального",
+            config.DIGEST_THRESHOLD,
+        )
+        notif_rows = []
+        # the rows of the same product share one fetch
+        products = await self.fetch_products([record[3] for record in records])
         for record in records:
+            name = html.escape(record[0])
             try:
+                parsed_link = parse_link(record[3])
+                product = products[parsed_link.product_id]
+                if isinstance(product, BaseException):
+                    raise product
                 (
                     prod_id,
                     stock,
@@ -417,22 +830,28 @@ class GoogleSheetsWrapper:
                     price,
                     char,
                     sku_id,
-                ) = await self.ke_parser.get_info(record[3])
+                ) = self.ke_parser.sku_info(
+                    product,
+                    parsed_link.sku_id if parsed_link.sku_id is not None else "no sku",
+                )
+                self.poller.observe(prod_id, sku_id, price, stock, int(record[4]))
                 if stock <= int(record[4]):
                     # skip notifying if already notified
                     if stock == self.stock.get(prod_id, {}).get(sku_id):
                         continue
 
                     self.stock.setdefault(prod_id, {})[sku_id] = stock
-                    await self.notify(
+                    digest.add(
                         '<a href="https://docs.google.com/spreadsheets/d/'
                         f'{self.spreadsheet_key}/edit#gid={notif_table.id}">'
                         f"{msgs[notif_table.id]}</a> <b>{shop}</b>\n"
                         f'<i><a href="{record[3]}">{title}</a> <b>{char}</b>'
                         f"</i> достиг минимального ({stock} "
-                        f"&lt;= {record[4]} шт.)"
+                        f"&lt;= {record[4]} шт.)",
+                        f'<b>{shop}</b> <a href="{record[3]}">{name}</a> '
+                        f"{char}: {stock} &lt;= {record[4]} шт.",
                     )
-                    await notif_table.insert_row(
+                    notif_rows.append(
                         [
                             dt.now(tz=self.tz).strftime("%d.%m.%Y %H:%M"),
                             record[0],  # name
@@ -442,20 +861,64 @@ class GoogleSheetsWrapper:
                             sku_id,
                             stock,
                             price,
-                        ],
-                        2,
+                        ]
                     )
-            except LookupError:
-                await self.notify(
-                    f"❌ Не удалось определить остаток товара\nСсылка: {record[3]}"
+            except RequestFailedError:
+                logger.exception("Failed to check the stock of %s", record[3])
+                digest.add(
+                    f"❌ Маркетплейс недоступен, остаток не проверен\n"
+                    f"Ссылка: {record[3]}",
+                    f'❌ <a href="{record[3]}">{name}</a>: маркетплейс недоступен',
                 )
+            except (LookupError, ValueError):
+                digest.add(
+                    f"❌ Не удалось определить остаток товара\nСсылка: {record[3]}",
+                    f'❌ <a href="{record[3]}">{name}</a>: остаток не определён',
+                )
+        for message in digest.messages():
+            self.notify(message)
+        # the latest rows go on top as before
+        await self.sheets.insert_rows(notif_table, notif_rows[::-1], 2)
+
+    async def fetch_products(
+        self, links: list[str]
+    ) -> dict[int, Product | BaseException]:
+        """
+        Fetch each product of the links once,
+        the failed fetches return the error
+        """
+        product_ids = []
+        for link in links:
+            try:
+                product_id = parse_link(link).product_id
+            except ValueError:
+                continue
+            if product_id not in product_ids:
+                product_ids.append(product_id)
+        async with ClientSession(headers=self.ke_parser.headers) as session:
+            results = await asyncio.gather(
+                *(
+                    self.ke_parser.get_product(session, product_id)
+                    for product_id in product_ids
+                ),
+                return_exceptions=True,
+            )
+        return dict(zip(product_ids, results, strict=True))
 
+    @traced("check_all_changes")
+    @background_job("check_all_changes")
     async def check_all_changes(self) -> None:
         """Check the changes of all shops"""
-        records = [x for x in await self.my_shop_task_table.get("B4:F") if len(x) > 3]
-        await self.check_shop_changes(records, self.my_notif_table)
-        records = [x for x in await self.com_shop_task_table.get("B4:F") if len(x) > 3]
-        await self.check_shop_changes(records, self.com_notif_table)
+        my_tasks, com_tasks = await asyncio.gather(
+            self.tasks.get(self.my_shop_task_table, "B4:F"),
+            self.tasks.get(self.com_shop_task_table, "B4:F"),
+        )
+        # the rows of the same product or query share the fetches
+        with sharing_results():
+            records = [x for x in my_tasks.rows if len(x) > 3]
+            await self.check_shop_changes(records, self.my_notif_table)
+            records = [x for x in com_tasks.rows if len(x) > 3]
+            await self.check_shop_changes(records, self.com_notif_table)
 
     async def check_shop_changes(
         self, records: list, notif_table: AsyncioGspreadSpreadsheet
@@ -465,48 +928,81 @@ class GoogleSheetsWrapper:
             self.my_notif_table_id: "Изменилась цена в вашем магазине",
             self.com_notif_table_id: "Изменилась цена в магазине конкурента",
         }
-        for record in records:
-            try:
-                async with ClientSession(headers=self.ke_parser.headers) as session:
+        digest = Digest(
+            f'<b><a href="https://docs.google.com/spreadsheets/d/'
+            f'{self.spreadsheet_key}/edit#gid={notif_table.id}">'
+            f"{msgs[notif_table.id]}</a></b>",
+            config.DIGEST_THRESHOLD,
+        )
+        notif_rows = []
+        async with ClientSession(headers=self.ke_parser.headers) as session:
+            for record in records:
+                name = html.escape(record[0])
+                try:
                     product = await self.ke_parser.get_all_info(
                         session, record[2], record[3]
                     )
-                if (
-                    product.product_id in self.products
-                    and product.product_skuid in self.products[product.product_id]
-                ):
-                    old_product = self.products[product.product_id][
-                        product.product_skuid
-                    ]
-                    if product.price != old_product.price:
-                        await self.notify(
-                            f'<b><a href="https://docs.google.com/spreadsheets/d/'
-                            f'{self.spreadsheet_key}/edit#gid={self.my_notif_table_id}">'
-                            f"{msgs[notif_table.id]}</a></b>\n\n<i>"
-                            f"<a href='{record[3]}'>{product.title}</a> "
-                            f"<b>{product.characteristic}</b></i>\n\nМагазин: "
-                            f"{product.shop}\nОценка: {product.rating} "
-                            f"({product.reviews_count} оценок)\nЗаказы: "
-                            f"{product.order_count}\nОстаток: {product.stock}\n"
-                            f"Цена: {old_product.price} ₽ "
-                            f"=&gt; {product.price} ₽"
-                        )
-                        await notif_table.insert_row(
-                            [
-                                dt.now(tz=self.tz).strftime("%d.%m.%Y %H:%M"),
-                                record[0],
-                                record[1],
-                                product.shop,
-                                record[3],
-                                product.product_skuid,
-                                old_product.price,
-                                product.price,
-                            ],
-                            2,
+                    # the not found product has no id to key the poller state
+                    if isinstance(product.product_id, int):
+                        self.poller.observe(
+                            product.product_id,
+                            product.product_skuid,
+                            product.price,
+                            product.stock,
                         )
-                self.products.setdefault(product.product_id, {})[
-                    product.product_skuid
-                ] = product
-
-            except LookupError:
-                await self.notify(f"❌ Не удалось найти товар\nСсылка: {record[3]}")
+                    if (
+                        product.product_id in self.products
+                        and product.product_skuid in self.products[product.product_id]
+                    ):
+                        old_product = self.products[product.product_id][
+                            product.product_skuid
+                        ]
+                        if product.price != old_product.price:
+                            digest.add(
+                                f'<b><a href="https://docs.google.com/spreadsheets/d/'
+                                f"{self.spreadsheet_key}/edit"
+                                f'#gid={self.my_notif_table_id}">'
+                                f"{msgs[notif_table.id]}</a></b>\n\n<i>"
+                                f"<a href='{record[3]}'>{product.title}</a> "
+                                f"<b>{product.characteristic}</b></i>\n\nМагазин: "
+                                f"{product.shop}\nОценка: {product.rating} "
+                                f"({product.reviews_count} оценок)\nЗаказы: "
+                                f"{product.order_count}\nОстаток: {product.stock}\n"
+                                f"Цена: {old_product.price} ₽ "
+                                f"=&gt; {product.price} ₽",
+                                f"<b>{product.shop}</b> <a href='{record[3]}'>"
+                                f"{name}</a> {product.characteristic}: "
+                                f"{old_product.price} ₽ =&gt; {product.price} ₽",
+                            )
+                            notif_rows.append(
+                                [
+                                    dt.now(tz=self.tz).strftime("%d.%m.%Y %H:%M"),
+                                    record[0],
+                                    record[1],
+                                    product.shop,
+                                    record[3],
+                                    product.product_skuid,
+                                    old_product.price,
+                                    product.price,
+                                ]
+                            )
+                    self.products.setdefault(product.product_id, {})[
+                        product.product_skuid
+                    ] = product
+
+                except RequestFailedError:
+                    logger.exception("Failed to check the changes of %s", record[3])
+                    digest.add(
+                        f"❌ Маркетплейс недоступен, цена не проверена\n"
+                        f"Ссылка: {record[3]}",
+                        f"❌ <a href='{record[3]}'>{name}</a>: маркетплейс недоступен",
+                    )
+                except LookupError:
+                    digest.add(
+                        f"❌ Не удалось найти товар\nСсылка: {record[3]}",
+                        f"❌ <a href='{record[3]}'>{name}</a>: товар не найден",
+                    )
+        for message in digest.messages():
+            self.notify(message)
+        # the latest rows go on top as before
+        await self.sheets.insert_rows(notif_table, notif_rows[::-1], 2)
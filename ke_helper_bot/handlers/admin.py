@@ -1,11 +1,28 @@
+import asyncio
+import html
+from collections.abc import Awaitable, Callable
+
 from aiogram import F, Router
 from aiogram.enums import ContentType
-from aiogram.filters import CommandStart, StateFilter
+from aiogram.filters import Command, CommandObject, CommandStart, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.types import Message
+from config_reader import config
 from google_sheets.wrapper import GoogleSheetsWrapper
+from jobs.manager import (
+    ALL_REPORTS,
+    COM_SHOP_REPORT,
+    COM_SHOP_TASKS,
+    DAILY_REPORT,
+    MY_SHOP_REPORT,
+    JobManager,
+)
+from ke_parser.executor import interactive
 from ke_parser.ke_parser import KEParser
+from ke_parser.resilience import RequestFailedError
 from keyboards import keyboards as kb
+from metrics.metrics import metrics
+from notifier.digest import MAX_MESSAGE_LENGTH, split_message
 from states import FSM
 
 router = Router(name=__name__)
@@ -22,69 +39,231 @@ async def start(message: Message) -> None:
     await message.answer("Привет, это бот Анализ Конкурента КЕ", reply_markup=kb.menu)
 
 
+# the commands are registered before the state handlers catching any text
+@router.message(Command("jobs"))
+async def show_jobs(message: Message, jobs: JobManager) -> None:
+    if not jobs.jobs:
+        await message.answer("Нет задач", reply_markup=kb.menu)
+        return
+    lines = [
+        f"#{job.id} {job.name}: {job.status}, запущена {job.started:%d.%m %H:%M}"
+        for job in jobs.jobs.values()
+    ]
+    await message.answer(
+        "\n".join(lines) + "\n\nОтменить задачу: /cancel &lt;номер&gt;",
+        reply_markup=kb.menu,
+    )
+
+
+@router.message(Command("cancel"))
+async def cancel_job(
+    message: Message, command: CommandObject, jobs: JobManager
+) -> None:
+    if command.args is None or not command.args.strip().isdigit():
+        await message.answer("Укажите номер задачи: /cancel 1", reply_markup=kb.menu)
+    elif jobs.cancel(int(command.args)):
+        await message.answer(
+            f"⏹ Задача #{command.args.strip()} отменяется", reply_markup=kb.menu
+        )
+    else:
+        await message.answer(
+            f"❌ Задача #{command.args.strip()} не выполняется", reply_markup=kb.menu
+        )
+
+
+@router.message(Command("crawl"))
+async def crawl_shop(
+    message: Message,
+    state: FSMContext,
+    command: CommandObject,
+    gs: GoogleSheetsWrapper,
+    jobs: JobManager,
+) -> None:
+    if command.args is None:
+        await message.answer(
+            "Укажите ссылку на любой товар магазина: /crawl &lt;ссылка&gt;",
+            reply_markup=kb.menu,
+        )
+        return
+    link = command.args.strip()
+    await start_update(
+        message,
+        state,
+        jobs,
+        "Каталог магазина",
+        COM_SHOP_TASKS,
+        update=lambda: gs.crawl_shop(link, message.from_user.id),
+        done_text=(
+            "✅ Товары магазина добавлены в <b><a href='"
+            f"https://docs.google.com/spreadsheets/d/{gs.spreadsheet_key}/edit#gid={gs.com_shop_task_table_id}"
+            "'>задачи магазинов конкурента</a></b>"
+        ),
+    )
+
+
+@router.message(Command("rank"))
+async def show_positions(
+    message: Message, command: CommandObject, gs: GoogleSheetsWrapper
+) -> None:
+    if command.args is None:
+        await message.answer(
+            "Укажите ссылку на товар: /rank &lt;ссылка&gt;", reply_markup=kb.menu
+        )
+        return
+    try:
+        positions = await gs.search_positions(command.args.strip())
+    except ValueError:
+        await message.answer("❌ Неверная ссылка на товар", reply_markup=kb.menu)
+        return
+    if not positions:
+        await message.answer("Позиции в поиске ещё не собраны", reply_markup=kb.menu)
+        return
+    found = sorted(
+        (position, query) for query, position in positions.items() if position
+    )
+    if not found:
+        await message.answer(
+            f"Товар не найден ни по одному из {len(positions)} запросов",
+            reply_markup=kb.menu,
+        )
+        return
+    for text in split_message(
+        f"📈 Позиции в поиске: {len(found)} из {len(positions)} запросов\n",
+        [f"{html.escape(query)}: <b>{position}</b>" for position, query in found],
+        MAX_MESSAGE_LENGTH,
+    ):
+        await message.answer(text, reply_markup=kb.menu)
+
+
+@router.message(Command("metrics"))
+async def show_metrics(message: Message) -> None:
+    await message.answer(f"<pre>{metrics.summary()}</pre>", reply_markup=kb.menu)
+
+
 @router.message(F.text == "Обновление таблиц", StateFilter(None))
 async def tables_update(message: Message, state: FSMContext) -> None:
     await message.answer("Какую таблицу обновить?", reply_markup=kb.update_tables)
     await state.set_state(FSM.update_tables)
 
 
+async def start_update(
+    message: Message,
+    state: FSMContext,
+    jobs: JobManager,
+    name: str,
+    keys: frozenset[str],
+    *,
+    update: Callable[[], Awaitable[None]],
+    done_text: str,
+) -> None:
+    """Start the table update as a background job"""
+    await state.clear()
+
+    async def run() -> None:
+        try:
+            await update()
+        except asyncio.CancelledError:
+            await message.answer(f"⏹ Обновление «{name}» отменено")
+            raise
+        except Exception:
+            await message.answer(f"❌ Ошибка при обновлении «{name}»")
+            raise
+        await message.answer(done_text, disable_web_page_preview=True)
+
+    job, started = jobs.start(name, keys, run, message.from_user.id)
+    if started:
+        await message.answer(
+            f"🕒 Обновление запущено (задача #{job.id})...", reply_markup=kb.menu
+        )
+    else:
+        await message.answer(
+            f"⏳ Уже выполняется задача #{job.id} «{job.name}»", reply_markup=kb.menu
+        )
+
+
 @router.message(F.text == "Ежедневный отчёт", FSM.update_tables)
 async def update_daily(
-    message: Message, state: FSMContext, gs: GoogleSheetsWrapper
+    message: Message, state: FSMContext, gs: GoogleSheetsWrapper, jobs: JobManager
 ) -> None:
-    await message.answer("🕒 Обновление запущено...", reply_markup=kb.menu)
-    await state.clear()
-    await gs.daily_task(message.from_user.id)
-    await message.answer(
-        "✅ Таблица <b><a href='"
-        f"https://docs.google.com/spreadsheets/d/{gs.spreadsheet_key}/edit#gid={gs.daily_report_table_id}"
-        "'>Ежедневный отчёт</a></b> успешно обновлена",
-        disable_web_page_preview=True,
+    await start_update(
+        message,
+        state,
+        jobs,
+        "Ежедневный отчёт",
+        DAILY_REPORT,
+        update=lambda: gs.daily_task(message.from_user.id),
+        done_text=(
+            "✅ Таблица <b><a href='"
+            f"https://docs.google.com/spreadsheets/d/{gs.spreadsheet_key}/edit#gid={gs.daily_report_table_id}"
+            "'>Ежедневный отчёт</a></b> успешно обновлена"
+        ),
     )
 
 
 @router.message(F.text == "Отчёт моих магазинов", FSM.update_tables)
 async def update_my_shop(
-    message: Message, state: FSMContext, gs: GoogleSheetsWrapper
+    message: Message, state: FSMContext, gs: GoogleSheetsWrapper, jobs: JobManager
 ) -> None:
-    await message.answer("🕒 Обновление запущено...", reply_markup=kb.menu)
-    await state.clear()
-    await gs.shop_task(
-        gs.my_shop_task_table, gs.my_shop_report_table, message.from_user.id
-    )
-    await message.answer(
-        "✅ Таблица <b><a href='"
-        f"https://docs.google.com/spreadsheets/d/{gs.spreadsheet_key}/edit#gid={gs.my_shop_report_table_id}"
-        "'>Отчёт моих магазинов</a></b> успешно обновлена",
-        disable_web_page_preview=True,
+    await start_update(
+        message,
+        state,
+        jobs,
+        "Отчёт моих магазинов",
+        MY_SHOP_REPORT,
+        update=lambda: gs.shop_task(
+            gs.my_shop_task_table, gs.my_shop_report_table, message.from_user.id
+        ),
+        done_text=(
+            "✅ Таблица <b><a href='"
+            f"https://docs.google.com/spreadsheets/d/{gs.spreadsheet_key}/edit#gid={gs.my_shop_report_table_id}"
+            "'>Отчёт моих магазинов</a></b> успешно обновлена"
+        ),
     )
 
 
 @router.message(F.text == "Отчёт магазинов конкурента", FSM.update_tables)
 async def update_com_shop(
-    message: Message, state: FSMContext, gs: GoogleSheetsWrapper
+    message: Message, state: FSMContext, gs: GoogleSheetsWrapper, jobs: JobManager
 ) -> None:
-    await message.answer("🕒 Обновление запущено...", reply_markup=kb.menu)
-    await state.clear()
-    await gs.shop_task(
-        gs.com_shop_task_table, gs.com_shop_report_table, message.from_user.id
-    )
-    await message.answer(
-        "✅ Таблица <b><a href="
-        f"https://docs.google.com/spreadsheets/d/{gs.spreadsheet_key}"
-        f'/edit#gid={gs.com_shop_report_table_id}">Отчёт магазинов конкурента'
-        "</a></b> успешно обновлена",
-        disable_web_page_preview=True,
+    await start_update(
+        message,
+        state,
+        jobs,
+        "Отчёт магазинов конкурента",
+        COM_SHOP_REPORT,
+        update=lambda: gs.shop_task(
+            gs.com_shop_task_table, gs.com_shop_report_table, message.from_user.id
+        ),
+        done_text=(
+            "✅ Таблица <b><a href="
+            f"https://docs.google.com/spreadsheets/d/{gs.spreadsheet_key}"
+            f'/edit#gid={gs.com_shop_report_table_id}">Отчёт магазинов конкурента'
+            "</a></b> успешно обновлена"
+        ),
     )
 
 
 @router.message(F.text == "Все таблицы", FSM.update_tables)
 async def update_all_tables(
-    message: Message, state: FSMContext, gs: GoogleSheetsWrapper
+    message: Message, state: FSMContext, gs: GoogleSheetsWrapper, jobs: JobManager
 ) -> None:
-    await update_daily(message, state, gs)
-    await update_my_shop(message, state, gs)
-    await update_com_shop(message, state, gs)
+    await start_update(
+        message,
+        state,
+        jobs,
+        "Все таблицы",
+        ALL_REPORTS,
+        update=lambda: gs.update_all_tables(message.from_user.id),
+        done_text=(
+            "✅ Таблицы <b><a href='"
+            f"https://docs.google.com/spreadsheets/d/{gs.spreadsheet_key}/edit#gid={gs.daily_report_table_id}"
+            "'>Ежедневный отчёт</a></b>, <b><a href='"
+            f"https://docs.google.com/spreadsheets/d/{gs.spreadsheet_key}/edit#gid={gs.my_shop_report_table_id}"
+            "'>Отчёт моих магазинов</a></b> и <b><a href='"
+            f"https://docs.google.com/spreadsheets/d/{gs.spreadsheet_key}/edit#gid={gs.com_shop_report_table_id}"
+            "'>Отчёт магазинов конкурента</a></b> успешно обновлены"
+        ),
+    )
 
 
 @router.message(FSM.update_tables)
@@ -105,7 +284,9 @@ async def get_rating(message: Message, state: FSMContext) -> None:
 async def get_ratings(message: Message, state: FSMContext, ke_parser: KEParser) -> None:
     await message.answer("🕒 Ищу данные...", reply_markup=kb.menu)
     try:
-        ratings = await ke_parser.get_ratings_info(message.text)
+        ratings = await interactive(
+            ke_parser.get_ratings_info(message.text), config.INTERACTIVE_DEADLINE
+        )
         res = (
             f'<b><a href="{ratings.link}">{ratings.title}</a></b> '
             f"({ratings.rating}⭐️)\n"
@@ -116,8 +297,12 @@ async def get_ratings(message: Message, state: FSMContext, ke_parser: KEParser)
             res += f"Заказов: {sku_item.orders}\n"
             res += f"Отзывов: {sku_item.reviews}\n\n"
         await message.answer(res, reply_markup=kb.menu, disable_web_page_preview=True)
-    except LookupError:
+    except (RequestFailedError, LookupError):
         await message.answer("❌ Ошибка при получении рейтингов", reply_markup=kb.menu)
+    except TimeoutError:
+        await message.answer(
+            "❌ Превышено время ожидания, попробуйте позже", reply_markup=kb.menu
+        )
     await state.clear()
 
 
@@ -0,0 +1,98 @@
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from datetime import datetime as dt
+from datetime import timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+DAILY_REPORT = frozenset({"daily"})
+MY_SHOP_REPORT = frozenset({"my_shop"})
+COM_SHOP_REPORT = frozenset({"com_shop"})
+ALL_REPORTS = DAILY_REPORT | MY_SHOP_REPORT | COM_SHOP_REPORT
+COM_SHOP_TASKS = frozenset({"com_shop_tasks"})
+
+
+@dataclass
+class Job:
+    """A background job"""
+
+    id: int
+    name: str
+    # the reports updated by the job
+    keys: frozenset[str]
+    task: asyncio.Future
+    chat_id: int | None = None
+    started: dt = field(default_factory=lambda: dt.now(tz=timezone(timedelta(hours=3))))
+
+    @property
+    def status(self) -> str:
+        """Return the status of the job"""
+        if not self.task.done():
+            return "выполняется"
+        if self.task.cancelled():
+            return "отменена"
+        if self.task.exception() is not None:
+            return "ошибка"
+        return "завершена"
+
+
+class JobManager:
+    """
+    Runs the long report updates as background jobs,
+    a job is not started again while
+    a job updating the same reports is running
+    """
+
+    def __init__(self, history: int = 10) -> None:
+        self.history = history
+        self.jobs: dict[int, Job] = {}
+        self.next_id = 1
+
+    def start(
+        self,
+        name: str,
+        keys: frozenset[str],
+        func: Callable[[], Awaitable[object]],
+        chat_id: int | None = None,
+    ) -> tuple[Job, bool]:
+        """
+        Start the job, return it and whether it was started
+        or the running job updating the same reports
+        """
+        for job in self.jobs.values():
+            if not job.task.done() and job.keys & keys:
+                return job, False
+        job = Job(self.next_id, name, keys, asyncio.ensure_future(func()), chat_id)
+        job.task.add_done_callback(self._log_result)
+        self.jobs[job.id] = job
+        self.next_id += 1
+        self._forget_finished()
+        logger.info("Job #%s %s was started", job.id, name)
+        return job, True
+
+    @staticmethod
+    def _log_result(task: asyncio.Future) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Job failed", exc_info=task.exception())
+
+    def _forget_finished(self) -> None:
+        finished = [job_id for job_id, job in self.jobs.items() if job.task.done()]
+        for job_id in finished[: max(0, len(finished) - self.history)]:
+            del self.jobs[job_id]
+
+    def cancel(self, job_id: int) -> bool:
+        """Cancel the running job, return whether it was running"""
+        job = self.jobs.get(job_id)
+        if job is None or job.task.done():
+            return False
+        job.task.cancel()
+        return True
+
+    async def shutdown(self) -> None:
+        """Cancel the running jobs and wait for them"""
+        tasks = [job.task for job in self.jobs.values() if not job.task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
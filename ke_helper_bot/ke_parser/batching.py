@@ -0,0 +1,73 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+
+from aiohttp import ClientSession
+
+from .queries import SearchProfile
+
+# sends the query inputs and returns the result or the error of the each one
+SendBatch = Callable[
+    [ClientSession, SearchProfile, list[dict]], Awaitable[list[dict | BaseException]]
+]
+Group = tuple[ClientSession, SearchProfile]
+
+
+class SearchBatcher:
+    """
+    Packs the searches made at about the same time
+    into one aliased makeSearch request,
+    the searches of each session and profile are batched separately
+    """
+
+    def __init__(self, send: SendBatch, batch_size: int, window: float) -> None:
+        self.send = send
+        self.batch_size = batch_size
+        self.window = window
+        self.pending: dict[Group, list[tuple[dict, asyncio.Future]]] = {}
+        self.flushers: dict[Group, asyncio.Task] = {}
+        self.sending: set[asyncio.Task] = set()
+
+    async def search(
+        self, session: ClientSession, profile: SearchProfile, query_input: dict
+    ) -> dict:
+        """Return the makeSearch result of the query input"""
+        if self.batch_size <= 1:
+            result = (await self.send(session, profile, [query_input]))[0]
+            if isinstance(result, BaseException):
+                raise result
+            return result
+        future = asyncio.get_running_loop().create_future()
+        group = (session, profile)
+        pending = self.pending.setdefault(group, [])
+        pending.append((query_input, future))
+        if len(pending) >= self.batch_size:
+            flusher = self.flushers.pop(group, None)
+            if flusher is not None:
+                flusher.cancel()
+            task = asyncio.create_task(self._send(group, self.pending.pop(group)))
+            self.sending.add(task)
+            task.add_done_callback(self.sending.discard)
+        elif group not in self.flushers:
+            self.flushers[group] = asyncio.create_task(self._flush_later(group))
+        return await future
+
+    async def _flush_later(self, group: Group) -> None:
+        await asyncio.sleep(self.window)
+        del self.flushers[group]
+        await self._send(group, self.pending.pop(group))
+
+    async def _send(
+        self, group: Group, batch: list[tuple[dict, asyncio.Future]]
+    ) -> None:
+        try:
+            results = await self.send(*group, [query_input for query_input, _ in batch])
+        except Exception as e:  # noqa: BLE001
+            results = [e] * len(batch)
+        for (_, future), result in zip(batch, results, strict=True):
+            # the future of the cancelled search is done already
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
@@ -0,0 +1,154 @@
+import math
+from array import array
+from contextlib import suppress
+from typing import Any, Self
+
+from .models import (
+    CatalogCard,
+    CatalogCardCharacteristic,
+    CatalogCardCharacteristicValue,
+    CharacteristicView,
+)
+
+# the value of the field not selected by the search profile
+MISSING = -1
+
+
+class SearchResults:
+    """
+    The makeSearch cards stored column by column in the typed arrays,
+    the characteristics of the card i are the items
+    char_starts[i]:char_starts[i + 1] of the packed arrays
+    """
+
+    __slots__ = (
+        "char_ids",
+        "char_starts",
+        "feedback_quantities",
+        "min_full_prices",
+        "min_sell_prices",
+        "orders_quantities",
+        "positions",
+        "product_ids",
+        "ratings",
+        "total",
+        "value_ids",
+        "value_titles",
+    )
+
+    def __init__(self, total: int = 0) -> None:
+        # the cards count of the whole search
+        self.total = total
+        self.product_ids = array("q")
+        self.positions = array("q")
+        self.orders_quantities = array("q")
+        self.min_full_prices = array("q")
+        self.min_sell_prices = array("q")
+        self.feedback_quantities = array("q")
+        self.ratings = array("d")
+        self.char_starts = array("q", [0])
+        self.char_ids = array("q")
+        self.value_ids = array("q")
+        # selected by the full profiles only
+        self.value_titles: list[str | None] = []
+
+    @classmethod
+    def from_page(cls, result: dict[str, Any], offset: int) -> Self:
+        """Return the cards of the makeSearch result starting at the offset"""
+        page = cls(result["total"])
+        for position, item in enumerate(result["items"], offset + 1):
+            card = item["catalogCard"]
+            page.product_ids.append(card["productId"])
+            page.positions.append(position)
+            page.orders_quantities.append(card["ordersQuantity"])
+            for column, field in (
+                (page.min_full_prices, "minFullPrice"),
+                (page.min_sell_prices, "minSellPrice"),
+                (page.feedback_quantities, "feedbackQuantity"),
+            ):
+                value = card.get(field)
+                column.append(MISSING if value is None else value)
+            rating = card.get("rating")
+            page.ratings.append(math.nan if rating is None else rating)
+            for value in card["characteristicValues"]:
+                page.char_ids.append(value["characteristic"]["id"])
+                page.value_ids.append(value["id"])
+                page.value_titles.append(value.get("title"))
+            page.char_starts.append(len(page.value_ids))
+        return page
+
+    def __len__(self) -> int:
+        """Return the number of the cards"""
+        return len(self.product_ids)
+
+    def extend(self, other: "SearchResults") -> None:
+        """Append the cards of the next page"""
+        base = len(self.value_ids)
+        self.product_ids.extend(other.product_ids)
+        self.positions.extend(other.positions)
+        self.orders_quantities.extend(other.orders_quantities)
+        self.min_full_prices.extend(other.min_full_prices)
+        self.min_sell_prices.extend(other.min_sell_prices)
+        self.feedback_quantities.extend(other.feedback_quantities)
+        self.ratings.extend(other.ratings)
+        self.char_starts.extend(start + base for start in other.char_starts[1:])
+        self.char_ids.extend(other.char_ids)
+        self.value_ids.extend(other.value_ids)
+        self.value_titles.extend(other.value_titles)
+
+    def indexes(self, product_id: int) -> list[int]:
+        """Return the indexes of the cards of the product"""
+        indexes = []
+        start = 0
+        # the scan over the array runs in C
+        with suppress(ValueError):
+            while True:
+                start = self.product_ids.index(product_id, start)
+                indexes.append(start)
+                start += 1
+        return indexes
+
+    def find(self, product_id: int, char_view: CharacteristicView) -> int | None:
+        """
+        Return the index of the first card of the product
+        with the characteristics of the view
+        """
+        chars = {(char.char_id, char.value_id) for char in char_view.characteristics}
+        for index in self.indexes(product_id):
+            start, end = self.char_starts[index], self.char_starts[index + 1]
+            if all(
+                pair in chars
+                for pair in zip(
+                    self.char_ids[start:end], self.value_ids[start:end], strict=True
+                )
+            ):
+                return index
+        return None
+
+    def card(self, index: int) -> CatalogCard:
+        """Return the catalog card at the index, its id and title are not kept"""
+        start, end = self.char_starts[index], self.char_starts[index + 1]
+        rating = self.ratings[index]
+        return CatalogCard(
+            characteristicValues=[
+                CatalogCardCharacteristicValue(
+                    characteristic=CatalogCardCharacteristic(id=self.char_ids[i]),
+                    id=self.value_ids[i],
+                    title=self.value_titles[i],
+                )
+                for i in range(start, end)
+            ],
+            feedbackQuantity=self.optional(self.feedback_quantities[index]),
+            minFullPrice=self.optional(self.min_full_prices[index]),
+            minSellPrice=self.optional(self.min_sell_prices[index]),
+            ordersQuantity=self.orders_quantities[index],
+            productId=self.product_ids[index],
+            rating=None if math.isnan(rating) else rating,
+            position=self.positions[index],
+            cards_count=self.total,
+        )
+
+    @staticmethod
+    def optional(value: int) -> int | None:
+        """Return None for the missing value"""
+        return None if value == MISSING else value
@@ -0,0 +1,212 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+
+from aiohttp import ClientSession
+from storage.sqlite import connect, create_schema, transaction
+
+from .columnar import SearchResults
+from .ke_parser import KEParser
+from .links import ParsedLink
+from .models import Product
+from .queries import FULL, SearchProfile
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sellers (
+    seller_id INTEGER PRIMARY KEY, title TEXT NOT NULL, crawled REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS products (
+    product_id INTEGER PRIMARY KEY,
+    seller_id INTEGER NOT NULL,
+    fingerprint TEXT NOT NULL,
+    title TEXT NOT NULL,
+    skus TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS products_seller ON products (seller_id);
+"""
+
+
+@dataclass
+class CatalogProduct:
+    """A product of the seller catalog"""
+
+    product_id: int
+    title: str
+    # the sku ids and their characteristics
+    skus: list[tuple[int, str]]
+
+    @classmethod
+    def from_product(cls, product: Product) -> "CatalogProduct":
+        """Return the catalog entry of the product"""
+        return cls(
+            product.id,
+            product.title,
+            [
+                (
+                    sku.id,
+                    " ".join(
+                        product.characteristics[char.char_index]
+                        .values[char.value_index]
+                        .title
+                        for char in sku.characteristics
+                    ),
+                )
+                for sku in product.sku_list
+            ],
+        )
+
+    def links(self) -> list[str]:
+        """Return the links of the skus"""
+        return [ParsedLink(self.product_id, sku_id).url for sku_id, _ in self.skus]
+
+
+@dataclass
+class CrawlResult:
+    """The changes of the seller catalog since the previous crawl"""
+
+    seller_id: int
+    title: str
+    total: int = 0
+    new: list[CatalogProduct] = field(default_factory=list)
+    changed: list[CatalogProduct] = field(default_factory=list)
+    removed: list[int] = field(default_factory=list)
+    # the products failed to fetch are fetched by the next crawl
+    failed: int = 0
+
+
+class SellerCatalog:
+    """The crawled seller catalogs in the SQLite file"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        create_schema(self.path, SCHEMA)
+
+    def sellers(self) -> list[tuple[int, str]]:
+        """Return the ids and the titles of the crawled sellers"""
+        with connect(self.path) as conn:
+            return conn.execute("SELECT seller_id, title FROM sellers").fetchall()
+
+    def fingerprints(self, seller_id: int) -> dict[int, str]:
+        """Return the fingerprints of the seller products"""
+        with connect(self.path) as conn:
+            return dict(
+                conn.execute(
+                    "SELECT product_id, fingerprint FROM products WHERE seller_id = ?",
+                    (seller_id,),
+                )
+            )
+
+    def save(
+        self,
+        result: CrawlResult,
+        fingerprints: dict[int, str],
+    ) -> None:
+        """Store the crawled changes of the seller catalog"""
+        with transaction(self.path) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sellers VALUES (?, ?, ?)",
+                (result.seller_id, result.title, time.time()),
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO products VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        product.product_id,
+                        result.seller_id,
+                        fingerprints[product.product_id],
+                        product.title,
+                        json.dumps(product.skus, ensure_ascii=False),
+                    )
+                    for product in (*result.new, *result.changed)
+                ],
+            )
+            conn.executemany(
+                "DELETE FROM products WHERE product_id = ?",
+                [(product_id,) for product_id in result.removed],
+            )
+
+
+def fingerprints(results: SearchResults) -> dict[int, str]:
+    """
+    Return the fingerprint of the each product of the search,
+    it changes with the prices and the sku groups of the product
+    """
+    cards: dict[int, list[tuple]] = {}
+    for index in range(len(results)):
+        start, end = results.char_starts[index], results.char_starts[index + 1]
+        cards.setdefault(results.product_ids[index], []).append(
+            (
+                results.min_sell_prices[index],
+                results.min_full_prices[index],
+                *sorted(results.value_ids[start:end]),
+            )
+        )
+    return {
+        product_id: hashlib.sha1(  # noqa: S324
+            repr(sorted(product_cards)).encode()
+        ).hexdigest()
+        for product_id, product_cards in cards.items()
+    }
+
+
+class SellerCrawler:
+    """
+    Enumerates the seller catalog with the paginated shop search,
+    only the new and the changed products are fetched
+    """
+
+    def __init__(
+        self, ke_parser: KEParser, catalog: SellerCatalog, profile: SearchProfile = FULL
+    ) -> None:
+        self.ke_parser = ke_parser
+        self.catalog = catalog
+        self.profile = profile
+
+    async def crawl(
+        self, session: ClientSession, seller_id: int, title: str
+    ) -> CrawlResult:
+        """Crawl the seller catalog and store its changes"""
+        results = await self.ke_parser.make_search_all(
+            session, "", self.profile, shop_id=seller_id
+        )
+        current = fingerprints(results)
+        known = await asyncio.to_thread(self.catalog.fingerprints, seller_id)
+        result = CrawlResult(seller_id, title, len(current))
+        result.removed = sorted(known.keys() - current.keys())
+        fetched = [
+            product_id
+            for product_id, fingerprint in current.items()
+            if known.get(product_id) != fingerprint
+        ]
+        products = await asyncio.gather(
+            *(
+                self.ke_parser.get_product(session, product_id)
+                for product_id in fetched
+            ),
+            return_exceptions=True,
+        )
+        for product_id, product in zip(fetched, products, strict=True):
+            if isinstance(product, BaseException):
+                logger.warning("Failed to fetch %s: %r", product_id, product)
+                result.failed += 1
+                continue
+            entry = CatalogProduct.from_product(product)
+            if product_id in known:
+                result.changed.append(entry)
+            else:
+                result.new.append(entry)
+        await asyncio.to_thread(self.catalog.save, result, current)
+        logger.info(
+            "Crawled seller %s: %d products, %d new, %d changed, %d removed",
+            seller_id,
+            result.total,
+            len(result.new),
+            len(result.changed),
+            len(result.removed),
+        )
+        return result
@@ -0,0 +1,132 @@
+import asyncio
+import functools
+from collections import deque
+from collections.abc import AsyncIterator, Awaitable, Callable, Coroutine
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Any, ParamSpec, TypeVar
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+
+class Priority(IntEnum):
+    """Priority of the marketplace calls"""
+
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+current_priority: ContextVar[Priority] = ContextVar(
+    "current_priority", default=Priority.BACKGROUND
+)
+current_job: ContextVar[str] = ContextVar("current_job", default="default")
+
+
+class PriorityExecutor:
+    """
+    Limits the concurrent marketplace calls,
+    the interactive calls get the free slots first,
+    the background jobs share the rest round robin
+    """
+
+    def __init__(self, concurrency: int) -> None:
+        self.concurrency = concurrency
+        self.active = 0
+        self.interactive: deque[asyncio.Future[None]] = deque()
+        # the insertion order is the round robin order
+        self.background: dict[str, deque[asyncio.Future[None]]] = {}
+
+    def waiting(self) -> int:
+        """Return the number of the calls waiting for a slot"""
+        return len(self.interactive) + sum(map(len, self.background.values()))
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold a slot for the call made in the current context"""
+        await self._acquire(current_priority.get(), current_job.get())
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self, priority: Priority, job: str) -> None:
+        if self.active < self.concurrency and not self.waiting():
+            self.active += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        if priority == Priority.INTERACTIVE:
+            queue = self.interactive
+        else:
+            queue = self.background.setdefault(job, deque())
+        queue.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # the slot was handed over already
+                self._release()
+            else:
+                if future in queue:
+                    queue.remove(future)
+                if not queue and self.background.get(job) is queue:
+                    del self.background[job]
+            raise
+
+    def _release(self) -> None:
+        """Hand the slot over to the next waiting call"""
+        while (future := self._next_waiter()) is not None:
+            # the cancelled calls are skipped
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    def _next_waiter(self) -> asyncio.Future[None] | None:
+        if self.interactive:
+            return self.interactive.popleft()
+        if self.background:
+            job = next(iter(self.background))
+            queue = self.background.pop(job)
+            future = queue.popleft()
+            if queue:
+                self.background[job] = queue
+            return future
+        return None
+
+
+async def interactive(awaitable: Awaitable[R], deadline: float) -> R:  # noqa: UP047
+    """
+    Await the calls ahead of the background work,
+    TimeoutError is raised once the deadline in seconds passes
+    """
+    token = current_priority.set(Priority.INTERACTIVE)
+    try:
+        async with asyncio.timeout(deadline):
+            return await awaitable
+    finally:
+        current_priority.reset(token)
+
+
+def background_job(
+    name: str,
+) -> Callable[[Callable[P, Awaitable[R]]], Callable[P, Coroutine[Any, Any, R]]]:
+    """Run the calls of the coroutine function as the background job"""
+
+    def decorator(
+        func: Callable[P, Awaitable[R]],
+    ) -> Callable[P, Coroutine[Any, Any, R]]:
+        @functools.wraps(func)
+        async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            priority_token = current_priority.set(Priority.BACKGROUND)
+            job_token = current_job.set(name)
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                current_job.reset(job_token)
+                current_priority.reset(priority_token)
+
+        return wrapper
+
+    return decorator
@@ -1,11 +1,20 @@
-import re
+import asyncio
+import json
+import logging
 import statistics
+from collections.abc import Callable
+from functools import cache
 from typing import Any, ClassVar
 
-from aiohttp import ClientSession
+from aiohttp import ClientError, ClientSession, ClientTimeout
+from metrics.metrics import metrics
+from tracing.tracer import traced, tracer
 
+from .batching import SearchBatcher
+from .columnar import SearchResults
+from .executor import PriorityExecutor
+from .links import parse_link
 from .models import (
-    CatalogCard,
     CharacteristicView,
     GoogleSheetProduct,
     Product,
@@ -14,6 +23,25 @@ from .models import (
     SkuRatings,
     SkuRatingsItem,
 )
+from .offload import ParseOffloader, parse_json, parse_product, parse_reviews
+from .queries import FULL, POSITION, SearchProfile
+from .resilience import (
+    CircuitBreaker,
+    RequestFailedError,
+    RetryPolicy,
+    TransientHTTPError,
+)
+from .shared import shared_result
+
+logger = logging.getLogger(__name__)
+
+# the failures worth another attempt
+TRANSIENT_ERRORS = (
+    ClientError,
+    TimeoutError,
+    TransientHTTPError,
+    json.JSONDecodeError,
+)
 
 
 class KEParser:
@@ -29,35 +57,138 @@ class KEParser:
     actions_base_url = "https://api.kazanexpress.ru/api/product/actions"
     graphql_base_url = "https://graphql.kazanexpress.ru"
 
+    def __init__(
+        self,
+        retry_policy: RetryPolicy | None = None,
+        executor: PriorityExecutor | None = None,
+        search_batch_size: int = 10,
+        search_profile: SearchProfile = POSITION,
+        offloader: ParseOffloader | None = None,
+    ) -> None:
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.executor = executor or PriorityExecutor(32)
+        self.offloader = offloader or ParseOffloader()
+        self.search_profile = search_profile
+        self.search_batcher = SearchBatcher(
+            self.send_search_batch, search_batch_size, 0.05
+        )
+        self.breakers: dict[str, CircuitBreaker] = {}
+
     @staticmethod
     def get_id_from_link(link: str) -> int:
         """Return poduct id from the product link"""
-        matches = re.search(r"([\d]{5,}\?|[\d]{5,}$)", link)
-        if matches is not None:
-            return int(matches.group(1).replace("?", ""))
-        msg = "No product id was found in the link"
-        raise ValueError(msg, link)
+        return parse_link(link).product_id
 
     @staticmethod
     def get_skuid_from_link(link: str) -> int:
         """Return sku id from the product link"""
-        matches = re.search(r"sku[I|i]d=([\d]+)", link)
-        if matches is not None:
-            return int(matches.group(1))
+        sku_id = parse_link(link).sku_id
+        if sku_id is not None:
+            return sku_id
         msg = "No sku id was found in the link"
         raise ValueError(msg, link)
 
+    async def _request(
+        self,
+        session: ClientSession,
+        endpoint: str,
+        method: str,
+        url: str,
+        *,
+        parse: Callable[[bytes], Any] = parse_json,
+        payload: dict[str, Any] | None = None,
+    ) -> Any:  # noqa: ANN401
+        """
+        Make the request to the endpoint and return the parsed response,
+        the transient failures are retried with backoff,
+        RequestFailedError is raised once the attempts are exhausted
+        or the circuit of the endpoint is open
+        """
+        policy = self.retry_policy
+        if endpoint not in self.breakers:
+            self.breakers[endpoint] = CircuitBreaker(endpoint)
+        breaker = self.breakers[endpoint]
+        for attempt in range(policy.attempts):
+            trial = breaker.check()
+            try:
+                body = await self._fetch(session, endpoint, method, url, payload)
+                # the slot is not held while parsing
+                result = await self.offloader.parse(parse, body)
+            except TRANSIENT_ERRORS as e:
+                if session.closed:
+                    # the request was stopped by the caller, not failed by the endpoint
+                    if trial:
+                        breaker.abandon()
+                    raise
+                breaker.failure()
+                await self._backoff(endpoint, url, attempt, e)
+            except (LookupError, ValueError):
+                # the endpoint has responded, the content is wrong
+                breaker.success()
+                raise
+            except BaseException:
+                # the cancelled trial would keep the circuit open for good
+                if trial:
+                    breaker.abandon()
+                raise
+            else:
+                breaker.success()
+                return result
+        msg = "No attempts were made"
+        raise RequestFailedError(msg, endpoint, url)
+
+    async def _backoff(
+        self, endpoint: str, url: str, attempt: int, error: Exception
+    ) -> None:
+        """Wait before the next attempt, RequestFailedError is raised after the last"""
+        policy = self.retry_policy
+        if attempt == policy.attempts - 1:
+            msg = "The request failed"
+            raise RequestFailedError(msg, endpoint, url) from error
+        delay = policy.backoff(attempt)
+        logger.warning("Retrying %s in %.1f s after %r", url, delay, error)
+        metrics.retry(endpoint)
+        await asyncio.sleep(delay)
+
+    async def _fetch(
+        self,
+        session: ClientSession,
+        endpoint: str,
+        method: str,
+        url: str,
+        payload: dict[str, Any] | None = None,
+    ) -> bytes:
+        """Make one attempt of the request and return the response body"""
+        async with self.executor.slot():
+            with (
+                tracer.span("request", endpoint=endpoint, url=url),
+                metrics.track(endpoint) as tracker,
+            ):
+                resp = await session.request(
+                    method,
+                    url,
+                    headers=self.headers,
+                    timeout=ClientTimeout(total=self.retry_policy.timeout),
+                    json=payload,
+                )
+                body = await resp.read()
+                tracker.size = len(body)
+                if resp.status >= 500 or resp.status == 429:
+                    raise TransientHTTPError(resp.status, url)
+                return body
+
+    @shared_result("product")
     async def get_product(self, session: ClientSession, product_id: int) -> Product:
         """Return the Product object"""
-        resp = await session.get(
-            f"{self.product_base_url}/{product_id}", headers=self.headers
+        return await self._request(
+            session,
+            "product",
+            "GET",
+            f"{self.product_base_url}/{product_id}",
+            parse=parse_product,
         )
-        resp_json = await resp.json()
-        if "errors" in resp_json:
-            raise LookupError(resp_json["errors"][0]["detailMessage"])
-        product = resp_json["payload"]["data"]
-        return Product.model_validate(product)
 
+    @traced("get_info", "link")
     async def get_info(
         self, link: str
     ) -> tuple[int, int, str, str, int | float, str, int | str]:
@@ -65,19 +196,29 @@ class KEParser:
         Return product_id, stock, title, shop name,
         price, characteristic, sku_id of product
         """
-        prod_id = self.get_id_from_link(link)
-        try:
-            sku_id: int | str = self.get_skuid_from_link(link)
-        except ValueError:
-            sku_id = "no sku"
+        parsed_link = parse_link(link)
+        prod_id = parsed_link.product_id
+        sku_id: int | str = (
+            parsed_link.sku_id if parsed_link.sku_id is not None else "no sku"
+        )
 
         async with ClientSession(headers=self.headers) as session:
             product = await self.get_product(session, prod_id)
+        return self.sku_info(product, sku_id)
 
+    @staticmethod
+    def sku_info(
+        product: Product, sku_id: int | str
+    ) -> tuple[int, int, str, str, int | float, str, int | str]:
+        """
+        Return product_id, stock, title, shop name,
+        price, characteristic, sku_id of the product sku,
+        the first sku is taken for "no sku"
+        """
         for sku in product.sku_list:
             if sku_id in (sku.id, "no sku"):
                 return (
-                    prod_id,
+                    product.id,
                     sku.available_amount,
                     product.title,
                     product.seller.title,
@@ -96,17 +237,18 @@ class KEParser:
         msg = "The product with the following sku id was not found"
         raise LookupError(msg, sku_id)
 
+    @shared_result("reviews")
     async def get_reviews(
         self, session: ClientSession, product_id: int
     ) -> list[Review]:
         """Return the reviews of the product"""
-        resp = await session.get(
+        return await self._request(
+            session,
+            "reviews",
+            "GET",
             f"{self.reviews_base_url}/{product_id}/reviews",
-            headers=self.headers,
+            parse=parse_reviews,
         )
-        resp_json = await resp.json()
-        reviews_raw = resp_json["payload"]
-        return [Review.model_validate(review) for review in reviews_raw]
 
     async def get_ratings(
         self,
@@ -118,17 +260,23 @@ class KEParser:
         if link and product:
             msg = "Either link or product must be specified"
             raise ValueError(msg)
-        if link is None and product is None:
-            msg = "Either link or product must be specified"
-            raise ValueError(msg)
         if link is not None:
-            prod_id = self.get_id_from_link(link)
+            prod_id = parse_link(link).product_id
             product = await self.get_product(session, prod_id)
-        else:
+        elif product is not None:
             prod_id = product.id
+        else:
+            msg = "Either link or product must be specified"
+            raise ValueError(msg)
 
         reviews = await self.get_reviews(session, prod_id)
+        if len(product.sku_list) * len(reviews) < self.offloader.min_pairs:
+            return self.aggregate_ratings(product, reviews)
+        return await self.offloader.run(self.aggregate_ratings, product, reviews)
 
+    @staticmethod
+    def aggregate_ratings(product: Product, reviews: list[Review]) -> dict[int, Any]:
+        """Return the rating and the reviews count of the each sku"""
         ratings = {}
 
         for sku in product.sku_list:
@@ -144,12 +292,12 @@ class KEParser:
             }
         return ratings
 
+    @shared_result("week_orders")
     async def get_week_orders(self, session: ClientSession, product_id: int) -> int:
         """Return the week product orders"""
-        resp = await session.get(
-            f"{self.actions_base_url}/{product_id}", headers=self.headers
+        resp_json = await self._request(
+            session, "actions", "GET", f"{self.actions_base_url}/{product_id}"
         )
-        resp_json = await resp.json()
         try:
             poppup_text = resp_json[0]["text"]
             return int(poppup_text.split()[0]) if "на этой неделе" in poppup_text else 0
@@ -157,103 +305,167 @@ class KEParser:
             msg = "The product with the following id has no action"
             raise LookupError(msg, product_id) from e
 
-    async def make_search(
+    @staticmethod
+    def search_input(
+        text: str,
+        offset: int,
+        limit: int,
+        profile: SearchProfile,
+        shop_id: int | None = None,
+    ) -> dict:
+        """Return the makeSearch query input, the shop narrows the search"""
+        query_input = {
+            "text": text,
+            "showAdultContent": "NONE",
+            "correctQuery": True,
+            "getFastCategories": profile.fast_categories,
+            "getPromotionItems": profile.promotion_items,
+            "filters": [],
+            "sort": "BY_RELEVANCE_DESC",
+            "pagination": {"offset": offset, "limit": limit},
+        }
+        if shop_id is not None:
+            query_input["shopId"] = shop_id
+        return query_input
+
+    @staticmethod
+    @cache
+    def search_document(count: int, profile: SearchProfile) -> str:
+        """
+        Return the graphql document with
+        the count of aliased makeSearch fields
+        selecting the fields of the profile
+        """
+        variables = ", ".join(f"$q{i}:MakeSearchQueryInput!" for i in range(count))
+        fields = "".join(
+            f"""
+                    q{i}: makeSearch(query:$q{i}) {{
+                        items {{
+                            catalogCard {{
+                                ...SkuGroupCardFragment
+                            }}
+                        }}
+                        total
+                    }}"""
+            for i in range(count)
+        )
+        return f"""
+                query getMakeSearch({variables})
+                {{{fields}
+                }}
+                fragment SkuGroupCardFragment on SkuGroupCard {{{profile.selection}
+                }}
+            """
+
+    async def send_search_batch(
         self,
         session: ClientSession,
-        text: str,
-        offset: int = 0,
-        limit: int = 100,
-    ) -> list[CatalogCard]:
+        profile: SearchProfile,
+        query_inputs: list[dict],
+    ) -> list[dict | BaseException]:
         """
-        Make a graphql makeSearch request
-        returns a list of catalog cards
+        Make the makeSearch requests in one graphql request
+        returns the result or the error of the each one
         """
         body = {
             "operationName": "getMakeSearch",
             "variables": {
-                "queryInput": {
-                    "text": text,
-                    "showAdultContent": "NONE",
-                    "correctQuery": True,
-                    "getFastCategories": True,
-                    "getPromotionItems": True,
-                    "filters": [],
-                    "sort": "BY_RELEVANCE_DESC",
-                    "pagination": {"offset": offset, "limit": limit},
-                }
+                f"q{i}": query_input for i, query_input in enumerate(query_inputs)
             },
-            "query": """
-                query getMakeSearch($queryInput:MakeSearchQueryInput!)
-                {
-                    makeSearch(query:$queryInput) {
-                        items {
-                            catalogCard {
-                                ...SkuGroupCardFragment
-                            }
-                        }
-                        total
-                    }
-                }
-                fragment SkuGroupCardFragment on SkuGroupCard {
-                    ...DefaultCardFragment
-                    characteristicValues {
-                        title
-                        id
-                        characteristic {
-                            id
-                        }
-                    }
-                }
-                fragment DefaultCardFragment on CatalogCard {
-                    feedbackQuantity
-                    id
-                    minFullPrice
-                    minSellPrice
-                    ordersQuantity
-                    productId
-                    rating
-                    title
-                }
-            """,
+            "query": self.search_document(len(query_inputs), profile),
         }
-        resp = await session.post(
-            self.graphql_base_url, json=body, headers=self.headers
+        resp_json = await self._request(
+            session, "search", "POST", self.graphql_base_url, payload=body
+        )
+        data = resp_json.get("data") or {}
+        results: list[dict | BaseException] = []
+        for i in range(len(query_inputs)):
+            if data.get(f"q{i}") is None:
+                msg = "The search failed"
+                results.append(LookupError(msg, resp_json.get("errors")))
+            else:
+                results.append(data[f"q{i}"])
+        return results
+
+    async def make_search(
+        self,
+        session: ClientSession,
+        text: str,
+        offset: int = 0,
+        profile: SearchProfile | None = None,
+        shop_id: int | None = None,
+    ) -> SearchResults:
+        """
+        Make a graphql makeSearch request
+        returns the page of catalog cards,
+        the concurrent searches are sent in batches
+        """
+        profile = profile or self.search_profile
+        result = await self.search_batcher.search(
+            session,
+            profile,
+            self.search_input(text, offset, profile.page_size, profile, shop_id),
         )
-        resp_json = await resp.json()
-        items_raw = tuple(
-            item["catalogCard"] for item in resp_json["data"]["makeSearch"]["items"]
+        return SearchResults.from_page(result, offset)
+
+    async def make_search_batch(
+        self,
+        session: ClientSession,
+        searches: list[tuple[str, int]],
+        profile: SearchProfile | None = None,
+        shop_id: int | None = None,
+    ) -> list[SearchResults]:
+        """Return the catalog cards of the each search text and offset"""
+        return list(
+            await asyncio.gather(
+                *(
+                    self.make_search(session, text, offset, profile, shop_id)
+                    for text, offset in searches
+                )
+            )
         )
-        for pos, item in enumerate(items_raw, offset + 1):
-            item["position"] = pos
-            item["cards_count"] = resp_json["data"]["makeSearch"]["total"]
-        return [CatalogCard.model_validate(item) for item in items_raw]
 
+    @shared_result("search_all")
     async def make_search_all(
         self,
         session: ClientSession,
         text: str,
-    ) -> list[CatalogCard]:
-        """Return all the catalog cards from the search"""
-        offset = 0
-        cards = await self.make_search(session, text)
-        while len(cards) < cards[-1].cards_count:
-            offset += 100
-            cards.extend(await self.make_search(session, text, offset))
+        profile: SearchProfile | None = None,
+        shop_id: int | None = None,
+    ) -> SearchResults:
+        """
+        Return all the catalog cards from the search,
+        the pages after the first one are fetched in batches
+        """
+        profile = profile or self.search_profile
+        cards = await self.make_search(session, text, 0, profile, shop_id)
+        pages = await self.make_search_batch(
+            session,
+            [
+                (text, offset)
+                for offset in range(profile.page_size, cards.total, profile.page_size)
+            ],
+            profile,
+            shop_id,
+        )
+        for page in pages:
+            cards.extend(page)
         return cards
 
+    @traced("get_all_info", "search_query", "link")
     async def get_all_info(
         self, session: ClientSession, search_query: str, link: str
     ) -> GoogleSheetProduct:
         """Return all the product info"""
         # get the product id and the product sku id
         try:
-            product_id = self.get_id_from_link(link)
+            parsed_link = parse_link(link)
         except ValueError:
             return GoogleSheetProduct(shop="Не найдено")
-        try:
-            product_skuid: int | str = self.get_skuid_from_link(link)
-        except ValueError:
-            product_skuid = "no sku"
+        product_id = parsed_link.product_id
+        product_skuid: int | str = (
+            parsed_link.sku_id if parsed_link.sku_id is not None else "no sku"
+        )
         try:
             product = await self.get_product(session, product_id)
         except LookupError:
@@ -267,16 +479,14 @@ class KEParser:
             return GoogleSheetProduct(shop="Не найдено")
         char_view = CharacteristicView(product.characteristics, product_sku)
         search_position: int | str = "no"
+        # the product may be shared with the other rows
+        order_count = product.orders_amount
         search_result = await self.make_search_all(session, search_query)
-        total_count = search_result[-1].cards_count
-        for card in search_result:
-            if (
-                card.product_id == product_id
-                and char_view == card.characteristic_values
-            ):
-                search_position = card.position
-                product.orders_amount = card.orders_quantity
-                break
+        total_count = search_result.total
+        index = search_result.find(product_id, char_view)
+        if index is not None:
+            search_position = search_result.positions[index]
+            order_count = search_result.orders_quantities[index]
         # parse reviews to calculate
         # the rating for each sku
         reviews = [
@@ -299,7 +509,7 @@ class KEParser:
             product_skuid=product_skuid,
             reviews_count=len(reviews),
             rating=rating,
-            order_count=product.orders_amount,
+            order_count=order_count,
             week_order_count=week_order_count,
             stock=product_sku.available_amount,
             price=product_sku.purchase_price,
@@ -307,18 +517,15 @@ class KEParser:
             total_count=total_count,
         )
 
+    @traced("get_ratings_info", "link")
     async def get_ratings_info(self, link: str) -> SkuRatings:
         """Return info of product and its skus rating"""
-        prod_id = self.get_id_from_link(link)
+        prod_id = parse_link(link).product_id
         async with ClientSession(headers=self.headers) as session:
             product = await self.get_product(session, prod_id)
-            cards = list(
-                filter(
-                    lambda x: x.product_id == prod_id,
-                    # search by title to get all the skus
-                    await self.make_search_all(session, product.title),
-                )
-            )
+            # search by title to get all the skus
+            search_result = await self.make_search_all(session, product.title, FULL)
+            cards = [search_result.card(i) for i in search_result.indexes(prod_id)]
             ratings = await self.get_ratings(session, product=product)
 
             items: list[SkuRatingsItem] = []
@@ -329,7 +536,7 @@ class KEParser:
                     [
                         SkuRatingsItem(
                             characteristic=" ".join(
-                                char.title for char in card.characteristic_values
+                                char.title or "" for char in card.characteristic_values
                             ),
                             rating=ratings[sku.id]["rating"],
                             sku_id=sku.id,
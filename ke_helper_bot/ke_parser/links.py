@@ -0,0 +1,57 @@
+import re
+from functools import lru_cache
+
+PRODUCT_ID_PATTERN = re.compile(r"([\d]{5,}\?|[\d]{5,}$)")
+SKU_ID_PATTERN = re.compile(r"sku[I|i]d=([\d]+)")
+
+
+class ParsedLink:
+    """Product id and sku id parsed from the product link"""
+
+    __slots__ = ("product_id", "sku_id")
+
+    def __init__(self, product_id: int, sku_id: int | None) -> None:
+        self.product_id = product_id
+        self.sku_id = sku_id
+
+    def __repr__(self) -> str:
+        """Return the representation of the parsed link"""
+        return f"ParsedLink(product_id={self.product_id}, sku_id={self.sku_id})"
+
+    def __eq__(self, other: object) -> bool:
+        """Return True if the links point to the same product sku"""
+        if not isinstance(other, ParsedLink):
+            return NotImplemented
+        return (self.product_id, self.sku_id) == (other.product_id, other.sku_id)
+
+    def __hash__(self) -> int:
+        """Return the same hash for the equivalent links"""
+        return hash((self.product_id, self.sku_id))
+
+    @property
+    def url(self) -> str:
+        """Return the normalized product link"""
+        if self.sku_id is None:
+            return f"https://kazanexpress.ru/product/{self.product_id}"
+        return f"https://kazanexpress.ru/product/{self.product_id}?skuId={self.sku_id}"
+
+
+@lru_cache(maxsize=8192)
+def _parse_link(link: str) -> ParsedLink:
+    matches = PRODUCT_ID_PATTERN.search(link)
+    if matches is None:
+        msg = "No product id was found in the link"
+        raise ValueError(msg, link)
+    sku_matches = SKU_ID_PATTERN.search(link)
+    return ParsedLink(
+        int(matches.group(1).rstrip("?")),
+        int(sku_matches.group(1)) if sku_matches is not None else None,
+    )
+
+
+def parse_link(link: str) -> ParsedLink:
+    """
+    Return the product id and the sku id
+    of the link, results are memoized
+    """
+    return _parse_link(link.strip())
@@ -125,7 +125,8 @@ class CatalogCardCharacteristicValue(BaseModel):
 
     characteristic: CatalogCardCharacteristic
     id: int
-    title: str
+    # not selected by the position search profile
+    title: str | None = None
 
 
 class CatalogCard(BaseModel):
@@ -134,14 +135,15 @@ class CatalogCard(BaseModel):
     characteristic_values: list[CatalogCardCharacteristicValue] = Field(
         alias="characteristicValues"
     )
-    feedback_quantity: int = Field(alias="feedbackQuantity")
-    id: int
-    min_full_price: int = Field(alias="minFullPrice")
-    min_sell_price: int = Field(alias="minSellPrice")
+    # not selected by the position search profile
+    feedback_quantity: int | None = Field(None, alias="feedbackQuantity")
+    id: int | None = None
+    min_full_price: int | None = Field(None, alias="minFullPrice")
+    min_sell_price: int | None = Field(None, alias="minSellPrice")
     orders_quantity: int = Field(alias="ordersQuantity")
     product_id: int = Field(alias="productId")
-    rating: float
-    title: str
+    rating: float | None = None
+    title: str | None = None
     position: int
     cards_count: int
 
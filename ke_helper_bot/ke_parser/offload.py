@@ -0,0 +1,89 @@
+import asyncio
+import functools
+import json
+import logging
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, ParamSpec, TypeVar
+
+from pydantic import ValidationError
+
+from .models import Product, Review
+
+logger = logging.getLogger(__name__)
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+
+def parse_json(body: bytes) -> Any:  # noqa: ANN401
+    """Return the response json"""
+    return json.loads(body)
+
+
+def parse_product(body: bytes) -> Product:
+    """Return the product of the response"""
+    resp_json = json.loads(body)
+    if "errors" in resp_json:
+        raise LookupError(resp_json["errors"][0]["detailMessage"])
+    return Product.model_validate(resp_json["payload"]["data"])
+
+
+def parse_reviews(body: bytes) -> list[Review]:
+    """Return the reviews of the response"""
+    return [Review.model_validate(review) for review in json.loads(body)["payload"]]
+
+
+def call_in_worker(func: Callable[P, R], *args: P.args, **kwargs: P.kwargs) -> R:  # noqa: UP047
+    """Call the function in the pool process with the picklable errors"""
+    try:
+        return func(*args, **kwargs)
+    except ValidationError as e:
+        # the validation error can not be sent back to the bot process
+        raise ValueError(str(e)) from None
+
+
+class ParseOffloader:
+    """
+    Runs the heavy parsing and aggregation in a process pool,
+    so the event loop keeps serving the bot,
+    the light calls run inline as the pool round trip costs more
+    """
+
+    def __init__(
+        self, workers: int = 0, min_bytes: int = 256 * 1024, min_pairs: int = 20000
+    ) -> None:
+        self.workers = workers
+        # no pool is started without the workers
+        self.pool = ProcessPoolExecutor(workers) if workers > 0 else None
+        self.min_bytes = min_bytes
+        self.min_pairs = min_pairs
+
+    async def run(self, func: Callable[P, R], *args: P.args, **kwargs: P.kwargs) -> R:
+        """Call the function in the pool"""
+        if self.pool is None:
+            return func(*args, **kwargs)
+        pool = self.pool
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                pool, functools.partial(call_in_worker, func, *args, **kwargs)
+            )
+        except BrokenProcessPool:
+            # the killed worker breaks the pool for all the later calls
+            logger.exception("The parse pool is broken, restarting it")
+            if self.pool is pool:
+                pool.shutdown(wait=False, cancel_futures=True)
+                self.pool = ProcessPoolExecutor(self.workers)
+            return func(*args, **kwargs)
+
+    async def parse(self, func: Callable[[bytes], R], body: bytes) -> R:
+        """Parse the response body, the small ones inline"""
+        if len(body) < self.min_bytes:
+            return func(body)
+        return await self.run(func, body)
+
+    def shutdown(self) -> None:
+        """Stop the pool processes"""
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
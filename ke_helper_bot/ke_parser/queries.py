@@ -0,0 +1,53 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class SearchProfile:
+    """The selection set, the flags and the page size of makeSearch"""
+
+    name: str
+    # the fields of the catalog card
+    selection: str
+    fast_categories: bool = False
+    promotion_items: bool = False
+    page_size: int = 100
+
+
+CARD_CHARACTERISTICS = """
+                    characteristicValues {
+                        id
+                        characteristic {
+                            id
+                        }
+                    }"""
+
+FULL_CARD = """
+                    feedbackQuantity
+                    id
+                    minFullPrice
+                    minSellPrice
+                    ordersQuantity
+                    productId
+                    rating
+                    title
+                    characteristicValues {
+                        title
+                        id
+                        characteristic {
+                            id
+                        }
+                    }"""
+
+# enough to find the sku and its orders in the search
+POSITION = SearchProfile(
+    "position",
+    """
+                    ordersQuantity
+                    productId"""
+    + CARD_CHARACTERISTICS,
+)
+FULL = SearchProfile("full", FULL_CARD)
+# the search as the customers see it
+PROMO = SearchProfile("promo", FULL_CARD, fast_categories=True, promotion_items=True)
+
+SEARCH_PROFILES = {profile.name: profile for profile in (POSITION, FULL, PROMO)}
@@ -0,0 +1,224 @@
+import asyncio
+import logging
+import time
+from array import array
+from dataclasses import dataclass
+from typing import Self
+
+from aiohttp import ClientSession
+from storage.sqlite import connect, create_schema, transaction
+
+from .columnar import SearchResults
+from .ke_parser import KEParser
+from .queries import POSITION, SearchProfile
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    query TEXT NOT NULL,
+    taken REAL NOT NULL,
+    total INTEGER NOT NULL,
+    product_ids BLOB NOT NULL,
+    positions BLOB NOT NULL,
+    PRIMARY KEY (query, taken)
+);
+"""
+
+
+class Ranking:
+    """
+    The ranked snapshot of the search,
+    the best position of the each product in the typed arrays
+    """
+
+    __slots__ = ("positions", "product_ids", "query", "taken", "total")
+
+    def __init__(
+        self,
+        query: str,
+        taken: float,
+        total: int,
+        product_ids: array,
+        positions: array,
+    ) -> None:
+        self.query = query
+        self.taken = taken
+        # the cards count of the whole search
+        self.total = total
+        self.product_ids = product_ids
+        self.positions = positions
+
+    @classmethod
+    def from_results(cls, query: str, taken: float, results: SearchResults) -> Self:
+        """Return the ranking of the search keeping the first card of the product"""
+        ranking = cls(query, taken, results.total, array("q"), array("q"))
+        seen: set[int] = set()
+        for product_id, position in zip(
+            results.product_ids, results.positions, strict=True
+        ):
+            if product_id in seen:
+                continue
+            seen.add(product_id)
+            ranking.product_ids.append(product_id)
+            ranking.positions.append(position)
+        return ranking
+
+    @classmethod
+    def from_row(cls, row: tuple[str, float, int, bytes, bytes]) -> Self:
+        """Return the ranking of the stored row"""
+        query, taken, total, product_ids, positions = row
+        ranking = cls(query, taken, total, array("q"), array("q"))
+        ranking.product_ids.frombytes(product_ids)
+        ranking.positions.frombytes(positions)
+        return ranking
+
+    def to_row(self) -> tuple[str, float, int, bytes, bytes]:
+        """Return the row to store"""
+        return (
+            self.query,
+            self.taken,
+            self.total,
+            self.product_ids.tobytes(),
+            self.positions.tobytes(),
+        )
+
+    def __len__(self) -> int:
+        """Return the number of the ranked products"""
+        return len(self.product_ids)
+
+    def position(self, product_id: int) -> int | None:
+        """Return the position of the product, None if it is not found"""
+        try:
+            # the scan over the array runs in C
+            return self.positions[self.product_ids.index(product_id)]
+        except ValueError:
+            return None
+
+    def ranks(self) -> dict[int, int]:
+        """Return the position of the each product"""
+        return dict(zip(self.product_ids, self.positions, strict=True))
+
+
+@dataclass(frozen=True)
+class RankChange:
+    """The position change of the product, None if it is not found"""
+
+    product_id: int
+    before: int | None
+    after: int | None
+
+    @property
+    def shift(self) -> int | None:
+        """Return the positions gained, None if it appeared or disappeared"""
+        if self.before is None or self.after is None:
+            return None
+        return self.before - self.after
+
+
+def diff(before: Ranking, after: Ranking) -> list[RankChange]:
+    """Return the changed positions between the snapshots in linear time"""
+    previous = before.ranks()
+    changes = []
+    for product_id, position in zip(after.product_ids, after.positions, strict=True):
+        old = previous.pop(product_id, None)
+        if old != position:
+            changes.append(RankChange(product_id, old, position))
+    # the rest are gone from the search
+    changes.extend(
+        RankChange(product_id, old, None) for product_id, old in previous.items()
+    )
+    return changes
+
+
+class RankStore:
+    """The ranked snapshots of the tracked keywords in the SQLite file"""
+
+    def __init__(self, path: str, keep: int = 30) -> None:
+        self.path = path
+        # the snapshots kept for the each query
+        self.keep = keep
+        create_schema(self.path, SCHEMA)
+
+    def save(self, ranking: Ranking) -> None:
+        """Store the snapshot dropping the oldest ones"""
+        with transaction(self.path) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?)",
+                ranking.to_row(),
+            )
+            conn.execute(
+                "DELETE FROM snapshots WHERE query = ? AND taken NOT IN "
+                "(SELECT taken FROM snapshots WHERE query = ? "
+                "ORDER BY taken DESC LIMIT ?)",
+                (ranking.query, ranking.query, self.keep),
+            )
+
+    def history(self, query: str, count: int = 2) -> list[Ranking]:
+        """Return the latest snapshots of the query, the newest first"""
+        with connect(self.path) as conn:
+            rows = conn.execute(
+                "SELECT * FROM snapshots WHERE query = ? ORDER BY taken DESC LIMIT ?",
+                (query, count),
+            ).fetchall()
+        return [Ranking.from_row(row) for row in rows]
+
+    def latest(self) -> list[Ranking]:
+        """Return the latest snapshot of the each query"""
+        with connect(self.path) as conn:
+            rows = conn.execute(
+                "SELECT s.* FROM snapshots s JOIN "
+                "(SELECT query, MAX(taken) AS taken FROM snapshots GROUP BY query) l "
+                "ON s.query = l.query AND s.taken = l.taken ORDER BY s.query"
+            ).fetchall()
+        return [Ranking.from_row(row) for row in rows]
+
+    def positions(self, product_id: int) -> dict[str, int | None]:
+        """Return the latest position of the product in the each query"""
+        return {
+            ranking.query: ranking.position(product_id) for ranking in self.latest()
+        }
+
+
+class RankTracker:
+    """
+    Crawls the tracked keywords and stores their rankings,
+    the positions are then answered without the requests
+    """
+
+    def __init__(
+        self, ke_parser: KEParser, store: RankStore, profile: SearchProfile = POSITION
+    ) -> None:
+        self.ke_parser = ke_parser
+        self.store = store
+        self.profile = profile
+
+    async def track(
+        self, session: ClientSession, queries: list[str]
+    ) -> dict[str, list[RankChange]]:
+        """
+        Crawl the queries and return the changes since their previous snapshots,
+        the queries tracked for the first time have no changes
+        """
+        results = await asyncio.gather(
+            *(
+                self.ke_parser.make_search_all(session, query, self.profile)
+                for query in queries
+            ),
+            return_exceptions=True,
+        )
+        changes = {}
+        for query, result in zip(queries, results, strict=True):
+            if isinstance(result, BaseException):
+                logger.warning("Failed to track %r: %r", query, result)
+                continue
+            ranking = Ranking.from_results(query, time.time(), result)
+            changes[query] = await asyncio.to_thread(self.record, ranking)
+        logger.info("Tracked %d of %d queries", len(changes), len(queries))
+        return changes
+
+    def record(self, ranking: Ranking) -> list[RankChange]:
+        """Store the snapshot and return its changes"""
+        previous = self.store.history(ranking.query, 1)
+        self.store.save(ranking)
+        return diff(previous[0], ranking) if previous else []
@@ -0,0 +1,86 @@
+import logging
+import random
+import time
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+
+class RequestFailedError(Exception):
+    """The request failed after all the retries"""
+
+
+class CircuitOpenError(RequestFailedError):
+    """The requests to the endpoint are suspended"""
+
+
+class TransientHTTPError(Exception):
+    """The response status is worth retrying"""
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """Retries with exponential backoff and full jitter"""
+
+    attempts: int = 4
+    backoff_base: float = 0.5
+    backoff_cap: float = 10.0
+    timeout: float = 20.0
+
+    def backoff(self, attempt: int) -> float:
+        """Return the delay before the next attempt"""
+        return random.uniform(  # noqa: S311
+            0, min(self.backoff_cap, self.backoff_base * 2**attempt)
+        )
+
+
+class CircuitBreaker:
+    """
+    Stops the requests to the endpoint family
+    after a series of failures, lets one trial
+    request through once the reset timeout passes
+    """
+
+    def __init__(
+        self, endpoint: str, failure_threshold: int = 5, reset_timeout: float = 30.0
+    ) -> None:
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.trial = False
+
+    def check(self) -> bool:
+        """
+        Raise CircuitOpenError if the request is not allowed,
+        return True if the request is the trial one
+        """
+        if self.opened_at is None:
+            return False
+        if time.monotonic() - self.opened_at < self.reset_timeout or self.trial:
+            msg = "The circuit of the endpoint is open"
+            raise CircuitOpenError(msg, self.endpoint)
+        self.trial = True
+        return True
+
+    def abandon(self) -> None:
+        """Let another trial through after the trial ended without a response"""
+        self.trial = False
+
+    def success(self) -> None:
+        """Close the circuit"""
+        if self.opened_at is not None:
+            logger.info("Circuit of %s is closed", self.endpoint)
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+
+    def failure(self) -> None:
+        """Count the failure and open the circuit if needed"""
+        self.failures += 1
+        if self.trial or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self.trial:
+                logger.warning("Circuit of %s is open", self.endpoint)
+            self.opened_at = time.monotonic()
+            self.trial = False
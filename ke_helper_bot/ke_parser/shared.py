@@ -0,0 +1,64 @@
+import asyncio
+import functools
+from collections.abc import Awaitable, Callable, Hashable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Concatenate, ParamSpec, TypeVar
+
+from aiohttp import ClientSession
+
+P = ParamSpec("P")
+R = TypeVar("R")
+S = TypeVar("S")
+
+shared_results: ContextVar[dict[Hashable, asyncio.Future] | None] = ContextVar(
+    "shared_results", default=None
+)
+
+
+@contextmanager
+def sharing_results() -> Iterator[None]:
+    """
+    Share the results of the same fetches
+    between the jobs started in the block
+    """
+    token = shared_results.set({})
+    try:
+        yield
+    finally:
+        shared_results.reset(token)
+
+
+def shared_result(
+    name: str,
+) -> Callable[
+    [Callable[Concatenate[S, ClientSession, P], Awaitable[R]]],
+    Callable[Concatenate[S, ClientSession, P], Awaitable[R]],
+]:
+    """
+    Make the same calls of the fetching method
+    share one request inside the sharing block,
+    the arguments after the session are the key
+    """
+
+    def decorator(
+        func: Callable[Concatenate[S, ClientSession, P], Awaitable[R]],
+    ) -> Callable[Concatenate[S, ClientSession, P], Awaitable[R]]:
+        @functools.wraps(func)
+        async def wrapper(
+            self: S, session: ClientSession, *args: P.args, **kwargs: P.kwargs
+        ) -> R:
+            results = shared_results.get()
+            if results is None:
+                return await func(self, session, *args, **kwargs)
+            key = (name, *args, *sorted(kwargs.items()))
+            if key not in results:
+                results[key] = asyncio.ensure_future(
+                    func(self, session, *args, **kwargs)
+                )
+            # the cancelled caller must not cancel the fetch of the others
+            return await asyncio.shield(results[key])
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,17 @@
+from aiohttp import web
+
+from .metrics import metrics
+
+
+async def handle_metrics(_: web.Request) -> web.Response:
+    return web.Response(text=metrics.render_prometheus())
+
+
+async def start_exporter(host: str, port: int) -> web.AppRunner:
+    """Serve the metrics at http://host:port/metrics"""
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,21 @@
+import asyncio
+import time
+from collections.abc import Callable
+
+
+class LoopLagMonitor:
+    """
+    Measures how late the event loop wakes up,
+    the lag is the time the loop was busy with other work
+    """
+
+    def __init__(self, observe: Callable[[float], None], interval: float) -> None:
+        self.observe = observe
+        self.interval = interval
+
+    async def run(self) -> None:
+        """Observe the lag of the each wake up until cancelled"""
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.observe(max(time.perf_counter() - start - self.interval, 0.0))
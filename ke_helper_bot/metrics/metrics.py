@@ -0,0 +1,207 @@
+import time
+from bisect import bisect_left
+from collections import Counter
+from types import TracebackType
+from typing import Self
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LAG_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class Histogram:
+    """Cumulative histogram of the observed values"""
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """Add the value to its bucket"""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Return the upper bound of the bucket holding the q-quantile"""
+        rank = q * self.count
+        total = 0
+        for bound, count in zip(
+            (*self.buckets, float("inf")), self.counts, strict=True
+        ):
+            total += count
+            if total >= rank:
+                return bound
+        return float("inf")
+
+
+class Tracker:
+    """Measures one call to the endpoint"""
+
+    __slots__ = ("endpoint", "metrics", "size", "start")
+
+    def __init__(self, metrics: "Metrics", endpoint: str) -> None:
+        self.metrics = metrics
+        self.endpoint = endpoint
+        self.size = 0
+        self.start = 0.0
+
+    def __enter__(self) -> Self:
+        """Start the timer"""
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        """Record the call with its error if any"""
+        self.metrics.observe(
+            self.endpoint,
+            time.perf_counter() - self.start,
+            self.size,
+            exc_type.__name__ if exc_type is not None else None,
+        )
+
+
+class NullTracker:
+    """Tracker used when the metrics are disabled"""
+
+    __slots__ = ()
+    size = 0
+
+    def __enter__(self) -> Self:
+        """Do nothing"""
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        """Do nothing"""
+
+    def __setattr__(self, name: str, value: object) -> None:
+        """Ignore the response size"""
+
+
+NULL_TRACKER = NullTracker()
+
+
+class Metrics:
+    """
+    Per-endpoint latency histograms,
+    response sizes, retries and errors
+    of the marketplace and Sheets calls
+    """
+
+    def __init__(self, *, enabled: bool) -> None:
+        self.enabled = enabled
+        self.latency: dict[str, Histogram] = {}
+        self.requests: Counter[str] = Counter()
+        self.bytes: Counter[str] = Counter()
+        self.retries: Counter[str] = Counter()
+        self.errors: Counter[tuple[str, str]] = Counter()
+        self.loop_lag = Histogram(LAG_BUCKETS)
+
+    def track(self, endpoint: str) -> Tracker | NullTracker:
+        """
+        Return a context manager measuring the call,
+        its size attribute is set to the response size
+        """
+        if not self.enabled:
+            return NULL_TRACKER
+        return Tracker(self, endpoint)
+
+    def observe(
+        self, endpoint: str, seconds: float, size: int, error: str | None
+    ) -> None:
+        """Record the finished call"""
+        if endpoint not in self.latency:
+            self.latency[endpoint] = Histogram()
+        self.latency[endpoint].observe(seconds)
+        self.requests[endpoint] += 1
+        self.bytes[endpoint] += size
+        if error is not None:
+            self.errors[endpoint, error] += 1
+
+    def retry(self, endpoint: str) -> None:
+        """Record the retry of the call"""
+        if self.enabled:
+            self.retries[endpoint] += 1
+
+    def observe_lag(self, seconds: float) -> None:
+        """Record the event loop lag"""
+        if self.enabled:
+            self.loop_lag.observe(seconds)
+
+    def render_prometheus(self) -> str:
+        """Return the metrics in the Prometheus text format"""
+        lines = [
+            "# TYPE ke_request_duration_seconds histogram",
+        ]
+        for endpoint, histogram in sorted(self.latency.items()):
+            total = 0
+            for bound, count in zip(
+                (*histogram.buckets, "+Inf"), histogram.counts, strict=True
+            ):
+                total += count
+                lines.append(
+                    "ke_request_duration_seconds_bucket"
+                    f'{{endpoint="{endpoint}",le="{bound}"}} {total}'
+                )
+            lines.append(
+                f'ke_request_duration_seconds_sum{{endpoint="{endpoint}"}} '
+                f"{histogram.sum}"
+            )
+            lines.append(
+                f'ke_request_duration_seconds_count{{endpoint="{endpoint}"}} '
+                f"{histogram.count}"
+            )
+        for name, counter in (
+            ("ke_response_bytes_total", self.bytes),
+            ("ke_retries_total", self.retries),
+        ):
+            lines.append(f"# TYPE {name} counter")
+            lines.extend(
+                f'{name}{{endpoint="{endpoint}"}} {value}'
+                for endpoint, value in sorted(counter.items())
+            )
+        lines.append("# TYPE ke_errors_total counter")
+        lines.extend(
+            f'ke_errors_total{{endpoint="{endpoint}",error="{error}"}} {value}'
+            for (endpoint, error), value in sorted(self.errors.items())
+        )
+        lines.append("# TYPE ke_event_loop_lag_seconds histogram")
+        total = 0
+        for bound, count in zip(
+            (*self.loop_lag.buckets, "+Inf"), self.loop_lag.counts, strict=True
+        ):
+            total += count
+            lines.append(f'ke_event_loop_lag_seconds_bucket{{le="{bound}"}} {total}')
+        lines.append(f"ke_event_loop_lag_seconds_sum {self.loop_lag.sum}")
+        lines.append(f"ke_event_loop_lag_seconds_count {self.loop_lag.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> str:
+        """Return the short per-endpoint summary"""
+        if not self.enabled:
+            return "Метрики отключены"
+        lines = [f"{'endpoint':<28}{'reqs':>6}{'p50':>6}{'p99':>6}{'KiB':>8}"]
+        for endpoint, histogram in sorted(self.latency.items()):
+            lines.append(
+                f"{endpoint:<28}{histogram.count:>6}"
+                f"{histogram.quantile(0.5):>6}{histogram.quantile(0.99):>6}"
+                f"{self.bytes[endpoint] // 1024:>8}"
+            )
+        errors = sum(self.errors.values())
+        retries = sum(self.retries.values())
+        lines.append(f"errors: {errors}, retries: {retries}")
+        lines.append(
+            f"loop lag p50: {self.loop_lag.quantile(0.5)}, "
+            f"p99: {self.loop_lag.quantile(0.99)}"
+        )
+        return "\n".join(lines)
+
+
+# enabled on startup when configured
+metrics = Metrics(enabled=False)
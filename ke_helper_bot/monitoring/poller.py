@@ -0,0 +1,134 @@
+import time
+from dataclasses import dataclass
+
+
+class TokenBucket:
+    """Requests budget refilled at the constant rate"""
+
+    def __init__(self, per_minute: int) -> None:
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def take(self, cost: float) -> bool:
+        """Take the tokens if there are enough of them"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < cost:
+            return False
+        self.tokens -= cost
+        return True
+
+
+@dataclass
+class SkuState:
+    """The observed values and the change rate of the sku"""
+
+    price: float | str
+    stock: int | str
+    observed: float
+    # the changes per second
+    rate: float
+    near_threshold: bool = False
+
+
+class AdaptivePoller:
+    """
+    Decides which products are due for polling,
+    the volatile and the near-threshold skus are polled often,
+    the stable ones rarely, within the requests budget
+    """
+
+    def __init__(
+        self,
+        min_interval: float,
+        max_interval: float,
+        requests_per_minute: int,
+        alpha: float = 0.3,
+        threshold_margin: float = 1.5,
+    ) -> None:
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.alpha = alpha
+        self.threshold_margin = threshold_margin
+        self.budget = TokenBucket(requests_per_minute)
+        self.skus: dict[tuple[int, int | str], SkuState] = {}
+        self.product_skus: dict[int, set[int | str]] = {}
+        self.polled: dict[int, float] = {}
+
+    def interval(self, state: SkuState) -> float:
+        """
+        Return the polling interval of the sku,
+        about two polls per expected change
+        """
+        if state.near_threshold or state.rate <= 0:
+            return self.min_interval if state.near_threshold else self.max_interval
+        return min(self.max_interval, max(self.min_interval, 0.5 / state.rate))
+
+    def next_poll(self, product_id: int) -> float:
+        """Return the time the product is due, the new ones are due at once"""
+        if product_id not in self.polled:
+            return float("-inf")
+        intervals = [
+            self.interval(self.skus[product_id, sku_id])
+            for sku_id in self.product_skus.get(product_id, ())
+        ]
+        return self.polled[product_id] + min(intervals, default=self.min_interval)
+
+    def due(self, product_ids: list[int], cost: float) -> set[int]:
+        """
+        Return the products due for polling,
+        the most overdue first while the budget allows
+        """
+        now = time.monotonic()
+        result = set()
+        for due_at, product_id in sorted(
+            (self.next_poll(product_id), product_id) for product_id in product_ids
+        ):
+            if due_at > now or not self.budget.take(cost):
+                break
+            self.polled[product_id] = now
+            result.add(product_id)
+        return result
+
+    def observe(
+        self,
+        product_id: int,
+        sku_id: int | str,
+        price: float | str,
+        stock: int | str,
+        threshold: int | None = None,
+    ) -> None:
+        """Update the change rate of the sku with the polled values"""
+        now = time.monotonic()
+        state = self.skus.get((product_id, sku_id))
+        near_threshold = (
+            threshold is not None
+            and isinstance(stock, int)
+            and stock <= threshold * self.threshold_margin
+        )
+        if state is None:
+            # the new skus are considered volatile until observed
+            self.skus[product_id, sku_id] = SkuState(
+                price, stock, now, 1 / self.min_interval, near_threshold
+            )
+            self.product_skus.setdefault(product_id, set()).add(sku_id)
+            return
+        if threshold is not None:
+            state.near_threshold = near_threshold
+        elapsed = now - state.observed
+        # the other check of the same poll
+        if elapsed < self.min_interval / 2:
+            return
+        changed = (price, stock) != (state.price, state.stock)
+        state.rate = self.alpha * changed / elapsed + (1 - self.alpha) * state.rate
+        state.price, state.stock, state.observed = price, stock, now
+
+    def forget(self, product_ids: set[int]) -> None:
+        """Drop the products that are no longer tracked"""
+        for product_id in (self.polled.keys() | self.product_skus.keys()) - product_ids:
+            self.polled.pop(product_id, None)
+            for sku_id in self.product_skus.pop(product_id, ()):
+                del self.skus[product_id, sku_id]
@@ -0,0 +1,218 @@
+import asyncio
+import json
+import logging
+import math
+import sqlite3
+import time
+from collections.abc import Sequence
+from contextlib import suppress
+
+from notifier.notifier import Notifier
+from storage.sqlite import connect, create_schema, transaction
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS workers (owner TEXT PRIMARY KEY, expires REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS leases (
+    shard INTEGER PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, payload TEXT NOT NULL
+);
+"""
+
+
+class ShardStore:
+    """
+    The shard leases of the monitoring workers
+    and the queue of their events in the shared SQLite file
+    """
+
+    def __init__(self, path: str, shards: int) -> None:
+        self.path = path
+        self.shards = shards
+        create_schema(self.path, SCHEMA)
+
+    def shard(self, product_id: int) -> int:
+        """Return the shard of the product"""
+        return product_id % self.shards
+
+    def acquire(self, owner: str, ttl: float) -> set[int]:
+        """
+        Renew the leases of the worker and return its shards,
+        the worker takes the free and the expired shards
+        up to its fair share and gives up the rest
+        """
+        now = time.time()
+        with transaction(self.path, immediate=True) as conn:
+            conn.execute(
+                "INSERT INTO workers VALUES (?, ?) "
+                "ON CONFLICT (owner) DO UPDATE SET expires = excluded.expires",
+                (owner, now + ttl),
+            )
+            conn.execute("DELETE FROM workers WHERE expires < ?", (now,))
+            (workers,) = conn.execute("SELECT count(*) FROM workers").fetchone()
+            share = math.ceil(self.shards / workers)
+            owned = [
+                shard
+                for (shard,) in conn.execute(
+                    "SELECT shard FROM leases WHERE owner = ? ORDER BY shard",
+                    (owner,),
+                )
+            ]
+            # the surplus goes to the workers joined later
+            conn.executemany(
+                "DELETE FROM leases WHERE shard = ?", [(x,) for x in owned[share:]]
+            )
+            owned = owned[:share]
+            taken = {
+                shard
+                for (shard,) in conn.execute(
+                    "SELECT shard FROM leases WHERE expires >= ?", (now,)
+                )
+            }
+            free = [x for x in range(self.shards) if x not in taken | set(owned)]
+            owned += free[: max(share - len(owned), 0)]
+            conn.executemany(
+                "INSERT OR REPLACE INTO leases VALUES (?, ?, ?)",
+                [(shard, owner, now + ttl) for shard in owned],
+            )
+        return set(owned)
+
+    def workers(self) -> int:
+        """Return the number of the live workers"""
+        with connect(self.path) as conn:
+            (workers,) = conn.execute(
+                "SELECT count(*) FROM workers WHERE expires >= ?", (time.time(),)
+            ).fetchone()
+        return workers
+
+    def release(self, owner: str) -> None:
+        """Give up the shards of the stopped worker"""
+        with transaction(self.path, immediate=True) as conn:
+            conn.execute("DELETE FROM leases WHERE owner = ?", (owner,))
+            conn.execute("DELETE FROM workers WHERE owner = ?", (owner,))
+
+    def publish(self, kind: str, payloads: Sequence[object]) -> None:
+        """Queue the events for the bot process"""
+        with transaction(self.path) as conn:
+            conn.executemany(
+                "INSERT INTO events (kind, payload) VALUES (?, ?)",
+                [
+                    (kind, json.dumps(payload, ensure_ascii=False))
+                    for payload in payloads
+                ],
+            )
+
+    def consume(self, limit: int = 100) -> list[tuple[str, object]]:
+        """Take the oldest queued events"""
+        with transaction(self.path, immediate=True) as conn:
+            rows = conn.execute(
+                "SELECT id, kind, payload FROM events ORDER BY id LIMIT ?", (limit,)
+            ).fetchall()
+            if rows:
+                conn.execute("DELETE FROM events WHERE id <= ?", (rows[-1][0],))
+        return [(kind, json.loads(payload)) for _, kind, payload in rows]
+
+
+class ShardLease:
+    """Keeps the shards of the worker leased while it runs"""
+
+    def __init__(self, store: ShardStore, owner: str, ttl: float) -> None:
+        self.store = store
+        self.owner = owner
+        self.ttl = ttl
+        self.shards: set[int] = set()
+        # the live workers including this one
+        self.workers = 1
+
+    def owns(self, product_id: int) -> bool:
+        """Return whether the product is monitored by the worker"""
+        return self.store.shard(product_id) in self.shards
+
+    async def renew(self) -> None:
+        """Renew the leases, the shards of the failed workers are taken over"""
+        shards = await asyncio.to_thread(self.store.acquire, self.owner, self.ttl)
+        if shards != self.shards:
+            logger.info("Worker %s monitors shards %s", self.owner, sorted(shards))
+        self.shards = shards
+        self.workers = max(await asyncio.to_thread(self.store.workers), 1)
+
+    async def run(self) -> None:
+        """Renew the leases well before they expire until cancelled"""
+        try:
+            while True:
+                try:
+                    await self.renew()
+                except sqlite3.Error:
+                    logger.exception("Failed to renew the shard leases")
+                await asyncio.sleep(self.ttl / 3)
+        finally:
+            self.shards = set()
+            with suppress(sqlite3.Error):
+                self.store.release(self.owner)
+
+
+def quota_share(per_minute: int, workers: int) -> int:
+    """
+    Return the Sheets requests per minute of the each process,
+    the quota of the project is split between the bot and the workers
+    """
+    return max(per_minute // (workers + 1), 1)
+
+
+class QueueNotifier:
+    """
+    Passes the notifications of the worker to the bot process,
+    the messages are written to the store off the event loop
+    """
+
+    def __init__(self, store: ShardStore) -> None:
+        self.store = store
+        self.queue: asyncio.Queue[str] = asyncio.Queue()
+        self.writer: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        """Start the writer of the queued messages"""
+        self.writer = asyncio.create_task(self._writer())
+
+    async def stop(self) -> None:
+        """Write the queued messages and stop the writer"""
+        if self.writer is None:
+            return
+        await self.queue.join()
+        self.writer.cancel()
+        with suppress(asyncio.CancelledError):
+            await self.writer
+        self.writer = None
+
+    def notify(self, message: str) -> None:
+        """Queue the message for the admins"""
+        self.queue.put_nowait(message)
+
+    async def _writer(self) -> None:
+        while True:
+            messages = [await self.queue.get()]
+            while not self.queue.empty():
+                messages.append(self.queue.get_nowait())
+            try:
+                await asyncio.to_thread(self.store.publish, "notify", messages)
+            except sqlite3.Error:
+                logger.exception("Failed to queue %d notifications", len(messages))
+            finally:
+                for _ in messages:
+                    self.queue.task_done()
+
+
+async def relay_events(store: ShardStore, notifier: Notifier) -> None:
+    """Send the notifications queued by the workers"""
+    try:
+        while events := await asyncio.to_thread(store.consume):
+            for kind, payload in events:
+                if kind == "notify" and isinstance(payload, str):
+                    notifier.notify(payload)
+                else:
+                    logger.warning("Unknown worker event %s", kind)
+    except sqlite3.Error:
+        logger.exception("Failed to read the worker events")
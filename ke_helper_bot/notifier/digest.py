@@ -0,0 +1,44 @@
+from dataclasses import dataclass, field
+
+MAX_MESSAGE_LENGTH = 4096
+
+
+@dataclass
+class Digest:
+    """
+    Change alerts of one monitoring cycle,
+    sent one by one when there are few of them
+    and as a compact digest otherwise
+    """
+
+    header: str
+    threshold: int
+    alerts: list[str] = field(default_factory=list)
+    lines: list[str] = field(default_factory=list)
+
+    def add(self, alert: str, line: str) -> None:
+        """Add the full alert and its one-line summary"""
+        self.alerts.append(alert)
+        self.lines.append(line)
+
+    def messages(self) -> list[str]:
+        """Return the messages to send"""
+        if len(self.alerts) <= self.threshold:
+            return self.alerts
+        return split_message(
+            f"{self.header} ({len(self.lines)})", self.lines, MAX_MESSAGE_LENGTH
+        )
+
+
+def split_message(header: str, lines: list[str], limit: int) -> list[str]:
+    """Join the lines into messages not longer than limit"""
+    messages: list[str] = []
+    current = header
+    for line in lines:
+        if len(current) + len(line) + 1 > limit:
+            messages.append(current)
+            current = line
+        else:
+            current = f"{current}\n{line}"
+    messages.append(current)
+    return messages
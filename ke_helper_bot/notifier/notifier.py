@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import time
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Spaces the calls at least interval seconds apart"""
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self.next_call = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        """Wait until the next call is allowed"""
+        async with self.lock:
+            now = time.monotonic()
+            if self.next_call > now:
+                await asyncio.sleep(self.next_call - now)
+            self.next_call = max(now, self.next_call) + self.interval
+
+    def pause(self, seconds: float) -> None:
+        """Postpone the next call"""
+        self.next_call = max(self.next_call, time.monotonic() + seconds)
+
+
+class Notifier:
+    """
+    Queue of admin notifications with
+    a background sender per chat keeping
+    within the Telegram rate limits
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        chat_ids: list[int],
+        chat_interval: float = 1.0,
+        global_rate: int = 30,
+    ) -> None:
+        self.bot = bot
+        self.chat_ids = chat_ids
+        self.chat_interval = chat_interval
+        self.global_limiter = RateLimiter(1 / global_rate)
+        self.queues: dict[int, asyncio.Queue[str]] = {}
+        self.senders: list[asyncio.Task] = []
+
+    async def start(self) -> None:
+        """Start the sender of each chat"""
+        for chat_id in self.chat_ids:
+            self.queues[chat_id] = asyncio.Queue()
+            self.senders.append(asyncio.create_task(self._sender(chat_id)))
+
+    async def stop(self) -> None:
+        """Send the queued messages and stop the senders"""
+        await asyncio.gather(*(queue.join() for queue in self.queues.values()))
+        for sender in self.senders:
+            sender.cancel()
+        await asyncio.gather(*self.senders, return_exceptions=True)
+        self.senders.clear()
+
+    def notify(self, message: str) -> None:
+        """Queue the message for every chat"""
+        logger.info("Notifying admins with message: %s", message)
+        for queue in self.queues.values():
+            queue.put_nowait(message)
+
+    async def _sender(self, chat_id: int) -> None:
+        chat_limiter = RateLimiter(self.chat_interval)
+        queue = self.queues[chat_id]
+        while True:
+            message = await queue.get()
+            try:
+                while True:
+                    await chat_limiter.wait()
+                    await self.global_limiter.wait()
+                    try:
+                        await self.bot.send_message(
+                            chat_id, message, disable_web_page_preview=True
+                        )
+                        break
+                    except TelegramRetryAfter as e:
+                        logger.warning(
+                            "Flood control in chat %s, retry in %s s",
+                            chat_id,
+                            e.retry_after,
+                        )
+                        chat_limiter.pause(e.retry_after)
+            except TelegramAPIError:
+                logger.exception("Failed to notify chat %s", chat_id)
+            finally:
+                queue.task_done()
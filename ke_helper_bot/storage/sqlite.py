@@ -0,0 +1,37 @@
+import sqlite3
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+
+@contextmanager
+def connect(path: str) -> Iterator[sqlite3.Connection]:
+    """Open the connection in the autocommit mode and close it on exit"""
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+@contextmanager
+def transaction(path: str, *, immediate: bool = False) -> Iterator[sqlite3.Connection]:
+    """
+    Run the block in one transaction committed on success
+    and rolled back on error, the immediate one serializes
+    the writers from the start
+    """
+    with connect(path) as conn:
+        conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+
+def create_schema(path: str, schema: str) -> None:
+    """Create the tables of the file, the readers do not block the writer in WAL"""
+    with connect(path) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(schema)
@@ -0,0 +1,101 @@
+"""
+Summary of the slowest queries, products and endpoints of a traced run
+
+Run from the ke_helper_bot directory:
+    python -m tracing.analyzer traces.jsonl
+"""
+
+import argparse
+import json
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+
+def load_spans(path: Path) -> list[dict]:
+    """Return the spans of the file"""
+    with path.open(encoding="utf-8") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def duration(span: dict) -> float:
+    """Return the span duration in seconds"""
+    return (span["endTimeUnixNano"] - span["startTimeUnixNano"]) / 1e9
+
+
+def select_trace(spans: list[dict], trace_id: str | None) -> list[dict]:
+    """Return the spans of the trace, the latest one by default"""
+    if trace_id is None:
+        roots = [span for span in spans if span["parentSpanId"] is None]
+        if not roots:
+            return []
+        trace_id = max(roots, key=lambda span: span["startTimeUnixNano"])["traceId"]
+    return [span for span in spans if span["traceId"] == trace_id]
+
+
+def group_durations(
+    spans: list[dict], name: str | None, attribute: str
+) -> dict[str, list[float]]:
+    """Return the durations of the spans grouped by the attribute"""
+    groups: dict[str, list[float]] = defaultdict(list)
+    for span in spans:
+        if name is not None and span["name"] != name:
+            continue
+        if attribute not in span["attributes"]:
+            continue
+        groups[str(span["attributes"][attribute])].append(duration(span))
+    return groups
+
+
+def table(title: str, groups: dict[str, list[float]], top: int) -> str:
+    """Return the groups ordered by the total duration"""
+    lines = [
+        title,
+        f"{'':<70}{'count':>7}{'total s':>10}{'p50 s':>9}{'p99 s':>9}{'max s':>9}",
+    ]
+    for key, durations in sorted(
+        groups.items(), key=lambda item: sum(item[1]), reverse=True
+    )[:top]:
+        ordered = sorted(durations)
+        lines.append(
+            f"{key[:69]:<70}{len(ordered):>7}{sum(ordered):>10.2f}"
+            f"{ordered[len(ordered) // 2]:>9.2f}"
+            f"{ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]:>9.2f}"
+            f"{ordered[-1]:>9.2f}"
+        )
+    return "\n".join(lines) + "\n\n"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("path", type=Path)
+    parser.add_argument("--trace", help="trace id, the latest run by default")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    spans = select_trace(load_spans(args.path), args.trace)
+    if not spans:
+        sys.stdout.write("No spans found\n")
+        return
+    root = next((span for span in spans if span["parentSpanId"] is None), None)
+    if root is not None:
+        sys.stdout.write(
+            f"{root['name']} {root['traceId']}: {duration(root):.1f} s, "
+            f"{len(spans)} spans\n\n"
+        )
+    sys.stdout.write(
+        table(
+            "Slowest queries", group_durations(spans, "row", "search_query"), args.top
+        )
+        + table(
+            "Slowest products",
+            group_durations(spans, "get_all_info", "link"),
+            args.top,
+        )
+        + table("Slowest endpoints", group_durations(spans, None, "endpoint"), args.top)
+        + table("Slowest rows", group_durations(spans, "row", "index"), args.top)
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import functools
+import inspect
+import json
+import logging
+import secrets
+import time
+from collections.abc import Awaitable, Callable, Coroutine, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import IO, Any, ParamSpec, TypeVar
+
+logger = logging.getLogger(__name__)
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+
+@dataclass
+class Span:
+    """A timed operation of the job"""
+
+    name: str
+    trace_id: str
+    span_id: str
+    parent_span_id: str | None
+    attributes: dict[str, object] = field(default_factory=dict)
+    start_time_unix_nano: int = field(default_factory=time.time_ns)
+    end_time_unix_nano: int = 0
+    status: str = "OK"
+
+
+current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """
+    Writes the finished spans as JSON lines
+    with OpenTelemetry field names,
+    does nothing until a file is configured
+    """
+
+    def __init__(self) -> None:
+        self.file: IO[str] | None = None
+
+    def configure(self, path: str) -> None:
+        """Start writing the spans to the file"""
+        self.file = Path(path).open("a", encoding="utf-8")  # noqa: SIM115
+        logger.info("Writing trace spans to %s", path)
+
+    def close(self) -> None:
+        """Stop writing the spans"""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    @contextmanager
+    def span(self, name: str, **attributes: object) -> Iterator[Span | None]:
+        """
+        Measure the enclosed code as a child span of the current one,
+        the spans started without a parent begin a new trace
+        """
+        if self.file is None:
+            yield None
+            return
+        parent = current_span.get()
+        span = Span(
+            name,
+            parent.trace_id if parent is not None else secrets.token_hex(16),
+            secrets.token_hex(8),
+            parent.span_id if parent is not None else None,
+            attributes,
+        )
+        token = current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "ERROR"
+            span.attributes["exception.type"] = type(e).__name__
+            raise
+        finally:
+            current_span.reset(token)
+            span.end_time_unix_nano = time.time_ns()
+            self._write(span)
+
+    def _write(self, span: Span) -> None:
+        if self.file is None:
+            return
+        self.file.write(
+            json.dumps(
+                {
+                    "traceId": span.trace_id,
+                    "spanId": span.span_id,
+                    "parentSpanId": span.parent_span_id,
+                    "name": span.name,
+                    "startTimeUnixNano": span.start_time_unix_nano,
+                    "endTimeUnixNano": span.end_time_unix_nano,
+                    "attributes": span.attributes,
+                    "status": span.status,
+                },
+                ensure_ascii=False,
+                default=str,
+            )
+            + "\n"
+        )
+        if span.parent_span_id is None:
+            self.file.flush()
+
+
+tracer = Tracer()
+
+
+def traced(
+    name: str, *arg_names: str
+) -> Callable[[Callable[P, Awaitable[R]]], Callable[P, Coroutine[Any, Any, R]]]:
+    """
+    Trace the calls of the coroutine function,
+    the named arguments become the span attributes
+    """
+
+    def decorator(
+        func: Callable[P, Awaitable[R]],
+    ) -> Callable[P, Coroutine[Any, Any, R]]:
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            if tracer.file is None:
+                return await func(*args, **kwargs)
+            arguments = signature.bind(*args, **kwargs).arguments
+            with tracer.span(name, **{arg: arguments.get(arg) for arg in arg_names}):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+from ke_parser.batching import SearchBatcher
+from ke_parser.ke_parser import KEParser
+from ke_parser.queries import POSITION
+
+
+class FakeSender:
+    """Answers the batches echoing the inputs, the failing texts get an error"""
+
+    def __init__(self) -> None:
+        self.batches: list[list[dict]] = []
+
+    async def __call__(
+        self, _session: object, _profile: object, query_inputs: list[dict]
+    ) -> list[dict | BaseException]:
+        """Return the result or the error of the each input"""
+        self.batches.append(query_inputs)
+        return [
+            LookupError(query_input["text"])
+            if query_input["text"] == "fail"
+            else {"text": query_input["text"]}
+            for query_input in query_inputs
+        ]
+
+
+def test_concurrent_searches_get_their_own_results() -> None:
+    sender = FakeSender()
+    batcher = SearchBatcher(sender, 3, 0.01)
+
+    async def run() -> list:
+        return await asyncio.gather(
+            *(
+                batcher.search(None, POSITION, {"text": text})  # type: ignore[arg-type]
+                for text in ("a", "fail", "b", "c")
+            ),
+            return_exceptions=True,
+        )
+
+    a, failed, b, c = asyncio.run(run())
+    assert (a, b, c) == ({"text": "a"}, {"text": "b"}, {"text": "c"})
+    assert isinstance(failed, LookupError)
+    # the full batch is sent at once, the rest after the window
+    assert [len(batch) for batch in sender.batches] == [3, 1]
+
+
+def test_aliased_results_are_matched_to_their_inputs() -> None:
+    ke_parser = KEParser()
+    sent = []
+
+    async def request(*_args: object, payload: dict, **_kwargs: object) -> dict:
+        sent.append(payload)
+        return {"data": {"q0": {"total": 1}, "q1": None, "q2": {"total": 3}}}
+
+    ke_parser._request = request  # type: ignore[method-assign] # noqa: SLF001
+
+    results = asyncio.run(
+        ke_parser.send_search_batch(
+            None,  # type: ignore[arg-type]
+            POSITION,
+            [{"text": "a"}, {"text": "b"}, {"text": "c"}],
+        )
+    )
+    assert sent[0]["variables"] == {
+        "q0": {"text": "a"},
+        "q1": {"text": "b"},
+        "q2": {"text": "c"},
+    }
+    assert results[0] == {"total": 1}
+    assert isinstance(results[1], LookupError)
+    assert results[2] == {"total": 3}
+
+
+def test_unbatched_search_raises_its_error() -> None:
+    batcher = SearchBatcher(FakeSender(), 1, 0.01)
+    with pytest.raises(LookupError):
+        asyncio.run(batcher.search(None, POSITION, {"text": "fail"}))  # type: ignore[arg-type]
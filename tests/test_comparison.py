@@ -0,0 +1,48 @@
+import math
+
+from google_sheets.comparison import (
+    DAILY_COMPARED,
+    DAILY_METRICS,
+    SHOP_METRICS,
+    Comparison,
+    compared_values,
+    number,
+    number_text,
+)
+
+
+def test_numbers_are_read_from_the_formatted_cells() -> None:
+    assert number(5) == 5.0
+    assert number("1\xa0299,5") == 1299.5
+    assert math.isnan(number("no"))
+    assert math.isnan(number(True))  # noqa: FBT003
+    assert math.isnan(number(None))
+
+
+def test_my_products_are_colored_against_the_competitor() -> None:
+    mine = [[10, 4.5, 100, "no", 3, 120, 3], []]
+    theirs = [[8, 4.5, 90, 5, 3, 100, 1], [1, 1, 1, 1, 1, 1, 1]]
+    comparison = Comparison(mine, theirs, DAILY_METRICS)
+    assert comparison.colors("green", "red") == [
+        ["green", None, "green", None, None, "red", "red"],
+        [None] * 7,
+    ]
+    assert comparison.losses(0.1) == {0: [5, 6]}
+    # the price lost by less than the margin is not alerted
+    assert comparison.losses(0.5) == {0: [6]}
+
+
+def test_stock_of_the_shop_is_not_compared() -> None:
+    comparison = Comparison(
+        [[1, 1, 1, 1, 5, 1, 1]], [[1, 1, 1, 1, 9, 1, 1]], SHOP_METRICS
+    )
+    assert comparison.colors("green", "red") == [[None] * 7]
+
+
+def test_compared_values_are_kept_as_numbers() -> None:
+    row = ["query", "name", *range(25)]
+    mine, theirs = compared_values(row, DAILY_COMPARED)
+    assert list(mine) == [4.0, 5.0, 6.0, 7.0, 8.0, 9.0, 10.0]
+    assert list(theirs) == [15.0, 16.0, 17.0, 18.0, 19.0, 20.0, 21.0]
+    assert number_text(mine[0]) == "4"
+    assert number_text(4.35) == "4.35"
@@ -0,0 +1,17 @@
+from notifier.digest import Digest, split_message
+
+
+def test_messages_are_split_at_the_limit() -> None:
+    lines = [f"line {i}" for i in range(10)]
+    messages = split_message("header", lines, 20)
+    assert all(len(message) <= 20 for message in messages)
+    assert "\n".join(messages) == "\n".join(["header", *lines])
+
+
+def test_few_alerts_are_sent_one_by_one() -> None:
+    digest = Digest("header", 2)
+    digest.add("alert 1", "line 1")
+    digest.add("alert 2", "line 2")
+    assert digest.messages() == ["alert 1", "alert 2"]
+    digest.add("alert 3", "line 3")
+    assert digest.messages() == ["header (3)\nline 1\nline 2\nline 3"]
@@ -0,0 +1,93 @@
+import asyncio
+
+from ke_parser.executor import (
+    Priority,
+    PriorityExecutor,
+    current_job,
+    current_priority,
+)
+
+
+async def call(
+    executor: PriorityExecutor,
+    priority: Priority,
+    job: str,
+    name: str,
+    order: list[str],
+) -> None:
+    """Take a slot in the context of the job and record the turn"""
+    current_priority.set(priority)
+    current_job.set(job)
+    async with executor.slot():
+        order.append(name)
+        await asyncio.sleep(0)
+
+
+def test_interactive_calls_go_first_and_jobs_take_turns() -> None:
+    executor = PriorityExecutor(1)
+    order: list[str] = []
+
+    async def run() -> None:
+        async with executor.slot():
+            tasks = [
+                asyncio.create_task(call(executor, priority, job, name, order))
+                for priority, job, name in (
+                    (Priority.BACKGROUND, "daily", "daily 1"),
+                    (Priority.BACKGROUND, "daily", "daily 2"),
+                    (Priority.BACKGROUND, "shop", "shop 1"),
+                    (Priority.INTERACTIVE, "default", "interactive"),
+                )
+            ]
+            await asyncio.sleep(0)
+            assert executor.waiting() == 4
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert order == ["interactive", "daily 1", "shop 1", "daily 2"]
+    assert executor.active == 0
+
+
+def test_cancelled_waiter_does_not_keep_the_slot() -> None:
+    executor = PriorityExecutor(1)
+    order: list[str] = []
+
+    async def run() -> None:
+        async with executor.slot():
+            cancelled = asyncio.create_task(
+                call(executor, Priority.BACKGROUND, "daily", "cancelled", order)
+            )
+            waiting = asyncio.create_task(
+                call(executor, Priority.BACKGROUND, "shop", "waiting", order)
+            )
+            await asyncio.sleep(0)
+            cancelled.cancel()
+            await asyncio.sleep(0)
+            assert executor.waiting() == 1
+        await asyncio.wait_for(waiting, 1)
+
+    asyncio.run(run())
+    assert order == ["waiting"]
+    assert executor.active == 0
+    assert not executor.background
+
+
+def test_waiter_cancelled_after_the_handover_releases_the_slot() -> None:
+    executor = PriorityExecutor(1)
+    order: list[str] = []
+
+    async def run() -> None:
+        async with executor.slot():
+            cancelled = asyncio.create_task(
+                call(executor, Priority.BACKGROUND, "daily", "cancelled", order)
+            )
+            waiting = asyncio.create_task(
+                call(executor, Priority.BACKGROUND, "shop", "waiting", order)
+            )
+            await asyncio.sleep(0)
+        # the slot is handed over, but the waiter is cancelled before it runs
+        cancelled.cancel()
+        await asyncio.wait_for(waiting, 1)
+
+    asyncio.run(run())
+    assert order == ["waiting"]
+    assert executor.active == 0
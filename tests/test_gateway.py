@@ -0,0 +1,183 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from google_sheets.gateway import SheetsGateway
+from gspread.utils import ValueInputOption
+
+WORKSHEET = SimpleNamespace(title="Tasks", id=7)
+
+
+class FakeSpreadsheet:
+    """
+    Records the batch calls of the gateway,
+    the calls wait for the gate and the failing ones raise their errors
+    """
+
+    def __init__(self) -> None:
+        self.calls: list[tuple[str, object]] = []
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.failing: dict[str, Exception] = {}
+
+    async def _call(self, name: str, body: object) -> None:
+        self.calls.append((name, body))
+        await self.gate.wait()
+        if name in self.failing:
+            raise self.failing[name]
+
+    async def values_batch_get(self, ranges: list[str]) -> dict:
+        """Return the range name as its only value"""
+        await self._call("values_batch_get", ranges)
+        return {"valueRanges": [{"values": [[range_name]]} for range_name in ranges]}
+
+    async def values_batch_update(self, body: dict) -> dict:
+        """Record the update"""
+        await self._call("values_batch_update", body)
+        return {}
+
+    async def batch_update(self, body: dict) -> dict:
+        """Record the requests"""
+        await self._call("batch_update", body)
+        return {}
+
+
+class FakeWorksheet:
+    """Records the appended rows"""
+
+    title = "Tasks"
+    id = 7
+
+    def __init__(self, spreadsheet: FakeSpreadsheet) -> None:
+        self.spreadsheet = spreadsheet
+
+    async def append_rows(self, values: list[list], **_kwargs: object) -> None:
+        """Record the appended rows"""
+        self.spreadsheet.calls.append(("append_rows", values))
+
+
+def gateway(spreadsheet: FakeSpreadsheet) -> SheetsGateway:
+    """Return the gateway sending only on the explicit flush"""
+    return SheetsGateway(spreadsheet, 60.0)  # type: ignore[arg-type]
+
+
+async def settle() -> None:
+    """Let the started tasks run up to their next wait"""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_adjacent_operations_are_merged_in_order() -> None:
+    spreadsheet = FakeSpreadsheet()
+    sheets = gateway(spreadsheet)
+
+    async def run() -> list:
+        results = asyncio.gather(
+            sheets.update(WORKSHEET, "A1", [[1]]),
+            sheets.update(WORKSHEET, "B1", [[2]]),
+            sheets.update(WORKSHEET, "C1", [[3]], ValueInputOption.user_entered),
+            sheets.batch_update([{"a": 1}]),
+            sheets.batch_update([{"b": 2}]),
+            sheets.get(WORKSHEET, "A1:B"),
+        )
+        await settle()
+        await sheets.flush()
+        return await results
+
+    results = asyncio.run(run())
+    assert results[-1] == [["'Tasks'!A1:B"]]
+    assert [name for name, _ in spreadsheet.calls] == [
+        "values_batch_update",
+        "values_batch_update",
+        "batch_update",
+        "values_batch_get",
+    ]
+    raw, entered = spreadsheet.calls[0][1], spreadsheet.calls[1][1]
+    assert [data["range"] for data in raw["data"]] == ["'Tasks'!A1", "'Tasks'!B1"]
+    assert entered["valueInputOption"] == ValueInputOption.user_entered
+    assert spreadsheet.calls[2][1] == {"requests": [{"a": 1}, {"b": 2}]}
+
+
+def test_failed_batch_fails_only_its_operations() -> None:
+    spreadsheet = FakeSpreadsheet()
+    sheets = gateway(spreadsheet)
+    spreadsheet.failing["batch_update"] = ValueError("The requests are invalid")
+
+    async def run() -> list:
+        results = asyncio.gather(
+            sheets.batch_update([{"a": 1}]),
+            sheets.batch_update([{"b": 2}]),
+            sheets.get(WORKSHEET, "A1"),
+            return_exceptions=True,
+        )
+        await settle()
+        await sheets.flush()
+        return await results
+
+    first, second, values = asyncio.run(run())
+    assert isinstance(first, ValueError)
+    assert second is first
+    assert values == [["'Tasks'!A1"]]
+
+
+def test_cancelled_flush_keeps_sending_the_other_operations() -> None:
+    spreadsheet = FakeSpreadsheet()
+    sheets = gateway(spreadsheet)
+
+    async def run() -> list:
+        spreadsheet.gate.clear()
+        update = asyncio.ensure_future(sheets.update(WORKSHEET, "A1", [[1]]))
+        values = asyncio.ensure_future(sheets.get(WORKSHEET, "A1"))
+        await settle()
+        flush = asyncio.create_task(sheets.flush())
+        await settle()
+        flush.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await flush
+        spreadsheet.gate.set()
+        return await asyncio.wait_for(asyncio.gather(update, values), 1)
+
+    assert asyncio.run(run()) == [None, [["'Tasks'!A1"]]]
+
+
+def test_cancelled_append_keeps_sending_the_queued_operations() -> None:
+    spreadsheet = FakeSpreadsheet()
+    sheets = gateway(spreadsheet)
+    worksheet = FakeWorksheet(spreadsheet)
+
+    async def run() -> list:
+        spreadsheet.gate.clear()
+        update = asyncio.ensure_future(sheets.update(WORKSHEET, "A1", [[1]]))
+        values = asyncio.ensure_future(sheets.get(WORKSHEET, "A1"))
+        await settle()
+        append = asyncio.create_task(
+            sheets.append_rows(worksheet, [["new"]], "B4:E")  # type: ignore[arg-type]
+        )
+        await settle()
+        append.cancel()
+        spreadsheet.gate.set()
+        return await asyncio.wait_for(asyncio.gather(update, values), 1)
+
+    assert asyncio.run(run()) == [None, [["'Tasks'!A1"]]]
+    # the queued operations go before the append
+    assert [name for name, _ in spreadsheet.calls] == [
+        "values_batch_update",
+        "values_batch_get",
+        "append_rows",
+    ]
+
+
+def test_cancelled_caller_does_not_stop_the_others() -> None:
+    spreadsheet = FakeSpreadsheet()
+    sheets = gateway(spreadsheet)
+
+    async def run() -> list:
+        cancelled = asyncio.ensure_future(sheets.get(WORKSHEET, "A1"))
+        values = asyncio.ensure_future(sheets.get(WORKSHEET, "B1"))
+        await settle()
+        cancelled.cancel()
+        await settle()
+        await sheets.flush()
+        return await asyncio.wait_for(values, 1)
+
+    assert asyncio.run(run()) == [["'Tasks'!B1"]]
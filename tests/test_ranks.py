@@ -0,0 +1,29 @@
+from array import array
+
+from ke_parser.ranks import RankChange, Ranking, diff
+
+
+def ranking(ranks: dict[int, int]) -> Ranking:
+    """Return the ranking of the product positions"""
+    return Ranking(
+        "query", 0.0, len(ranks), array("q", ranks), array("q", ranks.values())
+    )
+
+
+def test_changed_positions_are_reported() -> None:
+    before = ranking({1: 1, 2: 2, 3: 3, 5: 5})
+    after = ranking({2: 1, 1: 2, 4: 3, 5: 5})
+    assert diff(before, after) == [
+        RankChange(2, 2, 1),
+        RankChange(1, 1, 2),
+        RankChange(4, None, 3),
+        RankChange(3, 3, None),
+    ]
+    assert [change.shift for change in diff(before, after)] == [1, -1, None, None]
+
+
+def test_stored_row_keeps_the_ranking() -> None:
+    stored = Ranking.from_row(ranking({7: 3, 9: 1}).to_row())
+    assert stored.ranks() == {7: 3, 9: 1}
+    assert stored.position(9) == 1
+    assert stored.position(8) is None
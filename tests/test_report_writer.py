@@ -0,0 +1,6 @@
+from google_sheets.report_writer import contiguous_blocks
+
+
+def test_rows_are_written_in_contiguous_blocks() -> None:
+    assert list(contiguous_blocks([1, 2, 3, 5, 7, 8])) == [(1, 4), (5, 6), (7, 9)]
+    assert list(contiguous_blocks([4])) == [(4, 5)]
@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+import pytest
+from aiohttp import ClientConnectionError
+from ke_parser.ke_parser import KEParser
+from ke_parser.resilience import CircuitBreaker, CircuitOpenError
+
+
+class HangingSession:
+    """The session whose requests never get a response"""
+
+    async def request(self, *_args: object, **_kwargs: object) -> None:
+        """Wait for the response forever"""
+        await asyncio.Event().wait()
+
+
+class ClosedSession:
+    """The session closed by the caller while the request was in flight"""
+
+    closed = True
+
+    async def request(self, *_args: object, **_kwargs: object) -> None:
+        """Fail like the closed connector does"""
+        msg = "Connector is closed."
+        raise ClientConnectionError(msg)
+
+
+def open_breaker(ke_parser: KEParser, endpoint: str) -> CircuitBreaker:
+    """Return the breaker of the endpoint ready for the trial request"""
+    breaker = CircuitBreaker(endpoint, reset_timeout=30.0)
+    breaker.opened_at = time.monotonic() - breaker.reset_timeout
+    ke_parser.breakers[endpoint] = breaker
+    return breaker
+
+
+def test_cancelled_trial_lets_next_trial_through() -> None:
+    ke_parser = KEParser()
+    breaker = open_breaker(ke_parser, "product")
+
+    async def cancel_trial() -> None:
+        with pytest.raises(TimeoutError):
+            await asyncio.wait_for(
+                ke_parser._request(HangingSession(), "product", "GET", "/"),  # noqa: SLF001
+                0.05,
+            )
+
+    asyncio.run(cancel_trial())
+    assert not breaker.trial
+    assert breaker.check()
+
+
+def test_trial_in_flight_blocks_other_requests() -> None:
+    breaker = CircuitBreaker("product")
+    breaker.opened_at = time.monotonic() - breaker.reset_timeout
+    assert breaker.check()
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+
+
+def test_closed_session_is_not_counted_as_failure() -> None:
+    ke_parser = KEParser()
+    breaker = open_breaker(ke_parser, "product")
+
+    async def request() -> None:
+        with pytest.raises(ClientConnectionError):
+            await ke_parser._request(ClosedSession(), "product", "GET", "/")  # noqa: SLF001
+
+    asyncio.run(request())
+    assert breaker.failures == 0
+    assert not breaker.trial
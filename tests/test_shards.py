@@ -0,0 +1,50 @@
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from monitoring import shards
+from monitoring.shards import ShardStore, quota_share
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> SimpleNamespace:
+    """Return the clock of the shard store set by the test"""
+    now = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(shards, "time", SimpleNamespace(time=lambda: now.now))
+    return now
+
+
+def test_workers_share_the_shards(tmp_path: Path, clock: SimpleNamespace) -> None:
+    store = ShardStore(str(tmp_path / "shards.sqlite3"), 4)
+    assert store.acquire("a", 60) == {0, 1, 2, 3}
+    # the shards leased by the live worker are not taken
+    assert store.acquire("b", 60) == set()
+    clock.now += 10
+    assert store.acquire("a", 60) == {0, 1}
+    assert store.acquire("b", 60) == {2, 3}
+    assert store.workers() == 2
+
+
+def test_expired_leases_are_taken_over(tmp_path: Path, clock: SimpleNamespace) -> None:
+    store = ShardStore(str(tmp_path / "shards.sqlite3"), 4)
+    store.acquire("a", 60)
+    store.acquire("b", 60)
+    store.acquire("a", 60)
+    assert store.acquire("b", 60) == {2, 3}
+    # the worker a stops renewing its leases
+    clock.now += 61
+    assert store.acquire("b", 60) == {0, 1, 2, 3}
+    assert store.workers() == 1
+
+
+def test_released_shards_are_free(tmp_path: Path) -> None:
+    store = ShardStore(str(tmp_path / "shards.sqlite3"), 4)
+    store.acquire("a", 60)
+    store.release("a")
+    assert store.acquire("b", 60) == {0, 1, 2, 3}
+
+
+def test_quota_is_split_with_the_bot() -> None:
+    assert quota_share(60, 1) == 30
+    assert quota_share(60, 3) == 15
+    assert quota_share(1, 5) == 1